@@ -1,20 +1,39 @@
+import atexit
 import math
 import os
+import time
 import sys
 import re
 import uuid
-from flask import Flask, request, jsonify, send_file
+from typing import Optional
+from flask import Flask, request, jsonify, make_response, g
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import logging
-from providers import Dostawa_MEVO, oblicz_dystans
-from io import BytesIO
+from providers import DaneNiegotowe, oblicz_dystans
+from dystans import oblicz_dystanse
+from rejestr import RejestrDostawcow
+from kolejka_zapisu import DOMYSLNY_ROZMIAR_KOLEJKI, KolejkaZapisu
+from autoryzacja import WeryfikatorTokenow
+from pamiec import WartoscSWR
+from dane import DostepDanych
+from zasoby_statyczne import ZasobyStatyczne, skompresuj
+from szybki_json import SzybkiDostawcaJSON
+from metryki import REJESTR, TYP_ZAWARTOSCI, domyslny_katalog as domyslny_katalog_metryk
+import limity  # noqa: F401  registers the sqlite:// rate-limit storage
+from profilowanie import PomiarFaz, ProfilerProbkujacy, faza, zakoncz_faze
+from grafiki import (DOMYSLNY_LIMIT_CZASU_RENDEROWANIA, DOMYSLNY_ROZMIAR_KATALOGU_GRAFIK, DOMYSLNY_ROZMIAR_PAMIECI_GRAFIK,
+                     FORMATY, ROZMIARY, PamiecGrafik, PulaRenderowania, klucz_grafiki,
+                     parametry_grafiki_dzielenia, parametry_grafiki_statystyk, renderuj)
+from concurrent.futures import TimeoutError as PrzekroczonyCzas
+import jwt
 from datetime import datetime
 from dotenv import load_dotenv
 import supabase
-from PIL import Image, ImageDraw, ImageFont
+from gotrue.errors import AuthApiError
 import json
+import numpy as np
 
 load_dotenv()
 
@@ -27,6 +46,20 @@ if not ADRES_SUPABASE or not KLUCZ_SUPABASE:
 
 SUPABASE_DOSTEPNY = True
 klient_supabase = supabase.create_client(ADRES_SUPABASE, KLUCZ_SUPABASE)
+dostep_danych = DostepDanych(klient_supabase)
+
+
+def weryfikuj_token_zdalnie(token: str):
+    try:
+        user = klient_supabase.auth.get_user(token)
+    except AuthApiError as e:
+        if 400 <= (e.status or 0) < 500:
+            return None
+        raise
+    return user.user.id if user and user.user else None
+
+
+weryfikator_tokenow = WeryfikatorTokenow(ADRES_SUPABASE, os.getenv('SEKRET_JWT_SUPABASE'), weryfikuj_token_zdalnie)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,17 +69,84 @@ PREDKOSC_ROWERU_KMH = 15.0
 PREDKOSC_SAMOCHODU_KMH = 40.0
 DOMYSLNY_PROMIEN = 2.0
 CO2_NA_DRZEWO_KG = 21  # Average lifetime CO2 absorption per tree (kg)
+MAKS_PODROZY_W_PACZCE = 1000
+SWIEZOSC_GLOBALNYCH_STATYSTYK = 30
+MAKS_WIEK_GLOBALNYCH_STATYSTYK = 600
+CZESCI_OBLICZENIA = ('travel_times', 'environmental_impact', 'closest_vehicle')
+ZRODLA_CORS = ["https://hh25.morawski.my", "http://localhost:*"]
+CACHE_STRON = 'no-cache'
+CACHE_IKON = 'public, max-age=86400'
+PROG_KOMPRESJI_ODPOWIEDZI = 1024
+TOKEN_METRYK = os.getenv('TOKEN_METRYK')
+MAGAZYN_LIMITOW = os.getenv('MAGAZYN_LIMITOW', 'sqlite://')
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'False') == 'True'
+KATALOG_METRYK = os.getenv('KATALOG_METRYK', domyslny_katalog_metryk())
+
+ZAPYTANIA_HTTP = REJESTR.licznik(
+    'http_requests_total', 'HTTP requests by route, method and status.', ('route', 'method', 'status')
+)
+CZAS_ZAPYTAN_HTTP = REJESTR.histogram(
+    'http_request_duration_seconds', 'HTTP request handling time by route.', ('route', 'method')
+)
+CZAS_RENDEROWANIA = REJESTR.histogram(
+    'share_graphic_render_duration_seconds', 'Share graphic render and encode time.', ('kind', 'format', 'size')
+)
 
 app = Flask(__name__)
-CORS(app, resources={r"/v1/*": {"origins": ["https://hh25.morawski.my", "http://localhost:*"]}, r"/health": {"origins": "*"}})
+app.json = SzybkiDostawcaJSON(app)
+app.config['RATELIMIT_ENABLED'] = os.getenv('LIMITY_ZAPYTAN', 'True') == 'True'
+CORS(app, resources={r"/v1/*": {"origins": ZRODLA_CORS}, r"/health": {"origins": "*"}})
 
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
+    storage_uri=MAGAZYN_LIMITOW,
+    strategy='fixed-window',
     default_limits=["200 per day", "50 per hour"]
 )
 
-dostawca = Dostawa_MEVO()
+pula_renderowania = None
+if int(os.getenv('PULA_RENDEROWANIA', 0)) > 0:
+    pula_renderowania = PulaRenderowania(
+        int(os.getenv('PULA_RENDEROWANIA')),
+        float(os.getenv('LIMIT_CZASU_RENDEROWANIA', DOMYSLNY_LIMIT_CZASU_RENDEROWANIA))
+    )
+    atexit.register(pula_renderowania.zamknij)
+
+kolejka_zapisu = None
+if os.getenv('ZAPIS_W_TLE', 'False') == 'True':
+    kolejka_zapisu = KolejkaZapisu(
+        klient_supabase,
+        os.getenv('PLIK_KOLEJKI_ZAPISU', 'kolejka_podrozy.jsonl'),
+        int(os.getenv('ROZMIAR_KOLEJKI_ZAPISU', DOMYSLNY_ROZMIAR_KOLEJKI))
+    )
+    atexit.register(kolejka_zapisu.zatrzymaj)
+
+zasoby_statyczne = ZasobyStatyczne(
+    os.path.dirname(os.path.abspath(__file__)),
+    przeladowanie=os.getenv('DEBUGOWANIE', 'False') == 'True'
+)
+zasoby_statyczne.dodaj('index.html', 'share.html', 'history.html')
+zasoby_statyczne.dodaj_katalog('favicon')
+
+pamiec_grafik = PamiecGrafik(
+    int(os.getenv('ROZMIAR_PAMIECI_GRAFIK', DOMYSLNY_ROZMIAR_PAMIECI_GRAFIK)),
+    os.getenv('KATALOG_PAMIECI_GRAFIK') or None,
+    int(os.getenv('ROZMIAR_KATALOGU_GRAFIK', DOMYSLNY_ROZMIAR_KATALOGU_GRAFIK))
+)
+
+if KATALOG_METRYK:
+    REJESTR.wspoldziel(KATALOG_METRYK)
+    atexit.register(REJESTR.zapisz_stan)
+
+profiler = None
+if float(os.getenv('PROFILOWANIE_PROBKA', 0)) > 0:
+    profiler = ProfilerProbkujacy(os.getenv('KATALOG_PROFILI', 'profile'), float(os.getenv('PROFILOWANIE_PROBKA')))
+    atexit.register(profiler.zamknij)
+
+dostawca = RejestrDostawcow.z_konfiguracji(os.getenv('PLIK_SYSTEMOW_GBFS'))
+if os.getenv('ODSWIEZANIE_W_TLE', 'True') == 'True':
+    dostawca.uruchom_odswiezanie()
 
 
 def oblicz_oszczednosci_co2(dystans_km: float) -> float:
@@ -80,6 +180,56 @@ def formatuj_czas_podrozy(godziny: float) -> str:
     return f"{godzina_tekst} {minuta_tekst}"
 
 
+def opisz_podroz(dystans: float, czesci=CZESCI_OBLICZENIA) -> dict:
+    oszczednosci_co2 = oblicz_oszczednosci_co2(dystans)
+    
+    opis = {
+        'distance_km': round(dystans, 2),
+        'co2_savings_kg': round(oszczednosci_co2, 3)
+    }
+    
+    if 'travel_times' in czesci:
+        czas_rower = formatuj_czas_podrozy(dystans / PREDKOSC_ROWERU_KMH)
+        czas_samochod = formatuj_czas_podrozy(dystans / PREDKOSC_SAMOCHODU_KMH)
+        
+        czas_rower_minuty = int((dystans / PREDKOSC_ROWERU_KMH) * 60)
+        czas_samochod_minuty = int((dystans / PREDKOSC_SAMOCHODU_KMH) * 60)
+        
+        opis['travel_times'] = {
+            'bike_minutes': czas_rower,
+            'car_minutes': czas_samochod,
+            'bike_minutes_raw': czas_rower_minuty,
+            'car_minutes_raw': czas_samochod_minuty
+        }
+    
+    if 'environmental_impact' in czesci:
+        opis['environmental_impact'] = {
+            'co2_per_km_car_grams': 120,
+            'co2_saved_grams': int(oszczednosci_co2 * 1000),
+            'equivalent_trees': round(oszczednosci_co2 / CO2_NA_DRZEWO_KG, 2)
+        }
+    
+    return opis
+
+
+def odczytaj_czesci(dane: dict) -> tuple[tuple, str]:
+    """Parses the optional ``include`` field (list or comma-separated string) of a calculation request."""
+    wartosc = dane.get('include', request.args.get('include'))
+    if wartosc is None:
+        return CZESCI_OBLICZENIA, ""
+    
+    if isinstance(wartosc, str):
+        wartosc = [czesc.strip() for czesc in wartosc.split(',') if czesc.strip()]
+    if not isinstance(wartosc, list):
+        return (), "Pole include musi być listą"
+    
+    nieznane = [czesc for czesc in wartosc if czesc not in CZESCI_OBLICZENIA]
+    if nieznane:
+        return (), f"Nieznane części obliczenia: {', '.join(map(str, nieznane))}"
+    
+    return tuple(czesc for czesc in CZESCI_OBLICZENIA if czesc in wartosc), ""
+
+
 def waliduj_wspolrzedne(lat: float, lon: float) -> tuple[bool, str]:
     if lat < -90 or lat > 90:
         return False, "Szerokość geograficzna musi być między -90 a 90"
@@ -125,20 +275,24 @@ def szukaj_najblizszej_stacji():
         jest_poprawne, komunikat_bledu = waliduj_wspolrzedne(lat, lon)
         if not jest_poprawne:
             return jsonify({'error': komunikat_bledu}), 400
+        zakoncz_faze('validation')
         
-        pojazdy = dostawca.pobierz_pojazdy(lat, lon, promien)
+        pojazdy = dostawca.pobierz_najblizsze(lat, lon, promien)
+        zakoncz_faze('provider')
         
         if not pojazdy:
             return jsonify({
                 'success': True,
                 'found': False,
-                'message': 'Brak stacji w pobliżu'
+                'message': 'Brak stacji w pobliżu',
+                'data_updated_at': dostawca.znacznik_aktualnosci()
             }), 200
         
         najblizszy = pojazdy[0]
         return jsonify({
             'success': True,
             'found': True,
+            'data_updated_at': dostawca.znacznik_aktualnosci(),
             'station': {
                 'name': najblizszy.get('name', 'Stacja MEVO'),
                 'latitude': najblizszy.get('latitude'),
@@ -148,6 +302,8 @@ def szukaj_najblizszej_stacji():
             }
         }), 200
     
+    except DaneNiegotowe as e:
+        return jsonify({'error': 'Dane stacji są jeszcze ładowane', 'details': str(e)}), 503, {'Retry-After': '5'}
     except Exception as e:
         logger.error(f"Błąd: {e}")
         return jsonify({'error': 'Błąd wewnętrzny serwera', 'details': str(e)}), 500
@@ -159,7 +315,7 @@ def oblicz_co2():
     try:
         dane = request.get_json()
         
-        if not dane:
+        if not dane or not isinstance(dane, dict):
             return jsonify({'error': 'Brakuje danych JSON'}), 400
         
         wymagane_pola = ['latitude', 'longitude', 'destination_latitude', 'destination_longitude']
@@ -176,6 +332,10 @@ def oblicz_co2():
         promien = float(dane.get('radius', DOMYSLNY_PROMIEN))
         uzytkownik_id = dane.get('user_id')
         
+        czesci, komunikat_bledu = odczytaj_czesci(dane)
+        if komunikat_bledu:
+            return jsonify({'error': komunikat_bledu, 'allowed': list(CZESCI_OBLICZENIA)}), 400
+        
         jest_poprawne, komunikat_bledu = waliduj_wspolrzedne(lat, lon)
         if not jest_poprawne:
             return jsonify({'error': komunikat_bledu}), 400
@@ -183,51 +343,131 @@ def oblicz_co2():
         jest_poprawne, komunikat_bledu = waliduj_wspolrzedne(dest_lat, dest_lon)
         if not jest_poprawne:
             return jsonify({'error': komunikat_bledu}), 400
-        
-        pojazdy = dostawca.pobierz_pojazdy(lat, lon, promien)
+        zakoncz_faze('validation')
         
         dystans = oblicz_dystans(lat, lon, dest_lat, dest_lon)
-        
         oszczednosci_co2 = oblicz_oszczednosci_co2(dystans)
         
-        czas_rower = formatuj_czas_podrozy(dystans / PREDKOSC_ROWERU_KMH)
-        czas_samochod = formatuj_czas_podrozy(dystans / PREDKOSC_SAMOCHODU_KMH)
-        
-        czas_rower_minuty = int((dystans / PREDKOSC_ROWERU_KMH) * 60)
-        czas_samochod_minuty = int((dystans / PREDKOSC_SAMOCHODU_KMH) * 60)
-        
-        najblizszy_pojazd = pojazdy[0] if pojazdy else None
+        najblizszy_pojazd = None
+        if 'closest_vehicle' in czesci:
+            zakoncz_faze('compute')
+            pojazdy = dostawca.pobierz_najblizsze(lat, lon, promien)
+            najblizszy_pojazd = pojazdy[0] if pojazdy else None
+            zakoncz_faze('provider')
         
         id_obliczenia = None
         
         odpowiedz = {
             'success': True,
             'id': id_obliczenia,
-            'distance_km': round(dystans, 2),
-            'co2_savings_kg': round(oszczednosci_co2, 3),
-            'travel_times': {
-                'bike_minutes': czas_rower,
-                'car_minutes': czas_samochod,
-                'bike_minutes_raw': czas_rower_minuty,
-                'car_minutes_raw': czas_samochod_minuty
-            },
-            'environmental_impact': {
-                'co2_per_km_car_grams': 120,
-                'co2_saved_grams': int(oszczednosci_co2 * 1000),
-                'equivalent_trees': round(oszczednosci_co2 / CO2_NA_DRZEWO_KG, 2)
-            }
+            'computed': ['distance_km', 'co2_savings_kg', *czesci],
+            **opisz_podroz(dystans, czesci)
         }
         
         if najblizszy_pojazd:
             odpowiedz['closest_vehicle'] = najblizszy_pojazd
+            odpowiedz['data_updated_at'] = dostawca.znacznik_aktualnosci()
+        
+        if najblizszy_pojazd or 'closest_vehicle' not in czesci:
             odpowiedz['message'] = f"Wybierając rower zamiast samochodu na trasę {dystans:.2f}km oszczędzasz około {oszczednosci_co2:.2f}kg CO₂!"
         else:
             odpowiedz['message'] = f"Brak rowerów w Twojej okolicy. Na trasę {dystans:.2f}km oszczędziłbyś {oszczednosci_co2:.2f}kg CO₂ wybierając rower zamiast samochodu!"
+        zakoncz_faze('compute')
         
         return jsonify(odpowiedz), 200
     
     except ValueError as e:
         return jsonify({'error': 'Niepoprawne dane wejściowe', 'details': str(e)}), 400
+    except DaneNiegotowe as e:
+        return jsonify({'error': 'Dane stacji są jeszcze ładowane', 'details': str(e)}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        logger.error(f"Błąd: {e}")
+        return jsonify({'error': 'Błąd wewnętrzny serwera', 'details': str(e)}), 500
+
+
+@app.route('/v1/calculate-co2-savings/batch', methods=['POST'])
+@limiter.limit("20/hour")
+def oblicz_co2_paczka():
+    try:
+        dane = request.get_json()
+        
+        if not isinstance(dane, dict) or not isinstance(dane.get('trips'), list):
+            return jsonify({'error': 'Brakuje listy podróży (trips)'}), 400
+        
+        podroze = dane['trips']
+        if not podroze or len(podroze) > MAKS_PODROZY_W_PACZCE:
+            return jsonify({'error': f'Liczba podróży musi być między 1 a {MAKS_PODROZY_W_PACZCE}'}), 400
+        
+        czesci, komunikat_bledu = odczytaj_czesci(dane)
+        if komunikat_bledu:
+            return jsonify({'error': komunikat_bledu, 'allowed': list(CZESCI_OBLICZENIA)}), 400
+        
+        wymagane_pola = ['latitude', 'longitude', 'destination_latitude', 'destination_longitude']
+        wspolrzedne = []
+        for indeks, podroz in enumerate(podroze):
+            if not isinstance(podroz, dict) or not all(pole in podroz for pole in wymagane_pola):
+                return jsonify({
+                    'error': 'Brakujące wymagane pola',
+                    'required': wymagane_pola,
+                    'index': indeks
+                }), 400
+            
+            lat = float(podroz['latitude'])
+            lon = float(podroz['longitude'])
+            dest_lat = float(podroz['destination_latitude'])
+            dest_lon = float(podroz['destination_longitude'])
+            promien = float(podroz.get('radius', DOMYSLNY_PROMIEN))
+            
+            for punkt_lat, punkt_lon in ((lat, lon), (dest_lat, dest_lon)):
+                jest_poprawne, komunikat_bledu = waliduj_wspolrzedne(punkt_lat, punkt_lon)
+                if not jest_poprawne:
+                    return jsonify({'error': komunikat_bledu, 'index': indeks}), 400
+            
+            if promien < 0 or promien > 50:
+                return jsonify({'error': 'Promień musi być między 0 a 50 km', 'index': indeks}), 400
+            
+            wspolrzedne.append((lat, lon, dest_lat, dest_lon, promien))
+        zakoncz_faze('validation')
+        
+        tablica = np.array(wspolrzedne, dtype=np.float64)
+        dystanse = oblicz_dystanse(tablica[:, 0], tablica[:, 1], tablica[:, 2], tablica[:, 3])
+        
+        if 'closest_vehicle' in czesci:
+            zakoncz_faze('compute')
+            najblizsze = dostawca.pobierz_najblizsze_wielu([(lat, lon, promien) for lat, lon, _, _, promien in wspolrzedne])
+            zakoncz_faze('provider')
+        else:
+            najblizsze = [None] * len(wspolrzedne)
+        
+        wyniki = []
+        for indeks, (dystans, pojazd) in enumerate(zip(dystanse.tolist(), najblizsze)):
+            wynik = {'index': indeks, **opisz_podroz(dystans, czesci)}
+            if pojazd:
+                wynik['closest_vehicle'] = pojazd
+            wyniki.append(wynik)
+        
+        suma_dystansu = float(dystanse.sum())
+        suma_oszczednosci = oblicz_oszczednosci_co2(suma_dystansu)
+        zakoncz_faze('compute')
+        
+        return jsonify({
+            'success': True,
+            'count': len(wyniki),
+            'computed': ['distance_km', 'co2_savings_kg', *czesci],
+            'results': wyniki,
+            'totals': {
+                'distance_km': round(suma_dystansu, 2),
+                'co2_savings_kg': round(suma_oszczednosci, 3),
+                'co2_saved_grams': int(suma_oszczednosci * 1000),
+                'equivalent_trees': round(suma_oszczednosci / CO2_NA_DRZEWO_KG, 2)
+            },
+            'data_updated_at': dostawca.znacznik_aktualnosci()
+        }), 200
+    
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Niepoprawne dane wejściowe', 'details': str(e)}), 400
+    except DaneNiegotowe as e:
+        return jsonify({'error': 'Dane stacji są jeszcze ładowane', 'details': str(e)}), 503, {'Retry-After': '5'}
     except Exception as e:
         logger.error(f"Błąd: {e}")
         return jsonify({'error': 'Błąd wewnętrzny serwera', 'details': str(e)}), 500
@@ -250,15 +490,20 @@ def pobliskie_stacje():
         jest_poprawne, komunikat_bledu = waliduj_wspolrzedne(lat, lon)
         if not jest_poprawne:
             return jsonify({'error': komunikat_bledu}), 400
+        zakoncz_faze('validation')
         
         pojazdy = dostawca.pobierz_pojazdy(lat, lon, promien)
+        zakoncz_faze('provider')
         
         return jsonify({
             'success': True,
             'count': len(pojazdy),
-            'stations': pojazdy
+            'stations': pojazdy,
+            'data_updated_at': dostawca.znacznik_aktualnosci()
         }), 200
     
+    except DaneNiegotowe as e:
+        return jsonify({'error': 'Dane stacji są jeszcze ładowane', 'details': str(e)}), 503, {'Retry-After': '5'}
     except Exception as e:
         logger.error(f"Błąd: {e}")
         return jsonify({'error': 'Błąd wewnętrzny serwera', 'details': str(e)}), 500
@@ -273,14 +518,14 @@ def weryfikuj_token_uzytkownika(auth_header: str, uzytkownik_id: str) -> tuple[b
         if scheme.lower() != 'bearer':
             return False, "Niepoprawny schemat autoryzacji"
         
-        if not klient_supabase:
-            return False, "Weryfikacja niedostępna"
-        
-        user = klient_supabase.auth.get_user(token)
-        if not user or not user.user:
+        try:
+            token_uzytkownik_id = weryfikator_tokenow.weryfikuj(token)
+        except jwt.ExpiredSignatureError:
+            return False, "Token wygasł"
+        except jwt.PyJWTError:
             return False, "Niepoprawny token"
         
-        if user.user.id != uzytkownik_id:
+        if token_uzytkownik_id != uzytkownik_id:
             return False, "Token nie pasuje do user_id"
         
         return True, ""
@@ -289,144 +534,164 @@ def weryfikuj_token_uzytkownika(auth_header: str, uzytkownik_id: str) -> tuple[b
         return False, "Błąd weryfikacji tokenu"
 
 
+def przygotuj_podroz(dane: Optional[dict], auth_header: Optional[str]) -> tuple[Optional[dict], Optional[tuple[dict, int]]]:
+    """Validates a save-journey body and builds its rows: (journey, None) or (None, (error body, status))."""
+    if not dane or not isinstance(dane, dict):
+        return None, ({'error': 'Brakuje danych JSON'}, 400)
+    
+    wymagane_pola = ['user_id', 'latitude', 'longitude', 'destination_latitude', 
+                      'destination_longitude', 'chosen_transport']
+    if not all(pole in dane for pole in wymagane_pola):
+        return None, ({
+            'error': 'Brakujące wymagane pola',
+            'required': wymagane_pola
+        }, 400)
+    
+    uzytkownik_id = dane['user_id']
+    jest_poprawne, komunikat_bledu = waliduj_uzytkownik_id(uzytkownik_id)
+    if not jest_poprawne:
+        return None, ({'error': komunikat_bledu}, 400)
+    
+    if auth_header:
+        jest_autoryzowany, komunikat_bledu_auth = weryfikuj_token_uzytkownika(auth_header, uzytkownik_id)
+        if not jest_autoryzowany:
+            return None, ({'error': komunikat_bledu_auth}, 401)
+    lat = float(dane['latitude'])
+    lon = float(dane['longitude'])
+    dest_lat = float(dane['destination_latitude'])
+    dest_lon = float(dane['destination_longitude'])
+    wybrany_transport = dane['chosen_transport'].lower()
+    
+    if wybrany_transport not in ['bike', 'car']:
+        return None, ({'error': 'chosen_transport musi być "bike" lub "car"'}, 400)
+    zakoncz_faze('validation')
+    
+    dystans = oblicz_dystans(lat, lon, dest_lat, dest_lon)
+    potencjalny_co2 = oblicz_oszczednosci_co2(dystans)
+    
+    dane_podrozy = {
+        'user_id': uzytkownik_id,
+        'start_lat': lat,
+        'start_lon': lon,
+        'end_lat': dest_lat,
+        'end_lon': dest_lon,
+        'distance_km': round(dystans, 2),
+        'chosen_transport': wybrany_transport,
+        'potential_co2_savings_kg': round(potencjalny_co2, 3),
+        'nearest_station_name': dane.get('nearest_station_name'),
+        'nearest_station_lat': dane.get('nearest_station_lat'),
+        'nearest_station_lon': dane.get('nearest_station_lon'),
+        'bike_type': dane.get('bike_type')
+    }
+    
+    obliczenie = None
+    if wybrany_transport == 'bike':
+        obliczenie = {
+            'user_id': uzytkownik_id,
+            'co2_savings_kg': round(potencjalny_co2, 3),
+            'distance_km': round(dystans, 2),
+            'start_lat': lat,
+            'start_lon': lon,
+            'end_lat': dest_lat,
+            'end_lon': dest_lon,
+            'created_at': datetime.utcnow().isoformat()
+        }
+    
+    transport_label = 'Rower 🚴' if wybrany_transport == 'bike' else 'Samochód 🚗'
+    zakoncz_faze('compute')
+    
+    return {
+        'journey': dane_podrozy,
+        'calculation': obliczenie,
+        'stats': delty_statystyk(uzytkownik_id, wybrany_transport, potencjalny_co2, dystans),
+        'message': f"Podróż zapisana: {transport_label} ({dystans:.2f}km)"
+    }, None
+
+
+def zakolejkuj_podroz(podroz: dict) -> bool:
+    """Hands the journey to the write-behind queue; False when it is disabled or full."""
+    if kolejka_zapisu is None:
+        return False
+    if kolejka_zapisu.dodaj({pole: podroz[pole] for pole in ('journey', 'calculation', 'stats')}):
+        return True
+    logger.warning("Kolejka zapisu pełna, zapisuję podróż synchronicznie")
+    return False
+
+
+def wynik_zapisu(podroz: dict, id_podrozy: Optional[int], w_kolejce: bool) -> tuple[dict, int]:
+    """Body and status of /v1/save-journey once the journey is written or queued."""
+    if w_kolejce:
+        return {'success': True, 'journey_id': None, 'queued': True, 'message': podroz['message']}, 202
+    return {'success': True, 'journey_id': id_podrozy, 'message': podroz['message']}, 200
+
+
 @app.route('/v1/save-journey', methods=['POST'])
 @limiter.limit("100/hour")
 def zapisz_podroze():
     try:
-        dane = request.get_json()
-        
-        if not dane:
-            return jsonify({'error': 'Brakuje danych JSON'}), 400
-        
-        wymagane_pola = ['user_id', 'latitude', 'longitude', 'destination_latitude', 
-                          'destination_longitude', 'chosen_transport']
-        if not all(pole in dane for pole in wymagane_pola):
-            return jsonify({
-                'error': 'Brakujące wymagane pola',
-                'required': wymagane_pola
-            }), 400
-        
-        uzytkownik_id = dane['user_id']
-        jest_poprawne, komunikat_bledu = waliduj_uzytkownik_id(uzytkownik_id)
-        if not jest_poprawne:
-            return jsonify({'error': komunikat_bledu}), 400
-        
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            jest_autoryzowany, komunikat_bledu_auth = weryfikuj_token_uzytkownika(auth_header, uzytkownik_id)
-            if not jest_autoryzowany:
-                return jsonify({'error': komunikat_bledu_auth}), 401
-        lat = float(dane['latitude'])
-        lon = float(dane['longitude'])
-        dest_lat = float(dane['destination_latitude'])
-        dest_lon = float(dane['destination_longitude'])
-        wybrany_transport = dane['chosen_transport'].lower()
-        
-        if wybrany_transport not in ['bike', 'car']:
-            return jsonify({'error': 'chosen_transport musi być "bike" lub "car"'}), 400
-        
-        dystans = oblicz_dystans(lat, lon, dest_lat, dest_lon)
-        potencjalny_co2 = oblicz_oszczednosci_co2(dystans)
+        podroz, blad = przygotuj_podroz(request.get_json(), request.headers.get('Authorization'))
+        if blad:
+            return jsonify(blad[0]), blad[1]
         
         if not klient_supabase:
             return jsonify({'error': 'Baza danych niedostępna'}), 503
         
-        dane_podrozy = {
-            'user_id': uzytkownik_id,
-            'start_lat': lat,
-            'start_lon': lon,
-            'end_lat': dest_lat,
-            'end_lon': dest_lon,
-            'distance_km': round(dystans, 2),
-            'chosen_transport': wybrany_transport,
-            'potential_co2_savings_kg': round(potencjalny_co2, 3),
-            'nearest_station_name': dane.get('nearest_station_name'),
-            'nearest_station_lat': dane.get('nearest_station_lat'),
-            'nearest_station_lon': dane.get('nearest_station_lon'),
-            'bike_type': dane.get('bike_type')
-        }
+        w_kolejce = zakolejkuj_podroz(podroz)
+        id_podrozy = None if w_kolejce else dostep_danych.zapisz_podroz(podroz)
+        zakoncz_faze('database')
         
-        wynik = klient_supabase.table('journey_tracking').insert(dane_podrozy).execute()
-        
-        if wybrany_transport == 'bike':
-            try:
-                klient_supabase.table('co2_calculations').insert({
-                    'user_id': uzytkownik_id,
-                    'co2_savings_kg': round(potencjalny_co2, 3),
-                    'distance_km': round(dystans, 2),
-                    'start_lat': lat,
-                    'start_lon': lon,
-                    'end_lat': dest_lat,
-                    'end_lon': dest_lon,
-                    'created_at': datetime.utcnow().isoformat()
-                }).execute()
-            except Exception as e:
-                logger.warning(f"Nie udało się zapisać obliczenia: {e}")
-        
-        aktualizuj_statystyki_uzytkownika(uzytkownik_id, wybrany_transport, potencjalny_co2, dystans)
-        
-        transport_label = 'Rower 🚴' if wybrany_transport == 'bike' else 'Samochód 🚗'
-        return jsonify({
-            'success': True,
-            'journey_id': wynik.data[0]['id'] if wynik.data else None,
-            'message': f"Podróż zapisana: {transport_label} ({dystans:.2f}km)"
-        }), 200
+        tresc, status = wynik_zapisu(podroz, id_podrozy, w_kolejce)
+        return jsonify(tresc), status
     
     except Exception as e:
         logger.error(f"Błąd: {e}")
         return jsonify({'error': 'Nie udało się zapisać podróży', 'details': str(e)}), 500
 
 
-def aktualizuj_statystyki_uzytkownika(uzytkownik_id: str, transport: str, co2_oszczedzony: float, dystans: float = 0):
-    try:
-        if not klient_supabase:
-            return
-        
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                wynik = klient_supabase.table('user_stats').select('*').eq('user_id', uzytkownik_id).execute()
-                
-                if wynik.data:
-                    obecny = wynik.data[0]
-                    nowy_co2_oszczedzony = obecny['total_co2_saved_kg'] + (co2_oszczedzony if transport == 'bike' else 0)
-                    nowy_co2_emitowany = obecny.get('total_co2_emitted_kg', 0) + (dystans * CO2_NA_KM_SAMOCHOD if transport == 'car' else 0)
-                    nowa_liczba_rowerow = obecny['total_bike_journeys'] + (1 if transport == 'bike' else 0)
-                    nowa_liczba_samochodow = obecny['total_car_journeys'] + (1 if transport == 'car' else 0)
-                    
-                    neutralny_net = (nowy_co2_oszczedzony - nowy_co2_emitowany) >= 0
-                    
-                    klient_supabase.table('user_stats').update({
-                        'total_co2_saved_kg': round(nowy_co2_oszczedzony, 3),
-                        'total_co2_emitted_kg': round(nowy_co2_emitowany, 3),
-                        'total_bike_journeys': nowa_liczba_rowerow,
-                        'total_car_journeys': nowa_liczba_samochodow,
-                        'net_neutral': neutralny_net,
-                        'last_updated': datetime.utcnow().isoformat()
-                    }).eq('user_id', uzytkownik_id).execute()
-                    return
-                else:
-                    co2_oszczedzony_init = co2_oszczedzony if transport == 'bike' else 0
-                    co2_emitowany = dystans * CO2_NA_KM_SAMOCHOD if transport == 'car' else 0
-                    neutralny_net = (co2_oszczedzony_init - co2_emitowany) >= 0
-                    
-                    klient_supabase.table('user_stats').insert({
-                        'user_id': uzytkownik_id,
-                        'total_co2_saved_kg': round(co2_oszczedzony_init, 3),
-                        'total_co2_emitted_kg': round(co2_emitowany, 3),
-                        'total_bike_journeys': 1 if transport == 'bike' else 0,
-                        'total_car_journeys': 1 if transport == 'car' else 0,
-                        'net_neutral': neutralny_net,
-                        'last_updated': datetime.utcnow().isoformat()
-                    }).execute()
-                    return
-            except Exception as retry_e:
-                if attempt == max_retries - 1:
-                    raise retry_e
-                import time
-                time.sleep(0.1 * (attempt + 1))
-    except Exception as e:
-        logger.warning(f"Nie udało się zaktualizować statystyk użytkownika: {e}")
+def delty_statystyk(uzytkownik_id: str, transport: str, co2_oszczedzony: float, dystans: float = 0) -> dict:
+    """Parameters of the zwieksz_statystyki_uzytkownika RPC for a single journey."""
+    return {
+        'p_user_id': uzytkownik_id,
+        'p_co2_saved_kg': round(co2_oszczedzony if transport == 'bike' else 0, 3),
+        'p_co2_emitted_kg': round(dystans * CO2_NA_KM_SAMOCHOD if transport == 'car' else 0, 3),
+        'p_bike_journeys': 1 if transport == 'bike' else 0,
+        'p_car_journeys': 1 if transport == 'car' else 0
+    }
+
+
+def opisz_statystyki_uzytkownika(user_id: str, stat_uzytkownika: Optional[dict], stary_co2: float, liczba_starych: int) -> dict:
+    """Body of /v1/user-stats from the user_stats row and the legacy calculation totals."""
+    if stat_uzytkownika:
+        laczsny_co2 = stat_uzytkownika['total_co2_saved_kg']
+        co2_emitowany = stat_uzytkownika.get('total_co2_emitted_kg', 0)
+        podroze_rowerem = stat_uzytkownika['total_bike_journeys']
+        podroze_samochodem = stat_uzytkownika['total_car_journeys']
+        neutralny_net = stat_uzytkownika['net_neutral']
+    else:
+        laczsny_co2 = 0
+        co2_emitowany = 0
+        podroze_rowerem = 0
+        podroze_samochodem = 0
+        neutralny_net = False
+    
+    total_co2 = laczsny_co2 + stary_co2
+    total_emitted = co2_emitowany
+    saldo_netto = total_co2 - total_emitted
+    
+    return {
+        'success': True,
+        'user_id': user_id,
+        'total_co2_saved_kg': round(total_co2, 2),
+        'total_co2_emitted_kg': round(total_emitted, 2),
+        'total_co2_grams': int(total_co2 * 1000),
+        'bike_journeys': podroze_rowerem,
+        'car_journeys': podroze_samochodem,
+        'net_balance_kg': round(saldo_netto, 2),
+        'net_neutral': neutralny_net,
+        'is_negative': saldo_netto < 0,
+        'trips_count': liczba_starych + podroze_rowerem + podroze_samochodem,
+        'equivalent_trees': round(total_co2 / CO2_NA_DRZEWO_KG, 2)
+    }
 
 
 @app.route('/v1/user-stats/<user_id>', methods=['GET'])
@@ -438,56 +703,88 @@ def pobierz_statystyki_uzytkownika(user_id):
         
         if not klient_supabase:
             return jsonify({'error': 'Statystyki niedostępne'}), 503
+        zakoncz_faze('validation')
         
-        wynik_statystyk = klient_supabase.table('user_stats').select(
-            '*'
-        ).eq('user_id', user_id).execute()
-        
-        if wynik_statystyk.data:
-            stat_uzytkownika = wynik_statystyk.data[0]
-            laczsny_co2 = stat_uzytkownika['total_co2_saved_kg']
-            co2_emitowany = stat_uzytkownika.get('total_co2_emitted_kg', 0)
-            podroze_rowerem = stat_uzytkownika['total_bike_journeys']
-            podroze_samochodem = stat_uzytkownika['total_car_journeys']
-            neutralny_net = stat_uzytkownika['net_neutral']
-        else:
-            laczsny_co2 = 0
-            co2_emitowany = 0
-            podroze_rowerem = 0
-            podroze_samochodem = 0
-            neutralny_net = False
-        
-        wynik_obliczen = klient_supabase.table('co2_calculations').select(
-            'co2_savings_kg'
-        ).eq('user_id', user_id).execute()
-        
-        stary_co2 = sum(item['co2_savings_kg'] for item in wynik_obliczen.data) if wynik_obliczen.data else 0
-        liczba_starych = len(wynik_obliczen.data) if wynik_obliczen.data else 0
+        stat_uzytkownika, (stary_co2, _, liczba_starych) = dostep_danych.profil_uzytkownika(user_id)
+        zakoncz_faze('database')
         
-        total_co2 = laczsny_co2 + stary_co2
-        total_emitted = co2_emitowany
-        saldo_netto = total_co2 - total_emitted
-        
-        return jsonify({
-            'success': True,
-            'user_id': user_id,
-            'total_co2_saved_kg': round(total_co2, 2),
-            'total_co2_emitted_kg': round(total_emitted, 2),
-            'total_co2_grams': int(total_co2 * 1000),
-            'bike_journeys': podroze_rowerem,
-            'car_journeys': podroze_samochodem,
-            'net_balance_kg': round(saldo_netto, 2),
-            'net_neutral': neutralny_net,
-            'is_negative': saldo_netto < 0,
-            'trips_count': liczba_starych + podroze_rowerem + podroze_samochodem,
-            'equivalent_trees': round(total_co2 / CO2_NA_DRZEWO_KG, 2)
-        }), 200
+        return jsonify(opisz_statystyki_uzytkownika(user_id, stat_uzytkownika, stary_co2, liczba_starych)), 200
     
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu statystyk: {e}")
         return jsonify({'error': 'Nie udało się pobrać statystyk', 'details': str(e)}), 500
 
 
+def wybierz_format_grafiki(format: Optional[str], akceptowane) -> str:
+    """Explicit ?format=, otherwise WebP only for clients that name it in Accept."""
+    if format in FORMATY:
+        return format
+    
+    for typ, jakosc in akceptowane:
+        if typ == 'image/webp' and jakosc > 0:
+            return 'webp'
+    return 'png'
+
+
+def wyslij_grafike(rodzaj: str, parametry: tuple):
+    """Serves a share graphic from the cache (or 304), rendering it only for new values."""
+    rozmiar = request.args.get('size', 'full')
+    if rozmiar not in ROZMIARY:
+        return jsonify({'error': f"Nieprawidłowy rozmiar, dostępne: {', '.join(ROZMIARY)}"}), 400
+    format = wybierz_format_grafiki(request.args.get('format'), request.accept_mimetypes)
+    klucz = klucz_grafiki(rodzaj, parametry, format, rozmiar)
+    
+    if klucz in request.if_none_match:
+        odpowiedz = make_response('', 304)
+    else:
+        dane = pamiec_grafik.pobierz(klucz)
+        if dane is None:
+            with faza('render'), CZAS_RENDEROWANIA.mierz(rodzaj, format, rozmiar):
+                if pula_renderowania:
+                    dane = pula_renderowania.renderuj(rodzaj, parametry, format, rozmiar)
+                else:
+                    dane = renderuj(rodzaj, parametry, format, rozmiar)
+            pamiec_grafik.zapisz(klucz, dane)
+        odpowiedz = make_response(dane)
+        odpowiedz.mimetype = FORMATY[format]
+    
+    odpowiedz.set_etag(klucz)
+    odpowiedz.headers['Cache-Control'] = 'no-cache'
+    odpowiedz.vary.add('Accept')
+    return odpowiedz
+
+
+def parametry_dzielenia_z_profilu(stat: Optional[dict], stary_co2: float, liczba_podrozy: int) -> tuple:
+    laczsny_co2_saved = 0
+    laczsny_co2_emitted = 0
+    
+    if stat:
+        laczsny_co2_saved = stat.get('total_co2_saved_kg', 0)
+        laczsny_co2_emitted = stat.get('total_co2_emitted_kg', 0)
+    
+    laczsny_co2_saved += stary_co2
+    
+    netto = laczsny_co2_saved - laczsny_co2_emitted
+    return parametry_grafiki_dzielenia(netto, liczba_podrozy)
+
+
+def parametry_statystyk_z_profilu(stat_uzytkownika: Optional[dict], stary_co2: float, laczsny_dystans: float) -> tuple:
+    podroze_rowerem = 0
+    podroze_samochodem = 0
+    laczsny_co2_oszczedzony = 0
+    laczsny_co2_emitowany = 0
+    
+    if stat_uzytkownika:
+        laczsny_co2_oszczedzony = stat_uzytkownika['total_co2_saved_kg']
+        laczsny_co2_emitowany = stat_uzytkownika.get('total_co2_emitted_kg', 0)
+        podroze_rowerem = stat_uzytkownika['total_bike_journeys']
+        podroze_samochodem = stat_uzytkownika['total_car_journeys']
+    
+    laczsny_co2_oszczedzony += stary_co2
+    netto = laczsny_co2_oszczedzony - laczsny_co2_emitowany
+    return parametry_grafiki_statystyk(netto, podroze_rowerem, podroze_samochodem, laczsny_dystans)
+
+
 @app.route('/v1/share-graphic/<user_id>', methods=['GET'])
 def wygeneruj_grafike_dzielenia(user_id):
     try:
@@ -497,78 +794,16 @@ def wygeneruj_grafike_dzielenia(user_id):
         
         if not klient_supabase:
             return jsonify({'error': 'Statystyki niedostępne'}), 503
+        zakoncz_faze('validation')
         
-        wynik_statystyk = klient_supabase.table('user_stats').select('*').eq('user_id', user_id).execute()
-        wynik_obliczen = klient_supabase.table('co2_calculations').select('co2_savings_kg').eq('user_id', user_id).execute()
-        wynik_podrozy = klient_supabase.table('journey_tracking').select('id').eq('user_id', user_id).execute()
-        
-        laczsny_co2_saved = 0
-        laczsny_co2_emitted = 0
-        liczba = 0
-        
-        if wynik_statystyk.data:
-            stat = wynik_statystyk.data[0]
-            laczsny_co2_saved = stat.get('total_co2_saved_kg', 0)
-            laczsny_co2_emitted = stat.get('total_co2_emitted_kg', 0)
-        
-        stary_co2 = sum(item['co2_savings_kg'] for item in wynik_obliczen.data) if wynik_obliczen.data else 0
-        laczsny_co2_saved += stary_co2
-        liczba_starych = len(wynik_obliczen.data) if wynik_obliczen.data else 0
-        liczba_wszystkich_podrozy = len(wynik_podrozy.data) if wynik_podrozy.data else 0
-        liczba = liczba_wszystkich_podrozy
-        
-        netto = laczsny_co2_saved - laczsny_co2_emitted
-        jest_negatywny = netto < 0
+        stat, (stary_co2, _, _), liczba = dostep_danych.profil_uzytkownika(user_id, z_liczba_podrozy=True)
+        zakoncz_faze('database')
         
-        szerokosc, wysokosc = 1200, 630
-        obraz = Image.new('RGB', (szerokosc, wysokosc), color='#000000')
-        rysowanie = ImageDraw.Draw(obraz)
-        
-        try:
-            czcionka_tytul = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 72)
-            czcionka_wartosc = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 120)
-            czcionka_etykieta = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 40)
-        except Exception:
-            czcionka_tytul = ImageFont.load_default()
-            czcionka_wartosc = ImageFont.load_default()
-            czcionka_etykieta = ImageFont.load_default()
-        
-        if jest_negatywny:
-            for y in range(wysokosc):
-                odcien = int(30 * (y / wysokosc))
-                kolor = (odcien, 0, 0)
-                rysowanie.rectangle([(0, y), (szerokosc, y+1)], fill=kolor)
-            
-            rysowanie.rectangle([(0, 0), (szerokosc, 8)], fill='#ff4444')
-            kolor_tekstu = '#ff4444'
-            wartosc_do_wyswietlenia = abs(netto)
-            etykieta = "KG CO₂ EMISJI"
-        else:
-            for y in range(wysokosc):
-                odcien = int(20 * (y / wysokosc))
-                kolor = (odcien, odcien, odcien)
-                rysowanie.rectangle([(0, y), (szerokosc, y+1)], fill=kolor)
-            
-            rysowanie.rectangle([(0, 0), (szerokosc, 8)], fill='#00ff00')
-            kolor_tekstu = '#00ff00'
-            wartosc_do_wyswietlenia = netto
-            etykieta = "KG CO₂ OSZCZĘDZONO"
-        
-        tekst_co2 = f"{wartosc_do_wyswietlenia:.2f}"
-        rysowanie.text((szerokosc//2, 200), tekst_co2, fill=kolor_tekstu, font=czcionka_wartosc, anchor="mm")
-        
-        rysowanie.text((szerokosc//2, 380), etykieta, fill='#ffffff', font=czcionka_etykieta, anchor="mm")
-        
-        tekst_podrozy = f"{liczba} podróży"
-        rysowanie.text((szerokosc//2, 480), tekst_podrozy, fill='#888888', font=czcionka_etykieta, anchor="mm")
-        
-        rysowanie.text((szerokosc//2, wysokosc-50), "hh25.morawski.my", fill='#666666', font=czcionka_etykieta, anchor="mm")
-        
-        img_io = BytesIO()
-        obraz.save(img_io, 'PNG', quality=95)
-        img_io.seek(0)
-        
-        return send_file(img_io, mimetype='image/png', as_attachment=False)
+        return wyslij_grafike('dzielenie', parametry_dzielenia_z_profilu(stat, stary_co2, liczba))
+    
+    except PrzekroczonyCzas:
+        logger.error("Przekroczono czas renderowania grafiki")
+        return jsonify({'error': 'Generowanie grafiki trwa zbyt długo'}), 503
     
     except Exception as e:
         logger.error(f"Błąd przy generowaniu grafiki: {e}")
@@ -584,139 +819,159 @@ def wygeneruj_grafike_statystyk(user_id):
         
         if not klient_supabase:
             return jsonify({'error': 'Statystyki niedostępne'}), 503
+        zakoncz_faze('validation')
         
-        wynik_statystyk = klient_supabase.table('user_stats').select('*').eq('user_id', user_id).execute()
-        
-        podroze_rowerem = 0
-        podroze_samochodem = 0
-        laczsny_co2_oszczedzony = 0
-        laczsny_co2_emitowany = 0
-        
-        if wynik_statystyk.data:
-            stat_uzytkownika = wynik_statystyk.data[0]
-            laczsny_co2_oszczedzony = stat_uzytkownika['total_co2_saved_kg']
-            laczsny_co2_emitowany = stat_uzytkownika.get('total_co2_emitted_kg', 0)
-            podroze_rowerem = stat_uzytkownika['total_bike_journeys']
-            podroze_samochodem = stat_uzytkownika['total_car_journeys']
+        stat_uzytkownika, (stary_co2, laczsny_dystans, _) = dostep_danych.profil_uzytkownika(user_id)
+        zakoncz_faze('database')
         
-        wynik_obliczen = klient_supabase.table('co2_calculations').select('distance_km,co2_savings_kg').eq('user_id', user_id).execute()
-        laczsny_dystans = sum(item['distance_km'] for item in wynik_obliczen.data) if wynik_obliczen.data else 0
-        stary_co2 = sum(item['co2_savings_kg'] for item in wynik_obliczen.data) if wynik_obliczen.data else 0
-        
-        laczsny_co2_oszczedzony += stary_co2
-        netto = laczsny_co2_oszczedzony - laczsny_co2_emitowany
-        jest_negatywny = netto < 0
-        
-        szerokosc, wysokosc = 1200, 630
-        obraz = Image.new('RGB', (szerokosc, wysokosc), color='#000000')
-        rysowanie = ImageDraw.Draw(obraz)
-        
-        try:
-            czcionka_tytul = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 56)
-            czcionka_wartosc = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 100)
-            czcionka_etykieta = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 40)
-            czcionka_mala = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 32)
-        except Exception:
-            czcionka_tytul = ImageFont.load_default()
-            czcionka_wartosc = ImageFont.load_default()
-            czcionka_etykieta = ImageFont.load_default()
-            czcionka_mala = ImageFont.load_default()
-        
-        if jest_negatywny:
-            for y in range(wysokosc):
-                odcien = int(30 * (y / wysokosc))
-                kolor = (odcien, 0, 0)
-                rysowanie.rectangle([(0, y), (szerokosc, y+1)], fill=kolor)
-            
-            rysowanie.rectangle([(0, 0), (szerokosc, 10)], fill='#ff4444')
-            kolor_tytul = '#ff4444'
-            kolor_wartosc = '#ff4444'
-            wartosc_do_wyswietlenia = abs(netto)
-            etykieta_co2 = "kg CO₂ EMISJI"
-            tytul = "Twoja emisja netto"
-        else:
-            for y in range(wysokosc):
-                odcien = int(30 * (y / wysokosc))
-                kolor = (odcien, odcien, odcien)
-                rysowanie.rectangle([(0, y), (szerokosc, y+1)], fill=kolor)
-            
-            rysowanie.rectangle([(0, 0), (szerokosc, 10)], fill='#00ff00')
-            kolor_tytul = '#00ff00'
-            kolor_wartosc = '#00ff00'
-            wartosc_do_wyswietlenia = netto
-            etykieta_co2 = "kg CO₂ OSZCZĘDZONO"
-            tytul = "Mój wpływ na klimat"
-        
-        rysowanie.text((szerokosc//2, 80), tytul, fill=kolor_tytul, font=czcionka_tytul, anchor="mm")
-        
-        tekst_co2 = f"{wartosc_do_wyswietlenia:.1f}"
-        rysowanie.text((szerokosc//2, 250), tekst_co2, fill=kolor_wartosc, font=czcionka_wartosc, anchor="mm")
-        
-        rysowanie.text((szerokosc//2, 360), etykieta_co2, fill='#ffffff', font=czcionka_etykieta, anchor="mm")
-        
-        y_statystyk = 450
-        tekst_statystyk = f"Rower: {podroze_rowerem} | Auto: {podroze_samochodem} | {laczsny_dystans:.1f} km"
-        rysowanie.text((szerokosc//2, y_statystyk), tekst_statystyk, fill='#888888', font=czcionka_mala, anchor="mm")
-        
-        rysowanie.text((szerokosc//2, wysokosc-60), "hh25.morawski.my", fill='#666666', font=czcionka_etykieta, anchor="mm")
-        
-        img_io = BytesIO()
-        obraz.save(img_io, 'PNG', quality=95)
-        img_io.seek(0)
-        
-        return send_file(img_io, mimetype='image/png', as_attachment=False)
+        return wyslij_grafike('statystyki', parametry_statystyk_z_profilu(stat_uzytkownika, stary_co2, laczsny_dystans))
+    
+    except PrzekroczonyCzas:
+        logger.error("Przekroczono czas renderowania grafiki")
+        return jsonify({'error': 'Generowanie grafiki trwa zbyt długo'}), 503
     
     except Exception as e:
         logger.error(f"Błąd przy generowaniu grafiki statystyk: {e}")
         return jsonify({'error': 'Nie udało się wygenerować grafiki', 'details': str(e)}), 500
 
 
+def wczytaj_globalne_statystyki() -> dict:
+    """Sums the counter slots of global_stats, one row per user_id hash bucket."""
+    pola = ('total_co2_saved_kg', 'total_co2_emitted_kg', 'total_bike_journeys', 'total_car_journeys', 'total_users')
+    wynik = klient_supabase.table('global_stats').select(','.join(pola)).execute()
+    
+    suma = {pole: sum(wiersz[pole] for wiersz in wynik.data) for pole in pola}
+    suma_co2_oszczedzono = suma['total_co2_saved_kg']
+    
+    return {
+        'success': True,
+        'global_co2_saved_kg': round(suma_co2_oszczedzono, 2),
+        'global_co2_emitted_kg': round(suma['total_co2_emitted_kg'], 2),
+        'global_bike_journeys': suma['total_bike_journeys'],
+        'global_car_journeys': suma['total_car_journeys'],
+        'total_users': suma['total_users'],
+        'equivalent_trees': round(suma_co2_oszczedzono / 0.021, 2)
+    }
+
+
+globalne_statystyki = WartoscSWR(
+    wczytaj_globalne_statystyki,
+    SWIEZOSC_GLOBALNYCH_STATYSTYK,
+    MAKS_WIEK_GLOBALNYCH_STATYSTYK,
+    nazwa='global_stats'
+)
+
+
 @app.route('/v1/global-stats', methods=['GET'])
 def pobierz_globalne_statystyki():
     try:
         if not klient_supabase:
             return jsonify({'error': 'Statystyki niedostępne'}), 503
         
-        wynik_uzytkownikow = klient_supabase.table('user_stats').select('total_co2_saved_kg,total_co2_emitted_kg,total_bike_journeys,total_car_journeys').execute()
-        
-        suma_co2_oszczedzono = 0
-        suma_co2_emitowano = 0
-        suma_podrozy_rowerem = 0
-        suma_podrozy_samochodem = 0
-        
-        for user in wynik_uzytkownikow.data:
-            suma_co2_oszczedzono += user.get('total_co2_saved_kg', 0)
-            suma_co2_emitowano += user.get('total_co2_emitted_kg', 0)
-            suma_podrozy_rowerem += user.get('total_bike_journeys', 0)
-            suma_podrozy_samochodem += user.get('total_car_journeys', 0)
-        
-        return jsonify({
-            'success': True,
-            'global_co2_saved_kg': round(suma_co2_oszczedzono, 2),
-            'global_co2_emitted_kg': round(suma_co2_emitowano, 2),
-            'global_bike_journeys': suma_podrozy_rowerem,
-            'global_car_journeys': suma_podrozy_samochodem,
-            'total_users': len(wynik_uzytkownikow.data) if wynik_uzytkownikow.data else 0,
-            'equivalent_trees': round(suma_co2_oszczedzono / 0.021, 2)
-        }), 200
+        statystyki = globalne_statystyki.pobierz()
+        zakoncz_faze('database')
+        return jsonify(statystyki), 200
     
     except Exception as e:
         logger.error(f"Błąd przy pobieraniu globalnych statystyk: {e}")
         return jsonify({'error': 'Nie udało się pobrać statystyk', 'details': str(e)}), 500
 
 
+def nazwa_trasy() -> str:
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def rozpocznij_pomiar():
+    g.poczatek_zapytania = time.perf_counter()
+    REJESTR.uruchom_zapis()
+    if SERVER_TIMING:
+        g.pomiar_faz = PomiarFaz(g.poczatek_zapytania)
+    if profiler is not None and profiler.czy_probkowac():
+        profiler.sledz(f"{request.method} {nazwa_trasy()}")
+        g.profilowane = True
+
+
+@app.after_request
+def zapisz_metryki_zapytania(odpowiedz):
+    """Registered before the other after_request hooks, so it runs last and includes them."""
+    poczatek = g.pop('poczatek_zapytania', None)
+    if poczatek is not None:
+        trasa = nazwa_trasy()
+        CZAS_ZAPYTAN_HTTP.obserwuj(time.perf_counter() - poczatek, trasa, request.method)
+        ZAPYTANIA_HTTP.zwieksz(trasa, request.method, str(odpowiedz.status_code))
+    
+    pomiar = g.pop('pomiar_faz', None)
+    if pomiar is not None:
+        odpowiedz.headers['Server-Timing'] = pomiar.naglowek()
+    return odpowiedz
+
+
+@app.teardown_request
+def zakoncz_profilowanie(_blad=None):
+    if g.pop('profilowane', False):
+        profiler.przestan()
+
+
+def akceptowane_kodowania() -> list:
+    return [wartosc for wartosc, jakosc in request.accept_encodings if jakosc > 0]
+
+
+@app.after_request
+def kompresuj_odpowiedz(odpowiedz):
+    """Compresses larger /v1 JSON responses for clients that accept gzip or Brotli."""
+    if (not request.path.startswith('/v1/') or not odpowiedz.is_json or odpowiedz.direct_passthrough
+            or 'Content-Encoding' in odpowiedz.headers):
+        return odpowiedz
+    
+    dane = odpowiedz.get_data()
+    if len(dane) < PROG_KOMPRESJI_ODPOWIEDZI:
+        return odpowiedz
+    
+    odpowiedz.vary.add('Accept-Encoding')
+    with faza('compress'):
+        kodowanie, skompresowane = skompresuj(dane, akceptowane_kodowania())
+    if kodowanie:
+        odpowiedz.set_data(skompresowane)
+        odpowiedz.headers['Content-Encoding'] = kodowanie
+    return odpowiedz
+
+
+def wyslij_zasob(nazwa: str, cache_control: str):
+    """Serves a preloaded static file, compressed if the client accepts it, with 304 on a matching ETag."""
+    zasob = zasoby_statyczne.pobierz(nazwa)
+    if zasob is None:
+        return jsonify({'error': 'Plik nie znaleziony'}), 404
+    
+    kodowanie, dane = zasob.wariant(akceptowane_kodowania())
+    etag = f"{zasob.etag}-{kodowanie}" if kodowanie else zasob.etag
+    
+    if etag in request.if_none_match:
+        odpowiedz = make_response('', 304)
+    else:
+        odpowiedz = make_response(dane)
+        odpowiedz.headers['Content-Type'] = zasob.typ
+        if kodowanie:
+            odpowiedz.headers['Content-Encoding'] = kodowanie
+    
+    odpowiedz.set_etag(etag)
+    odpowiedz.headers['Cache-Control'] = cache_control
+    if zasob.warianty:
+        odpowiedz.vary.add('Accept-Encoding')
+    return odpowiedz
+
+
 @app.route('/favicon/<path:filename>')
 def serve_favicon(filename):
-    return send_file(f'favicon/{filename}', mimetype='image/x-icon' if filename.endswith('.ico') else 'image/png')
+    return wyslij_zasob(f'favicon/{filename}', CACHE_IKON)
 
 
-@app.route('/favicon/site.webmanifest')
-def serve_manifest():
-    try:
-        with open('favicon/site.webmanifest', 'r') as f:
-            return f.read(), 200, {'Content-Type': 'application/manifest+json'}
-    except FileNotFoundError:
-        return jsonify({'error': 'Manifest not found'}), 404
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def pobierz_metryki():
+    if TOKEN_METRYK and request.headers.get('Authorization') != f"Bearer {TOKEN_METRYK}":
+        return jsonify({'error': 'Brak dostępu'}), 401
+    return REJESTR.eksportuj(), 200, {'Content-Type': TYP_ZAWARTOSCI}
 
 
 @app.route('/config', methods=['GET'])
@@ -729,35 +984,30 @@ def pobierz_config():
 
 @app.route('/', methods=['GET'])
 def index():
-    try:
-        with open('index.html', 'r') as f:
-            zawartosc = f.read()
-        
-        return zawartosc, 200, {'Content-Type': 'text/html'}
-    except FileNotFoundError:
-        return jsonify({'error': 'Plik nie znaleziony'}), 404
+    return wyslij_zasob('index.html', CACHE_STRON)
 
 
 @app.route('/share', methods=['GET'])
 def share():
-    try:
-        with open('share.html', 'r') as f:
-            zawartosc = f.read()
-        
-        return zawartosc, 200, {'Content-Type': 'text/html'}
-    except FileNotFoundError:
-        return jsonify({'error': 'Plik nie znaleziony'}), 404
+    return wyslij_zasob('share.html', CACHE_STRON)
 
 
 @app.route('/history', methods=['GET'])
 def history():
-    try:
-        with open('history.html', 'r') as f:
-            zawartosc = f.read()
-        
-        return zawartosc, 200, {'Content-Type': 'text/html'}
-    except FileNotFoundError:
-        return jsonify({'error': 'Plik nie znaleziony'}), 404
+    return wyslij_zasob('history.html', CACHE_STRON)
+
+
+@app.cli.command('przelicz-sumy-obliczen')
+def przelicz_sumy_obliczen():
+    """Rebuilds co2_calculations_totals from co2_calculations (needs KLUCZ_SERWISOWY_SUPABASE)."""
+    klucz_serwisowy = os.getenv('KLUCZ_SERWISOWY_SUPABASE')
+    if not klucz_serwisowy:
+        print("BŁĄD: KLUCZ_SERWISOWY_SUPABASE musi być ustawiony w .env")
+        sys.exit(1)
+    
+    klient_serwisowy = supabase.create_client(ADRES_SUPABASE, klucz_serwisowy)
+    wynik = klient_serwisowy.rpc('przelicz_sumy_obliczen', {}).execute()
+    print(f"Przeliczono sumy obliczeń dla {wynik.data} użytkowników")
 
 
 @app.errorhandler(404)
@@ -0,0 +1,267 @@
+"""ASGI entry point: ``uvicorn asgi:aplikacja`` (or gunicorn with ``-k uvicorn.workers.UvicornWorker``).
+
+The Supabase-bound endpoints (user stats, share graphics, global stats and saving a
+journey) run as coroutines on async HTTP clients, so one process keeps hundreds of
+their round-trips in flight. Every other route is served by the Flask app in a thread
+pool with unchanged behaviour; for the GBFS routes, expired feeds are first refreshed
+on the event loop, so those threads only do CPU work.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+from flask_cors.core import try_match_any
+from limits import parse_many
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+
+import app as serwer
+import szybki_json
+from dane import DostepDanychAsync
+from grafiki import FORMATY, ROZMIARY, klucz_grafiki, renderuj
+from providers import ROZMIAR_PULI_POLACZEN
+from zasoby_statyczne import skompresuj
+
+logger = logging.getLogger(__name__)
+
+TRASY_GBFS = frozenset({
+    '/v1/nearby-stations',
+    '/v1/search-nearest-station',
+    '/v1/calculate-co2-savings',
+    '/v1/calculate-co2-savings/batch'
+})
+# The same limits Flask-Limiter applies to the corresponding Flask routes.
+DOMYSLNE_LIMITY = parse_many("200 per day; 50 per hour")
+LIMITY_ZAPISU = parse_many("100/hour")
+
+ogranicznik = FixedWindowRateLimiter(storage_from_string(serwer.MAGAZYN_LIMITOW))
+
+
+def naglowki_cors(request: Request) -> dict:
+    """Access-Control headers matching Flask-CORS's configuration for /v1/*."""
+    zrodlo = request.headers.get('origin')
+    if zrodlo and try_match_any(zrodlo, serwer.ZRODLA_CORS):
+        return {'Access-Control-Allow-Origin': zrodlo, 'Vary': 'Origin'}
+    return {'Vary': 'Origin'}
+
+
+def odpowiedz_json(request: Request, dane: dict, status: int = 200) -> Response:
+    """JSON response encoded and compressed the same way as the Flask app's."""
+    tresc = szybki_json.zapisz(dane)
+    naglowki = naglowki_cors(request)
+
+    if len(tresc) >= serwer.PROG_KOMPRESJI_ODPOWIEDZI:
+        naglowki['Vary'] += ', Accept-Encoding'
+        akceptowane = [wartosc for wartosc, jakosc in parse_accept_header(request.headers.get('accept-encoding')) if jakosc > 0]
+        kodowanie, tresc = skompresuj(tresc, akceptowane)
+        if kodowanie:
+            naglowki['Content-Encoding'] = kodowanie
+    return Response(tresc, status, headers=naglowki, media_type='application/json')
+
+
+def przekroczony_limit(request: Request, nazwa: str, limity) -> Optional[Response]:
+    if not serwer.app.config['RATELIMIT_ENABLED']:
+        return None
+    adres = request.client.host if request.client else '127.0.0.1'
+    for limit in limity:
+        if not ogranicznik.hit(limit, 'asgi', nazwa, adres):
+            logger.info(f"Przekroczono limit {limit} ({adres}) dla {nazwa}")
+            return odpowiedz_json(request, {'error': 'Przekroczono limit zapytań', 'details': str(limit)}, 429)
+    return None
+
+
+def trasa(wzorzec: str, nazwa: str, limity=DOMYSLNE_LIMITY):
+    """Rate-limits a handler and records it in the HTTP metrics under the Flask route's label."""
+    def dekorator(obsluga):
+        @functools.wraps(obsluga)
+        async def opakowanie(request: Request) -> Response:
+            poczatek = time.perf_counter()
+            odpowiedz = przekroczony_limit(request, nazwa, limity) or await obsluga(request)
+            serwer.CZAS_ZAPYTAN_HTTP.obserwuj(time.perf_counter() - poczatek, wzorzec, request.method)
+            serwer.ZAPYTANIA_HTTP.zwieksz(wzorzec, request.method, str(odpowiedz.status_code))
+            return odpowiedz
+        return opakowanie
+    return dekorator
+
+
+@trasa('/v1/user-stats/<user_id>', 'user-stats')
+async def statystyki_uzytkownika(request: Request) -> Response:
+    user_id = request.path_params['user_id']
+    try:
+        jest_poprawne, komunikat_bledu = serwer.waliduj_uzytkownik_id(user_id)
+        if not jest_poprawne:
+            return odpowiedz_json(request, {'error': komunikat_bledu}, 400)
+
+        if not serwer.klient_supabase:
+            return odpowiedz_json(request, {'error': 'Statystyki niedostępne'}, 503)
+
+        stat_uzytkownika, (stary_co2, _, liczba_starych) = await request.app.state.dostep_danych.profil_uzytkownika(user_id)
+        return odpowiedz_json(request, serwer.opisz_statystyki_uzytkownika(user_id, stat_uzytkownika, stary_co2, liczba_starych))
+
+    except Exception as e:
+        logger.error(f"Błąd przy pobieraniu statystyk: {e}")
+        return odpowiedz_json(request, {'error': 'Nie udało się pobrać statystyk', 'details': str(e)}, 500)
+
+
+async def wyslij_grafike(request: Request, rodzaj: str, parametry: tuple) -> Response:
+    """Async counterpart of app.wyslij_grafike: the render is awaited, not waited for in a thread."""
+    rozmiar = request.query_params.get('size', 'full')
+    if rozmiar not in ROZMIARY:
+        return odpowiedz_json(request, {'error': f"Nieprawidłowy rozmiar, dostępne: {', '.join(ROZMIARY)}"}, 400)
+    format = serwer.wybierz_format_grafiki(
+        request.query_params.get('format'),
+        parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    )
+    klucz = klucz_grafiki(rodzaj, parametry, format, rozmiar)
+
+    naglowki = naglowki_cors(request)
+    naglowki.update({'ETag': f'"{klucz}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept, Origin'})
+    if klucz in parse_etags(request.headers.get('if-none-match')):
+        return Response(status_code=304, headers=naglowki)
+
+    dane = serwer.pamiec_grafik.pobierz(klucz)
+    if dane is None:
+        with serwer.CZAS_RENDEROWANIA.mierz(rodzaj, format, rozmiar):
+            pula = serwer.pula_renderowania
+            if pula:
+                zadanie = pula.zlec(rodzaj, parametry, format, rozmiar)
+                dane = await asyncio.wait_for(asyncio.wrap_future(zadanie), pula.limit_czasu)
+            else:
+                dane = await asyncio.to_thread(renderuj, rodzaj, parametry, format, rozmiar)
+        serwer.pamiec_grafik.zapisz(klucz, dane)
+    return Response(dane, headers=naglowki, media_type=FORMATY[format])
+
+
+async def grafika_z_profilu(request: Request, rodzaj: str) -> Response:
+    user_id = request.path_params['user_id']
+    try:
+        jest_poprawne, komunikat_bledu = serwer.waliduj_uzytkownik_id(user_id)
+        if not jest_poprawne:
+            return odpowiedz_json(request, {'error': komunikat_bledu}, 400)
+
+        if not serwer.klient_supabase:
+            return odpowiedz_json(request, {'error': 'Statystyki niedostępne'}, 503)
+
+        dostep_danych = request.app.state.dostep_danych
+        if rodzaj == 'dzielenie':
+            stat, (stary_co2, _, _), liczba = await dostep_danych.profil_uzytkownika(user_id, z_liczba_podrozy=True)
+            parametry = serwer.parametry_dzielenia_z_profilu(stat, stary_co2, liczba)
+        else:
+            stat, (stary_co2, laczsny_dystans, _) = await dostep_danych.profil_uzytkownika(user_id)
+            parametry = serwer.parametry_statystyk_z_profilu(stat, stary_co2, laczsny_dystans)
+
+        return await wyslij_grafike(request, rodzaj, parametry)
+
+    except (asyncio.TimeoutError, serwer.PrzekroczonyCzas):
+        logger.error("Przekroczono czas renderowania grafiki")
+        return odpowiedz_json(request, {'error': 'Generowanie grafiki trwa zbyt długo'}, 503)
+
+    except Exception as e:
+        logger.error(f"Błąd przy generowaniu grafiki: {e}")
+        return odpowiedz_json(request, {'error': 'Nie udało się wygenerować grafiki', 'details': str(e)}, 500)
+
+
+@trasa('/v1/share-graphic/<user_id>', 'share-graphic')
+async def grafika_dzielenia(request: Request) -> Response:
+    return await grafika_z_profilu(request, 'dzielenie')
+
+
+@trasa('/v1/share-graphic-stats/<user_id>', 'share-graphic-stats')
+async def grafika_statystyk(request: Request) -> Response:
+    return await grafika_z_profilu(request, 'statystyki')
+
+
+@trasa('/v1/global-stats', 'global-stats')
+async def globalne_statystyki(request: Request) -> Response:
+    try:
+        if not serwer.klient_supabase:
+            return odpowiedz_json(request, {'error': 'Statystyki niedostępne'}, 503)
+
+        wartosc = serwer.globalne_statystyki
+        wiek = wartosc.wiek()
+        if wiek is None or wiek >= wartosc.maks_wiek:
+            # Only a cold cache blocks; the single-flight load then runs in a thread.
+            statystyki = await asyncio.to_thread(wartosc.pobierz)
+        else:
+            statystyki = wartosc.pobierz()
+        return odpowiedz_json(request, statystyki)
+
+    except Exception as e:
+        logger.error(f"Błąd przy pobieraniu globalnych statystyk: {e}")
+        return odpowiedz_json(request, {'error': 'Nie udało się pobrać statystyk', 'details': str(e)}, 500)
+
+
+@trasa('/v1/save-journey', 'save-journey', LIMITY_ZAPISU)
+async def zapisz_podroz(request: Request) -> Response:
+    try:
+        dane = await request.json()
+        naglowek_autoryzacji = request.headers.get('authorization')
+        if naglowek_autoryzacji:
+            # Token checks are usually cached, but may fetch JWKS or ask Supabase Auth.
+            podroz, blad = await asyncio.to_thread(serwer.przygotuj_podroz, dane, naglowek_autoryzacji)
+        else:
+            podroz, blad = serwer.przygotuj_podroz(dane, None)
+        if blad:
+            return odpowiedz_json(request, *blad)
+
+        if not serwer.klient_supabase:
+            return odpowiedz_json(request, {'error': 'Baza danych niedostępna'}, 503)
+
+        w_kolejce = serwer.zakolejkuj_podroz(podroz)
+        id_podrozy = None if w_kolejce else await request.app.state.dostep_danych.zapisz_podroz(podroz)
+        return odpowiedz_json(request, *serwer.wynik_zapisu(podroz, id_podrozy, w_kolejce))
+
+    except Exception as e:
+        logger.error(f"Błąd: {e}")
+        return odpowiedz_json(request, {'error': 'Nie udało się zapisać podróży', 'details': str(e)}, 500)
+
+
+class FlaskPoOdswiezeniuGBFS:
+    """The Flask app behind WSGIMiddleware; GBFS routes get expired feeds refreshed on the loop first."""
+
+    def __init__(self, aplikacja_wsgi):
+        self.wsgi = WSGIMiddleware(aplikacja_wsgi)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in TRASY_GBFS:
+            await serwer.dostawca.aodswiez(scope['app'].state.klient_gbfs)
+        await self.wsgi(scope, receive, send)
+
+
+@asynccontextmanager
+async def cykl_zycia(aplikacja: Starlette):
+    serwer.REJESTR.uruchom_zapis()
+    aplikacja.state.klient_gbfs = httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=ROZMIAR_PULI_POLACZEN * len(serwer.dostawca.dostawcy))
+    )
+    aplikacja.state.dostep_danych = DostepDanychAsync.z_klienta(serwer.klient_supabase)
+    try:
+        yield
+    finally:
+        await aplikacja.state.klient_gbfs.aclose()
+        await aplikacja.state.dostep_danych.zamknij()
+
+
+aplikacja = Starlette(
+    routes=[
+        Route('/v1/user-stats/{user_id}', statystyki_uzytkownika, methods=['GET']),
+        Route('/v1/share-graphic/{user_id}', grafika_dzielenia, methods=['GET']),
+        Route('/v1/share-graphic-stats/{user_id}', grafika_statystyk, methods=['GET']),
+        Route('/v1/global-stats', globalne_statystyki, methods=['GET']),
+        Route('/v1/save-journey', zapisz_podroz, methods=['POST']),
+        Mount('', app=FlaskPoOdswiezeniuGBFS(serwer.app))
+    ],
+    lifespan=cykl_zycia
+)
@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import jwt
+from cachetools import TLRUCache, TTLCache
+
+from metryki import ZAPYTANIA_PAMIECI
+
+logger = logging.getLogger(__name__)
+
+ROZMIAR_PAMIECI_TOKENOW = 4096
+ROZMIAR_PAMIECI_NIEZNANYCH_KLUCZY = 256
+CZAS_PAMIETANIA_ODRZUCEN = 60
+CZAS_ZYCIA_KLUCZY_JWKS = 3600
+# Seconds to wait for the JWKS endpoint before falling back to weryfikacja_zdalna.
+LIMIT_CZASU_JWKS = 3
+ODBIORCA_TOKENU = 'authenticated'
+ALGORYTMY_ASYMETRYCZNE = ['RS256', 'ES256', 'EdDSA']
+
+
+class WeryfikacjaNiedostepna(jwt.InvalidTokenError):
+    """No way to check the token right now; says nothing about the token, so it is not remembered."""
+
+
+class WeryfikatorTokenow:
+    """Verifies Supabase access tokens locally.
+
+    HS256 tokens are checked with the project's JWT secret, asymmetric ones with keys
+    from the project's JWKS endpoint (cached by PyJWKClient). Tokens that verified
+    successfully are kept in a bounded LRU until their ``exp``, so repeated requests
+    with the same token skip the signature check. When a token cannot be checked
+    locally (HS256 without a configured secret, JWKS unavailable),
+    ``weryfikacja_zdalna`` (token -> user id, None when rejected) is used instead.
+
+    Rejected tokens and ``kid``s missing from the JWKS are remembered for
+    ``CZAS_PAMIETANIA_ODRZUCEN`` seconds, so replaying junk tokens costs neither a
+    JWKS refetch nor a call to Supabase Auth per request.
+    """
+
+    def __init__(self, adres_supabase: str, sekret_jwt: Optional[str] = None,
+                 weryfikacja_zdalna: Optional[Callable[[str], Optional[str]]] = None,
+                 rozmiar_pamieci: int = ROZMIAR_PAMIECI_TOKENOW):
+        self.sekret_jwt = sekret_jwt
+        self.weryfikacja_zdalna = weryfikacja_zdalna
+        self._klient_jwks = jwt.PyJWKClient(
+            f"{adres_supabase.rstrip('/')}/auth/v1/.well-known/jwks.json",
+            cache_keys=True,
+            lifespan=CZAS_ZYCIA_KLUCZY_JWKS,
+            timeout=LIMIT_CZASU_JWKS
+        )
+        self._pamiec = TLRUCache(maxsize=rozmiar_pamieci, ttu=lambda _, wpis, __: wpis[1], timer=time.time)
+        self._odrzucone = TTLCache(maxsize=rozmiar_pamieci, ttl=CZAS_PAMIETANIA_ODRZUCEN, timer=time.time)
+        self._nieznane_klucze = TTLCache(maxsize=ROZMIAR_PAMIECI_NIEZNANYCH_KLUCZY, ttl=CZAS_PAMIETANIA_ODRZUCEN,
+                                         timer=time.time)
+        self._blokada = threading.Lock()
+
+    def _klucz_podpisu(self, token: str, kid: Optional[str]):
+        with self._blokada:
+            if kid in self._nieznane_klucze:
+                raise jwt.InvalidTokenError(f"Nieznany klucz {kid}")
+        try:
+            return self._klient_jwks.get_signing_key_from_jwt(token)
+        except jwt.PyJWKClientConnectionError:
+            raise
+        except jwt.PyJWKClientError as e:
+            if kid is None:
+                raise
+            # The JWKS was just refetched and still lacks this kid: not a key of this project.
+            with self._blokada:
+                self._nieznane_klucze[kid] = True
+            raise jwt.InvalidTokenError(str(e)) from e
+
+    def _sprawdz_podpis(self, token: str) -> dict:
+        naglowek = jwt.get_unverified_header(token)
+        algorytm = naglowek.get('alg')
+        opcje = {'require': ['exp', 'sub']}
+
+        if algorytm == 'HS256':
+            if not self.sekret_jwt:
+                raise LookupError("Brak sekretu JWT")
+            return jwt.decode(token, self.sekret_jwt, algorithms=['HS256'], audience=ODBIORCA_TOKENU, options=opcje)
+
+        if algorytm not in ALGORYTMY_ASYMETRYCZNE:
+            raise jwt.InvalidAlgorithmError(f"Nieobsługiwany algorytm {algorytm}")
+        klucz = self._klucz_podpisu(token, naglowek.get('kid'))
+        return jwt.decode(token, klucz.key, algorithms=[algorytm], audience=ODBIORCA_TOKENU, options=opcje)
+
+    def weryfikuj(self, token: str) -> str:
+        """Returns the ``sub`` claim of a valid token; raises jwt.InvalidTokenError otherwise."""
+        klucz = hashlib.sha256(token.encode()).digest()
+        with self._blokada:
+            wpis = self._pamiec.get(klucz)
+            odrzucenie = self._odrzucone.get(klucz)
+        if wpis is not None:
+            ZAPYTANIA_PAMIECI.zwieksz('jwt', 'hit')
+            return wpis[0]
+        if odrzucenie is not None:
+            ZAPYTANIA_PAMIECI.zwieksz('jwt_rejected', 'hit')
+            raise type(odrzucenie)(*odrzucenie.args)
+
+        ZAPYTANIA_PAMIECI.zwieksz('jwt', 'miss')
+        try:
+            uzytkownik_id, wygasa = self._weryfikuj_bez_pamieci(token)
+        except WeryfikacjaNiedostepna:
+            raise
+        except jwt.InvalidTokenError as e:
+            with self._blokada:
+                self._odrzucone[klucz] = e
+            raise
+
+        with self._blokada:
+            self._pamiec[klucz] = (uzytkownik_id, wygasa)
+        return uzytkownik_id
+
+    def _weryfikuj_bez_pamieci(self, token: str) -> tuple[str, float]:
+        try:
+            roszczenia = self._sprawdz_podpis(token)
+            uzytkownik_id, wygasa = roszczenia['sub'], roszczenia['exp']
+        except (LookupError, jwt.PyJWKClientError) as e:
+            if self.weryfikacja_zdalna is None:
+                logger.warning(f"Lokalna weryfikacja tokenu niedostępna: {e}")
+                raise WeryfikacjaNiedostepna("Weryfikacja niedostępna")
+            uzytkownik_id = self.weryfikacja_zdalna(token)
+            if not uzytkownik_id:
+                raise jwt.InvalidTokenError("Niepoprawny token")
+            wygasa = jwt.decode(token, options={'verify_signature': False}).get('exp', time.time())
+        return uzytkownik_id, wygasa
@@ -0,0 +1,245 @@
+"""Local stand-ins for the services the backend talks to, used by the offline benchmarks.
+
+AtrapaGBFS serves synthetic ``gbfs.json``, ``station_information`` and ``station_status``
+feeds of any size; AtrapaSupabase implements the small PostgREST subset the app uses
+(filtered selects, exact counts, inserts and the stats RPCs) on in-memory tables.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+SRODEK = (54.3520, 18.6466)
+
+
+class _SerwerHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _Obsluga(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    atrapa = None
+
+    def log_message(self, *args):
+        pass
+
+    def _tresc(self) -> Optional[object]:
+        dlugosc = int(self.headers.get('Content-Length') or 0)
+        dane = self.rfile.read(dlugosc) if dlugosc else b''
+        return json.loads(dane) if dane else None
+
+    def _odpowiedz(self, status: int, dane: bytes = b'', naglowki: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        for nazwa, wartosc in (naglowki or {}).items():
+            self.send_header(nazwa, wartosc)
+        self.send_header('Content-Length', str(len(dane)))
+        self.end_headers()
+        self.wfile.write(dane)
+
+    def do_GET(self):
+        self.atrapa.obsluz(self, 'GET')
+
+    def do_POST(self):
+        self.atrapa.obsluz(self, 'POST')
+
+    def do_PATCH(self):
+        self.atrapa.obsluz(self, 'PATCH')
+
+
+class _Atrapa(ABC):
+    def __init__(self, opoznienie: float = 0.0):
+        self.opoznienie = opoznienie
+        self.liczba_zapytan = 0
+        self._serwer: Optional[_SerwerHTTP] = None
+
+    def uruchom(self, port: int = 0) -> str:
+        obsluga = type('Obsluga', (_Obsluga,), {'atrapa': self})
+        self._serwer = _SerwerHTTP(('127.0.0.1', port), obsluga)
+        threading.Thread(target=self._serwer.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._serwer.server_port}"
+
+    def zatrzymaj(self):
+        if self._serwer:
+            self._serwer.shutdown()
+            self._serwer.server_close()
+
+    def obsluz(self, zadanie: _Obsluga, metoda: str):
+        self.liczba_zapytan += 1
+        if self.opoznienie:
+            time.sleep(self.opoznienie)
+        try:
+            self._obsluz(zadanie, metoda)
+        except Exception as e:
+            zadanie._odpowiedz(500, json.dumps({'message': str(e)}).encode(), {'Content-Type': 'application/json'})
+
+    @abstractmethod
+    def _obsluz(self, zadanie: _Obsluga, metoda: str):
+        """Answers one request through ``zadanie._odpowiedz``."""
+
+
+class AtrapaGBFS(_Atrapa):
+    """GBFS 2.x system with ``liczba_stacji`` stations scattered around Gdańsk.
+
+    Feeds carry ``ttl`` and a content ETag and honour If-None-Match, like the real one.
+    """
+
+    def __init__(self, liczba_stacji: int = 700, ttl: int = 10, opoznienie: float = 0.0, ziarno: int = 2025):
+        super().__init__(opoznienie)
+        generator = np.random.default_rng(ziarno)
+        self.ttl = ttl
+        self.szerokosci = SRODEK[0] + generator.uniform(-0.15, 0.15, liczba_stacji)
+        self.dlugosci = SRODEK[1] + generator.uniform(-0.25, 0.25, liczba_stacji)
+        self.rowery = generator.integers(0, 12, liczba_stacji)
+        self.adres = None
+
+    def uruchom(self, port: int = 0) -> str:
+        self.adres = super().uruchom(port)
+        return self.adres
+
+    def _feed(self, dane: dict) -> dict:
+        return {'last_updated': int(time.time()), 'ttl': self.ttl, 'version': '2.3', 'data': dane}
+
+    def feedy(self) -> Dict[str, dict]:
+        stacje = range(len(self.szerokosci))
+        return {
+            'gbfs': self._feed({'pl': {'feeds': [
+                {'name': nazwa, 'url': f"{self.adres}/{nazwa}.json"}
+                for nazwa in ('station_information', 'station_status')
+            ]}}),
+            'station_information': self._feed({'stations': [{
+                'station_id': str(10000 + i),
+                'name': f"Stacja {i}",
+                'lat': float(self.szerokosci[i]),
+                'lon': float(self.dlugosci[i]),
+                'capacity': 20
+            } for i in stacje]}),
+            'station_status': self._feed({'stations': [{
+                'station_id': str(10000 + i),
+                'num_bikes_available': int(self.rowery[i]),
+                'num_docks_available': int(20 - self.rowery[i]),
+                'is_installed': True,
+                'is_renting': True,
+                'is_returning': True,
+                'last_reported': int(time.time())
+            } for i in stacje]})
+        }
+
+    def _obsluz(self, zadanie: _Obsluga, metoda: str):
+        nazwa = urlsplit(zadanie.path).path.strip('/').removesuffix('.json')
+        feed = self.feedy().get(nazwa)
+        if feed is None:
+            zadanie._odpowiedz(404)
+            return
+
+        dane_bez_czasu = json.dumps(feed['data'], sort_keys=True).encode()
+        etag = '"' + hashlib.sha256(dane_bez_czasu).hexdigest()[:16] + '"'
+        if zadanie.headers.get('If-None-Match') == etag:
+            zadanie._odpowiedz(304, naglowki={'ETag': etag})
+            return
+        zadanie._odpowiedz(200, json.dumps(feed).encode(), {'Content-Type': 'application/json', 'ETag': etag})
+
+
+class AtrapaSupabase(_Atrapa):
+    """In-memory PostgREST subset: ``eq`` filters, ``limit``, exact counts, inserts and stats RPCs."""
+
+    def __init__(self, opoznienie: float = 0.0):
+        super().__init__(opoznienie)
+        self.tabele: Dict[str, List[dict]] = {
+            'user_stats': [],
+            'journey_tracking': [],
+            'co2_calculations': [],
+            'co2_calculations_totals': []
+        }
+        self._blokada = threading.Lock()
+
+    def dodaj_uzytkownika(self, user_id: str, podroze_rowerem: int = 0, podroze_samochodem: int = 0,
+                          co2_oszczedzony: float = 0.0, co2_emitowany: float = 0.0):
+        self.tabele['user_stats'].append({
+            'user_id': user_id,
+            'total_co2_saved_kg': co2_oszczedzony,
+            'total_co2_emitted_kg': co2_emitowany,
+            'total_bike_journeys': podroze_rowerem,
+            'total_car_journeys': podroze_samochodem,
+            'net_neutral': co2_oszczedzony >= co2_emitowany
+        })
+        for _ in range(podroze_rowerem + podroze_samochodem):
+            self.tabele['journey_tracking'].append({'id': str(uuid.uuid4()), 'user_id': user_id})
+
+    def _zwieksz(self, delta: dict):
+        wiersze = [w for w in self.tabele['user_stats'] if w['user_id'] == delta['p_user_id']]
+        if not wiersze:
+            self.dodaj_uzytkownika(delta['p_user_id'])
+            wiersze = self.tabele['user_stats'][-1:]
+        wiersz = wiersze[0]
+        wiersz['total_co2_saved_kg'] += delta['p_co2_saved_kg']
+        wiersz['total_co2_emitted_kg'] += delta['p_co2_emitted_kg']
+        wiersz['total_bike_journeys'] += delta['p_bike_journeys']
+        wiersz['total_car_journeys'] += delta['p_car_journeys']
+        wiersz['net_neutral'] = wiersz['total_co2_saved_kg'] >= wiersz['total_co2_emitted_kg']
+
+    def _globalne(self) -> List[dict]:
+        statystyki = self.tabele['user_stats']
+        return [{
+            'id': 1,
+            'total_co2_saved_kg': sum(w['total_co2_saved_kg'] for w in statystyki),
+            'total_co2_emitted_kg': sum(w['total_co2_emitted_kg'] for w in statystyki),
+            'total_bike_journeys': sum(w['total_bike_journeys'] for w in statystyki),
+            'total_car_journeys': sum(w['total_car_journeys'] for w in statystyki),
+            'total_users': len(statystyki)
+        }]
+
+    def _obsluz(self, zadanie: _Obsluga, metoda: str):
+        adres = urlsplit(zadanie.path)
+        czesci = adres.path.strip('/').split('/')
+        json_typ = {'Content-Type': 'application/json'}
+
+        if czesci[:2] == ['auth', 'v1']:
+            zadanie._odpowiedz(401, b'{"message":"invalid token"}', json_typ)
+            return
+        if czesci[:2] != ['rest', 'v1']:
+            zadanie._odpowiedz(404)
+            return
+
+        tresc = zadanie._tresc()
+        with self._blokada:
+            if czesci[2] == 'rpc':
+                if czesci[3] == 'zwieksz_statystyki_uzytkownikow':
+                    for delta in tresc['p_delty']:
+                        self._zwieksz(delta)
+                else:
+                    self._zwieksz(tresc)
+                zadanie._odpowiedz(200, b'null', json_typ)
+                return
+
+            tabela = czesci[2]
+            if metoda == 'POST':
+                nowe = tresc if isinstance(tresc, list) else [tresc]
+                nowe = [{'id': str(uuid.uuid4()), **wiersz} for wiersz in nowe]
+                self.tabele.setdefault(tabela, []).extend(nowe)
+                zadanie._odpowiedz(201, json.dumps(nowe).encode(), json_typ)
+                return
+
+            parametry = parse_qsl(adres.query)
+            wiersze = self._globalne() if tabela == 'global_stats' else self.tabele.get(tabela, [])
+            for kolumna, warunek in parametry:
+                if warunek.startswith('eq.'):
+                    wartosc = warunek[3:]
+                    wiersze = [w for w in wiersze if str(w.get(kolumna)) == wartosc]
+            wszystkie = len(wiersze)
+            limit = dict(parametry).get('limit')
+            if limit is not None:
+                wiersze = wiersze[:int(limit)]
+
+            naglowki = dict(json_typ)
+            if 'count=exact' in (zadanie.headers.get('Prefer') or ''):
+                naglowki['Content-Range'] = f"0-{len(wiersze) - 1}/{wszystkie}" if wiersze else f"*/{wszystkie}"
+            zadanie._odpowiedz(200, json.dumps(wiersze).encode(), naglowki)
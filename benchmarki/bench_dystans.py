@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Compares the scalar and the vectorized haversine on realistic station counts.
+
+Usage: python benchmarki/bench_dystans.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dystans import macierz_dystansow, oblicz_dystans, oblicz_dystanse
+
+LICZBY_STACJI = [700, 5000, 50000]
+LICZBA_POWTORZEN = 5
+SRODEK = (54.3520, 18.6466)
+
+
+def losowe_stacje(liczba: int, generator: np.random.Generator):
+    szerokosci = SRODEK[0] + generator.uniform(-0.3, 0.3, liczba)
+    dlugosci = SRODEK[1] + generator.uniform(-0.5, 0.5, liczba)
+    return szerokosci, dlugosci
+
+
+def zmierz(funkcja, liczba_wywolan: int) -> float:
+    return min(timeit.repeat(funkcja, number=liczba_wywolan, repeat=LICZBA_POWTORZEN)) / liczba_wywolan
+
+
+def main():
+    generator = np.random.default_rng(2025)
+    print(f"{'stacje':>8} {'skalarnie [ms]':>15} {'numpy [ms]':>11} {'przyspieszenie':>15}")
+    
+    for liczba in LICZBY_STACJI:
+        szerokosci, dlugosci = losowe_stacje(liczba, generator)
+        lista_szerokosci = szerokosci.tolist()
+        lista_dlugosci = dlugosci.tolist()
+        
+        def skalarnie():
+            return [oblicz_dystans(SRODEK[0], SRODEK[1], lat, lon) for lat, lon in zip(lista_szerokosci, lista_dlugosci)]
+        
+        def wektorowo():
+            return oblicz_dystanse(SRODEK[0], SRODEK[1], szerokosci, dlugosci)
+        
+        liczba_wywolan = max(1, 20000 // liczba)
+        czas_skalarny = zmierz(skalarnie, liczba_wywolan)
+        czas_wektorowy = zmierz(wektorowo, liczba_wywolan * 10)
+        print(f"{liczba:>8} {czas_skalarny * 1000:>15.3f} {czas_wektorowy * 1000:>11.3f} {czas_skalarny / czas_wektorowy:>14.1f}x")
+    
+    szerokosci, dlugosci = losowe_stacje(LICZBY_STACJI[0], generator)
+    starty_szerokosci, starty_dlugosci = losowe_stacje(500, generator)
+    czas_macierzy = zmierz(lambda: macierz_dystansow(starty_szerokosci, starty_dlugosci, szerokosci, dlugosci), 5)
+    print(f"\nMacierz 500 startów x {LICZBY_STACJI[0]} stacji: {czas_macierzy * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Measures share-graphic renders per second with and without the shared render assets,
+then the encode time and size of every format and size variant.
+
+"Bez zasobów" builds a fresh ZasobyGrafik per render, which is what every request paid
+before (font loading and the 630-rectangle gradient); "z zasobami" reuses the process-wide one.
+
+Usage: python benchmarki/bench_grafiki.py
+"""
+
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grafiki import (FORMATY, ROZMIARY, ZasobyGrafik, parametry_grafiki_dzielenia, parametry_grafiki_statystyk,
+                     pobierz_zasoby, renderuj_grafike_dzielenia, renderuj_grafike_statystyk, zakoduj)
+
+CZAS_POMIARU = 2.0
+GRAFIKI = [
+    ('dzielenie', renderuj_grafike_dzielenia, parametry_grafiki_dzielenia(12.34, 17)),
+    ('statystyki', renderuj_grafike_statystyk, parametry_grafiki_statystyk(-3.2, 11, 6, 84.5)),
+]
+
+
+def renderow_na_sekunde(renderuj) -> float:
+    liczba = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < CZAS_POMIARU:
+        renderuj()
+        liczba += 1
+    return liczba / (time.perf_counter() - start)
+
+
+def main():
+    print(f"{'grafika':>12} {'bez zasobów [1/s]':>18} {'z zasobami [1/s]':>17} {'przyspieszenie':>15}")
+    
+    for nazwa, renderuj, parametry in GRAFIKI:
+        renderuj(*parametry, zasoby=pobierz_zasoby())
+        przed = renderow_na_sekunde(lambda: zakoduj(renderuj(*parametry, zasoby=ZasobyGrafik())))
+        po = renderow_na_sekunde(lambda: zakoduj(renderuj(*parametry, zasoby=pobierz_zasoby())))
+        print(f"{nazwa:>12} {przed:>18.1f} {po:>17.1f} {po / przed:>14.1f}x")
+    
+    print(f"\n{'grafika':>12} {'wariant':>12} {'kodowanie [ms]':>15} {'rozmiar [B]':>12}")
+    for nazwa, renderuj, parametry in GRAFIKI:
+        obraz = renderuj(*parametry)
+        wyjscie = BytesIO()
+        obraz.save(wyjscie, 'PNG', compress_level=6)
+        czas = 1000 / renderow_na_sekunde(lambda: obraz.save(BytesIO(), 'PNG', compress_level=6))
+        print(f"{nazwa:>12} {'png rgb':>12} {czas:>15.2f} {len(wyjscie.getvalue()):>12}")
+        for format in FORMATY:
+            for rozmiar in ROZMIARY:
+                czas = 1000 / renderow_na_sekunde(lambda: zakoduj(obraz, format, rozmiar))
+                print(f"{nazwa:>12} {format + ' ' + rozmiar:>12} {czas:>15.2f} {len(zakoduj(obraz, format, rozmiar)):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Compares Flask's default JSON encoder with orjson on /v1/nearby-stations sized payloads,
+the bytes saved by response compression, and json vs orjson on GBFS feeds.
+
+Usage: python benchmarki/bench_json.py
+"""
+
+import gzip
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import szybki_json
+from zasoby_statyczne import POZIOM_GZIP_DYNAMICZNY, skompresuj
+
+LICZBY_STACJI = [100, 700, 5000]
+LICZBA_POWTORZEN = 5
+SRODEK = (54.3520, 18.6466)
+
+
+def odpowiedz_stacji(liczba: int, generator: np.random.Generator) -> dict:
+    szerokosci = SRODEK[0] + generator.uniform(-0.3, 0.3, liczba)
+    dlugosci = SRODEK[1] + generator.uniform(-0.5, 0.5, liczba)
+    stacje = [{
+        'id': str(10000 + i),
+        'type': 'bike',
+        'provider': 'MEVO',
+        'name': f"Gdańsk, ul. Długa {i}",
+        'location': {'latitude': float(szerokosci[i]), 'longitude': float(dlugosci[i])},
+        'distance_km': round(float(generator.uniform(0, 50)), 2),
+        'bikes_available': int(generator.integers(1, 20)),
+        'docks_available': int(generator.integers(0, 20)),
+        'is_available': True
+    } for i in range(liczba)]
+    return {'success': True, 'count': liczba, 'stations': stacje, 'data_updated_at': '2026-10-17T12:00:00Z'}
+
+
+def feed_informacji(liczba: int) -> bytes:
+    return json.dumps({'last_updated': 1760000000, 'ttl': 60, 'data': {'stations': [{
+        'station_id': str(10000 + i), 'name': f"Gdańsk, ul. Długa {i}", 'lat': SRODEK[0] + i * 1e-4,
+        'lon': SRODEK[1] + i * 1e-4, 'capacity': 20, 'address': f"ul. Długa {i}"
+    } for i in range(liczba)]}}).encode()
+
+
+def zmierz(funkcja, liczba_wywolan: int) -> float:
+    return min(timeit.repeat(funkcja, number=liczba_wywolan, repeat=LICZBA_POWTORZEN)) / liczba_wywolan
+
+
+def main():
+    generator = np.random.default_rng(2025)
+    domyslny = DefaultJSONProvider(Flask(__name__))
+    if szybki_json.orjson is None:
+        print("orjson nie jest zainstalowany, porównanie dotyczy biblioteki standardowej")
+    
+    print(f"{'stacje':>7} {'json [ms]':>10} {'orjson [ms]':>12} {'json [B]':>9} {'orjson [B]':>11} "
+          f"{'gzip [B]':>9} {'gzip [ms]':>10} {'br [B]':>8} {'br [ms]':>8}")
+    for liczba in LICZBY_STACJI:
+        odpowiedz = odpowiedz_stacji(liczba, generator)
+        liczba_wywolan = max(1, 20000 // liczba)
+        
+        czas_json = zmierz(lambda: domyslny.dumps(odpowiedz), liczba_wywolan)
+        czas_orjson = zmierz(lambda: szybki_json.zapisz(odpowiedz), liczba_wywolan)
+        dane_json = domyslny.dumps(odpowiedz).encode()
+        dane = szybki_json.zapisz(odpowiedz)
+        
+        czas_gzip = zmierz(lambda: gzip.compress(dane, compresslevel=POZIOM_GZIP_DYNAMICZNY), liczba_wywolan)
+        _, dane_gzip = skompresuj(dane, ['gzip'])
+        kodowanie, dane_br = skompresuj(dane, ['br'])
+        if kodowanie == 'br':
+            czas_br = zmierz(lambda: skompresuj(dane, ['br']), liczba_wywolan)
+            br = f"{len(dane_br):>8} {czas_br * 1000:>8.2f}"
+        else:
+            br = f"{'-':>8} {'-':>8}"
+        
+        print(f"{liczba:>7} {czas_json * 1000:>10.2f} {czas_orjson * 1000:>12.2f} {len(dane_json):>9} {len(dane):>11} "
+              f"{len(dane_gzip):>9} {czas_gzip * 1000:>10.2f} {br}")
+    
+    print(f"\n{'stacje GBFS':>12} {'json.loads [ms]':>16} {'wczytaj [ms]':>13}")
+    for liczba in LICZBY_STACJI:
+        feed = feed_informacji(liczba)
+        liczba_wywolan = max(1, 20000 // liczba)
+        czas_json = zmierz(lambda: json.loads(feed), liczba_wywolan)
+        czas_szybki = zmierz(lambda: szybki_json.wczytaj(feed), liczba_wywolan)
+        print(f"{liczba:>12} {czas_json * 1000:>16.3f} {czas_szybki * 1000:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
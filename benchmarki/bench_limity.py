@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Per-check cost of the rate-limit storages and their accuracy when several worker
+processes share one limit, the way gunicorn workers do.
+
+Usage: python benchmarki/bench_limity.py [dodatkowy_uri ...]   (e.g. redis://localhost:6379)
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import timeit
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import limity  # noqa: F401
+
+LIMIT = '100/minute'
+LICZBA_PROCESOW = 4
+ZAPYTAN_NA_PROCES = 200
+LICZBA_WYWOLAN = 20000
+
+
+def przepusc(uri: str, kolejka):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    pozycja = parse(LIMIT)
+    kolejka.put(sum(limiter.hit(pozycja, 'wspolny-klient') for _ in range(ZAPYTAN_NA_PROCES)))
+
+
+def dokladnosc(uri: str) -> int:
+    """Requests let through in total when LICZBA_PROCESOW processes hit the same key."""
+    storage_from_string(uri).reset()
+    kontekst = multiprocessing.get_context('fork')
+    kolejka = kontekst.Queue()
+    procesy = [kontekst.Process(target=przepusc, args=(uri, kolejka)) for _ in range(LICZBA_PROCESOW)]
+    for proces in procesy:
+        proces.start()
+    wynik = sum(kolejka.get() for _ in procesy)
+    for proces in procesy:
+        proces.join()
+    return wynik
+
+
+def main():
+    plik = os.path.join(tempfile.mkdtemp(), 'limity.db')
+    uri = ['memory://', 'sqlite://', f'sqlite:///{plik}', *sys.argv[1:]]
+    pozycja = parse('1000000/minute')
+
+    print(f"Limit {LIMIT}, {LICZBA_PROCESOW} procesy po {ZAPYTAN_NA_PROCES} zapytań na jednego klienta")
+    print(f"{'magazyn':<40} {'µs/sprawdzenie':>15} {'przepuszczono':>14}")
+    for adres in uri:
+        limiter = FixedWindowRateLimiter(storage_from_string(adres))
+        klucze = iter(range(10 ** 9))
+        czas = min(timeit.repeat(lambda: limiter.hit(pozycja, str(next(klucze) % 5000)),
+                                 number=LICZBA_WYWOLAN, repeat=3)) / LICZBA_WYWOLAN
+        print(f"{adres:<40} {czas * 1e6:>15.1f} {dokladnosc(adres):>14}")
+    print(f"Oczekiwano {parse(LIMIT).amount} przepuszczonych zapytań dla magazynu współdzielonego")
+
+
+if __name__ == '__main__':
+    main()
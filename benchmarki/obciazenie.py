@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""Offline load test: runs the app against local GBFS and Supabase stand-ins and measures
+throughput and p50/p95/p99 latency per endpoint.
+
+The app runs in a separate gunicorn process (the Flask development server with
+``--serwer flask``, the ASGI mode with ``--serwer uvicorn``), configured only through
+environment variables, so the same run can be repeated with different settings
+(``--env ZAPIS_W_TLE=True``). Results are written as
+JSON; ``--porownaj`` prints the change against an earlier result file.
+
+Usage:
+    python benchmarki/obciazenie.py --profil mieszany --czas 30 --wspolbieznosc 16 --wyjscie wynik.json
+    python benchmarki/obciazenie.py --profil stacje --stacje 5000 --porownaj wynik.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+import jwt
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from atrapy import SRODEK, AtrapaGBFS, AtrapaSupabase
+
+KATALOG_APLIKACJI = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEKRET_JWT = 'sekret-obciazenia-lokalnego-0123456789abcdef'
+LICZBA_UZYTKOWNIKOW = 50
+LIMIT_CZASU_ZAPYTANIA = 30
+CZAS_STARTU = 30
+
+Zapytanie = Tuple[str, str, dict, dict]
+
+
+class Kontekst:
+    """Synthetic users with valid tokens, shared by the request generators."""
+
+    def __init__(self, generator: random.Random, wzor: 'Kontekst' = None):
+        self.generator = generator
+        if wzor is not None:
+            self.uzytkownicy, self.tokeny = wzor.uzytkownicy, wzor.tokeny
+            return
+        self.uzytkownicy = [str(uuid.UUID(int=generator.getrandbits(128), version=4)) for _ in range(LICZBA_UZYTKOWNIKOW)]
+        wygasa = int(time.time()) + 24 * 3600
+        self.tokeny = {
+            uzytkownik: jwt.encode({'sub': uzytkownik, 'aud': 'authenticated', 'exp': wygasa}, SEKRET_JWT, algorithm='HS256')
+            for uzytkownik in self.uzytkownicy
+        }
+
+    def punkt(self) -> Tuple[float, float]:
+        return (SRODEK[0] + self.generator.uniform(-0.1, 0.1), SRODEK[1] + self.generator.uniform(-0.2, 0.2))
+
+    def uzytkownik(self) -> str:
+        return self.generator.choice(self.uzytkownicy)
+
+
+def pobliskie_stacje(k: Kontekst) -> Zapytanie:
+    lat, lon = k.punkt()
+    return 'GET', f"/v1/nearby-stations?latitude={lat:.5f}&longitude={lon:.5f}&radius={k.generator.choice([1, 2, 5])}", None, {}
+
+
+def pobliskie_stacje_wszystkie(k: Kontekst) -> Zapytanie:
+    lat, lon = k.punkt()
+    return 'GET', f"/v1/nearby-stations?latitude={lat:.5f}&longitude={lon:.5f}&radius=50", None, {}
+
+
+def najblizsza_stacja(k: Kontekst) -> Zapytanie:
+    lat, lon = k.punkt()
+    return 'GET', f"/v1/search-nearest-station?latitude={lat:.5f}&longitude={lon:.5f}", None, {}
+
+
+def oblicz(k: Kontekst) -> Zapytanie:
+    (lat, lon), (cel_lat, cel_lon) = k.punkt(), k.punkt()
+    return 'POST', '/v1/calculate-co2-savings', {
+        'latitude': lat, 'longitude': lon, 'destination_latitude': cel_lat, 'destination_longitude': cel_lon
+    }, {}
+
+
+def oblicz_paczke(k: Kontekst) -> Zapytanie:
+    trasy = []
+    for _ in range(100):
+        (lat, lon), (cel_lat, cel_lon) = k.punkt(), k.punkt()
+        trasy.append({'latitude': lat, 'longitude': lon, 'destination_latitude': cel_lat, 'destination_longitude': cel_lon})
+    return 'POST', '/v1/calculate-co2-savings/batch', {'trips': trasy}, {}
+
+
+def zapisz_podroz(k: Kontekst) -> Zapytanie:
+    uzytkownik = k.uzytkownik()
+    (lat, lon), (cel_lat, cel_lon) = k.punkt(), k.punkt()
+    return 'POST', '/v1/save-journey', {
+        'user_id': uzytkownik, 'latitude': lat, 'longitude': lon,
+        'destination_latitude': cel_lat, 'destination_longitude': cel_lon,
+        'chosen_transport': k.generator.choice(['bike', 'bike', 'car'])
+    }, {'Authorization': f"Bearer {k.tokeny[uzytkownik]}"}
+
+
+def statystyki_uzytkownika(k: Kontekst) -> Zapytanie:
+    return 'GET', f"/v1/user-stats/{k.uzytkownik()}", None, {}
+
+
+def statystyki_globalne(k: Kontekst) -> Zapytanie:
+    return 'GET', '/v1/global-stats', None, {}
+
+
+def grafika(k: Kontekst) -> Zapytanie:
+    return 'GET', f"/v1/share-graphic/{k.uzytkownik()}", None, {'Accept': 'image/webp,*/*'}
+
+
+def grafika_statystyk(k: Kontekst) -> Zapytanie:
+    return 'GET', f"/v1/share-graphic-stats/{k.uzytkownik()}?size=thumb", None, {}
+
+
+def strona_glowna(k: Kontekst) -> Zapytanie:
+    return 'GET', '/', None, {'Accept-Encoding': 'gzip, br'}
+
+
+# Profile -> [(endpoint name, weight, request generator)].
+PROFILE: Dict[str, List[Tuple[str, int, Callable[[Kontekst], Zapytanie]]]] = {
+    'mieszany': [
+        ('nearby-stations', 30, pobliskie_stacje),
+        ('search-nearest-station', 15, najblizsza_stacja),
+        ('calculate-co2-savings', 20, oblicz),
+        ('save-journey', 10, zapisz_podroz),
+        ('user-stats', 10, statystyki_uzytkownika),
+        ('global-stats', 5, statystyki_globalne),
+        ('share-graphic', 5, grafika),
+        ('index', 5, strona_glowna),
+    ],
+    'stacje': [
+        ('nearby-stations', 60, pobliskie_stacje),
+        ('nearby-stations-50km', 10, pobliskie_stacje_wszystkie),
+        ('search-nearest-station', 30, najblizsza_stacja),
+    ],
+    'obliczenia': [
+        ('calculate-co2-savings', 80, oblicz),
+        ('calculate-co2-savings-batch', 20, oblicz_paczke),
+    ],
+    'zapis': [
+        ('save-journey', 70, zapisz_podroz),
+        ('user-stats', 30, statystyki_uzytkownika),
+    ],
+    'grafiki': [
+        ('share-graphic', 50, grafika),
+        ('share-graphic-stats', 50, grafika_statystyk),
+    ],
+}
+
+
+def przygotuj_baze(atrapa: AtrapaSupabase, kontekst: Kontekst):
+    for uzytkownik in kontekst.uzytkownicy:
+        rowerem = kontekst.generator.randint(0, 40)
+        samochodem = kontekst.generator.randint(0, 10)
+        atrapa.dodaj_uzytkownika(uzytkownik, rowerem, samochodem, rowerem * 0.6, samochodem * 0.9)
+
+
+def uruchom_serwer(args, adres_gbfs: str, adres_supabase: str, plik_systemow: str) -> Tuple[subprocess.Popen, str]:
+    port = args.port
+    srodowisko = {
+        **os.environ,
+        'ADRES_SUPABASE': adres_supabase,
+        'KLUCZ_SUPABASE': jwt.encode({'role': 'anon'}, SEKRET_JWT, algorithm='HS256'),
+        'SEKRET_JWT_SUPABASE': SEKRET_JWT,
+        'PLIK_SYSTEMOW_GBFS': plik_systemow,
+        'LIMITY_ZAPYTAN': 'False',
+        'PORT': str(port),
+    }
+    for wpis in args.env:
+        nazwa, _, wartosc = wpis.partition('=')
+        srodowisko[nazwa] = wartosc
+
+    if args.serwer == 'gunicorn':
+        polecenie = [sys.executable, '-m', 'gunicorn', '-w', str(args.procesy), '--threads', str(args.watki),
+                     '-b', f"127.0.0.1:{port}", '--log-level', 'warning', 'app:app']
+    elif args.serwer == 'uvicorn':
+        polecenie = [sys.executable, '-m', 'uvicorn', 'asgi:aplikacja', '--workers', str(args.procesy),
+                     '--port', str(port), '--log-level', 'warning', '--no-access-log']
+    else:
+        polecenie = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--with-threads']
+
+    proces = subprocess.Popen(polecenie, cwd=KATALOG_APLIKACJI, env=srodowisko,
+                              stdout=subprocess.DEVNULL, stderr=open(args.log_serwera, 'w'))
+    adres = f"http://127.0.0.1:{port}"
+    termin = time.monotonic() + CZAS_STARTU
+    while time.monotonic() < termin:
+        if proces.poll() is not None:
+            raise RuntimeError(f"Serwer zakończył działanie, szczegóły w {args.log_serwera}")
+        try:
+            if requests.get(adres + '/health', timeout=1).ok:
+                return proces, adres
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proces.terminate()
+    raise RuntimeError(f"Serwer nie wystartował w {CZAS_STARTU}s, szczegóły w {args.log_serwera}")
+
+
+def obciazaj(adres: str, profil, wspolbieznosc: int, rozgrzewka: float, czas: float, ziarno: int) -> dict:
+    pomiary: Dict[str, List[float]] = defaultdict(list)
+    bledy: Dict[str, int] = defaultdict(int)
+    statusy: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    blokada = threading.Lock()
+    nazwy = [nazwa for nazwa, _, _ in profil]
+    wagi = [waga for _, waga, _ in profil]
+    generatory = {nazwa: generator for nazwa, _, generator in profil}
+
+    start = time.monotonic()
+    poczatek_pomiaru = start + rozgrzewka
+    koniec = poczatek_pomiaru + czas
+
+    def pracownik(numer: int):
+        kontekst = Kontekst(random.Random(ziarno + numer + 1), wspolny_kontekst)
+        sesja = requests.Session()
+        lokalne = defaultdict(list)
+        lokalne_bledy = defaultdict(int)
+        lokalne_statusy = defaultdict(lambda: defaultdict(int))
+
+        while True:
+            teraz = time.monotonic()
+            if teraz >= koniec:
+                break
+            nazwa = kontekst.generator.choices(nazwy, wagi)[0]
+            metoda, sciezka, tresc, naglowki = generatory[nazwa](kontekst)
+            poczatek = time.perf_counter()
+            try:
+                odpowiedz = sesja.request(metoda, adres + sciezka, json=tresc, headers=naglowki, timeout=LIMIT_CZASU_ZAPYTANIA)
+                odpowiedz.content
+                status = odpowiedz.status_code
+            except requests.RequestException:
+                status = 0
+            czas_zapytania = time.perf_counter() - poczatek
+
+            if teraz < poczatek_pomiaru:
+                continue
+            lokalne[nazwa].append(czas_zapytania)
+            lokalne_statusy[nazwa][status] += 1
+            if status == 0 or status >= 500:
+                lokalne_bledy[nazwa] += 1
+
+        with blokada:
+            for nazwa, czasy in lokalne.items():
+                pomiary[nazwa].extend(czasy)
+                bledy[nazwa] += lokalne_bledy[nazwa]
+                for status, liczba in lokalne_statusy[nazwa].items():
+                    statusy[nazwa][status] += liczba
+
+    wspolny_kontekst = Kontekst(random.Random(ziarno))
+    watki = [threading.Thread(target=pracownik, args=(numer,)) for numer in range(wspolbieznosc)]
+    for watek in watki:
+        watek.start()
+    for watek in watki:
+        watek.join()
+
+    def podsumuj(czasy: List[float], liczba_bledow: int) -> dict:
+        ms = np.asarray(czasy) * 1000
+        return {
+            'liczba': len(czasy),
+            'bledy': liczba_bledow,
+            'przepustowosc': round(len(czasy) / czas, 2),
+            'sredni_ms': round(float(ms.mean()), 2) if len(ms) else None,
+            'p50_ms': round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+            'p95_ms': round(float(np.percentile(ms, 95)), 2) if len(ms) else None,
+            'p99_ms': round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+            'maks_ms': round(float(ms.max()), 2) if len(ms) else None,
+        }
+
+    endpointy = {nazwa: {**podsumuj(pomiary[nazwa], bledy[nazwa]), 'statusy': {str(s): l for s, l in sorted(statusy[nazwa].items())}}
+                 for nazwa in nazwy if pomiary[nazwa]}
+    wszystkie = [t for czasy in pomiary.values() for t in czasy]
+    return {'endpointy': endpointy, 'razem': podsumuj(wszystkie, sum(bledy.values()))}
+
+
+def wersja_kodu() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=KATALOG_APLIKACJI,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def drukuj(wynik: dict, poprzedni: dict = None):
+    print(f"\n{'endpoint':<30} {'zapytań':>8} {'błędy':>6} {'1/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    wiersze = list(wynik['endpointy'].items()) + [('RAZEM', wynik['razem'])]
+    for nazwa, s in wiersze:
+        print(f"{nazwa:<30} {s['liczba']:>8} {s['bledy']:>6} {s['przepustowosc']:>8.1f} "
+              f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+        if poprzedni is None:
+            continue
+        stary = poprzedni['razem'] if nazwa == 'RAZEM' else poprzedni['endpointy'].get(nazwa)
+        if stary:
+            zmiany = [f"{(s[k] - stary[k]) / stary[k] * 100:+.0f}%" if stary[k] else '-'
+                      for k in ('przepustowosc', 'p50_ms', 'p95_ms', 'p99_ms')]
+            print(f"{'  zmiana':<30} {'':>8} {'':>6} {zmiany[0]:>8} {zmiany[1]:>9} {zmiany[2]:>9} {zmiany[3]:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--profil', choices=sorted(PROFILE), default='mieszany')
+    parser.add_argument('--czas', type=float, default=20, help='czas pomiaru w sekundach')
+    parser.add_argument('--rozgrzewka', type=float, default=3, help='pominięte sekundy na początku')
+    parser.add_argument('--wspolbieznosc', type=int, default=8, help='liczba równoległych klientów')
+    parser.add_argument('--stacje', type=int, default=700, help='liczba stacji w atrapie GBFS')
+    parser.add_argument('--opoznienie-bazy', type=float, default=0.01, help='opóźnienie atrapy Supabase w sekundach')
+    parser.add_argument('--opoznienie-gbfs', type=float, default=0.05, help='opóźnienie atrapy GBFS w sekundach')
+    parser.add_argument('--serwer', choices=['gunicorn', 'uvicorn', 'flask'], default='gunicorn')
+    parser.add_argument('--procesy', type=int, default=1, help='procesy gunicorn (-w) lub uvicorn (--workers)')
+    parser.add_argument('--watki', type=int, default=8, help='wątki na proces gunicorn (--threads)')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--env', action='append', default=[], help='dodatkowa zmienna serwera NAZWA=WARTOSC')
+    parser.add_argument('--ziarno', type=int, default=2025)
+    parser.add_argument('--wyjscie', help='plik JSON z wynikami')
+    parser.add_argument('--porownaj', help='wcześniejszy plik JSON do porównania')
+    parser.add_argument('--log-serwera', default=os.devnull, help='plik na stderr serwera')
+    args = parser.parse_args()
+
+    gbfs = AtrapaGBFS(args.stacje, opoznienie=args.opoznienie_gbfs)
+    baza = AtrapaSupabase(opoznienie=args.opoznienie_bazy)
+    adres_gbfs = gbfs.uruchom()
+    adres_supabase = baza.uruchom()
+    przygotuj_baze(baza, Kontekst(random.Random(args.ziarno)))
+
+    plik_systemow = os.path.join(KATALOG_APLIKACJI, 'benchmarki', f".systemy_obciazenia_{os.getpid()}.json")
+    with open(plik_systemow, 'w') as f:
+        json.dump([{'name': 'MEVO', 'url': adres_gbfs}], f)
+
+    proces = None
+    try:
+        proces, adres = uruchom_serwer(args, adres_gbfs, adres_supabase, plik_systemow)
+        print(f"Profil {args.profil}: {args.wspolbieznosc} klientów, {args.czas:.0f}s, {args.stacje} stacji, serwer {args.serwer}")
+        wynik = obciazaj(adres, PROFILE[args.profil], args.wspolbieznosc, args.rozgrzewka, args.czas, args.ziarno)
+    finally:
+        if proces is not None:
+            proces.terminate()
+            try:
+                proces.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proces.kill()
+        os.remove(plik_systemow)
+        gbfs.zatrzymaj()
+        baza.zatrzymaj()
+
+    wynik = {
+        'wersja': wersja_kodu(),
+        'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'system': {'python': platform.python_version(), 'procesory': os.cpu_count()},
+        'parametry': {k: v for k, v in vars(args).items() if k not in ('wyjscie', 'porownaj', 'log_serwera')},
+        'zapytania_gbfs': gbfs.liczba_zapytan,
+        'zapytania_bazy': baza.liczba_zapytan,
+        **wynik
+    }
+
+    poprzedni = None
+    if args.porownaj:
+        with open(args.porownaj) as f:
+            poprzedni = json.load(f)
+    drukuj(wynik, poprzedni)
+
+    if args.wyjscie:
+        with open(args.wyjscie, 'w') as f:
+            json.dump(wynik, f, indent=2, ensure_ascii=False)
+        print(f"\nZapisano {args.wyjscie}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from postgrest import AsyncPostgrestClient
+
+from metryki import REJESTR
+
+logger = logging.getLogger(__name__)
+
+DOMYSLNA_LICZBA_ZAPYTAN_ROWNOLEGLYCH = 8
+OPERACJE_HTTP = {'GET': 'select', 'HEAD': 'select', 'POST': 'insert', 'PATCH': 'update', 'DELETE': 'delete'}
+
+CZAS_ZAPYTAN_SUPABASE = REJESTR.histogram(
+    'supabase_request_duration_seconds', 'Time to response headers of PostgREST calls.', ('table', 'operation')
+)
+BLEDY_SUPABASE = REJESTR.licznik(
+    'supabase_errors_total', 'PostgREST calls answered with an error status.', ('table', 'operation', 'status')
+)
+
+
+def _opisz_zapytanie(zapytanie) -> tuple[str, str]:
+    sciezka = zapytanie.url.path.split('/rest/v1/', 1)[-1].strip('/')
+    if sciezka.startswith('rpc/'):
+        return sciezka[4:], 'rpc'
+    operacja = OPERACJE_HTTP.get(zapytanie.method, zapytanie.method.lower())
+    if operacja == 'insert' and 'merge-duplicates' in zapytanie.headers.get('Prefer', ''):
+        operacja = 'upsert'
+    return sciezka, operacja
+
+
+def _poczatek_zapytania(zapytanie):
+    zapytanie.extensions['poczatek_pomiaru'] = time.perf_counter()
+
+
+def _koniec_zapytania(odpowiedz):
+    poczatek = odpowiedz.request.extensions.get('poczatek_pomiaru')
+    if poczatek is None:
+        return
+    tabela, operacja = _opisz_zapytanie(odpowiedz.request)
+    CZAS_ZAPYTAN_SUPABASE.obserwuj(time.perf_counter() - poczatek, tabela, operacja)
+    if odpowiedz.status_code >= 400:
+        BLEDY_SUPABASE.zwieksz(tabela, operacja, str(odpowiedz.status_code))
+
+
+def _zapis_podrozy(klient, podroz: dict):
+    """Steps of saving a journey, shared by the sync and async data access.
+
+    Yields (query, warning) pairs and receives each query's response; a step with a
+    warning is best-effort and only logged when it fails. Returns the new journey id.
+    """
+    wynik = yield klient.table('journey_tracking').insert(podroz['journey']), None
+    if podroz['calculation']:
+        yield klient.table('co2_calculations').insert(podroz['calculation']), "Nie udało się zapisać obliczenia"
+    yield klient.rpc('zwieksz_statystyki_uzytkownika', podroz['stats']), "Nie udało się zaktualizować statystyk użytkownika"
+    return wynik.data[0]['id'] if wynik.data else None
+
+
+async def _apoczatek_zapytania(zapytanie):
+    _poczatek_zapytania(zapytanie)
+
+
+async def _akoniec_zapytania(odpowiedz):
+    _koniec_zapytania(odpowiedz)
+
+
+class DostepDanych:
+    """Per-user reads from Supabase, with independent queries issued concurrently.
+
+    All queries go through one client, whose HTTP connection pool is shared by the
+    worker threads, so an endpoint needing several reads waits for the slowest one
+    instead of the sum of their round-trips.
+    """
+
+    def __init__(self, klient, liczba_watkow: int = DOMYSLNA_LICZBA_ZAPYTAN_ROWNOLEGLYCH):
+        self.klient = klient
+        # The PostgREST client is created lazily; do it now so worker threads never race on it.
+        sesja = klient.postgrest.session
+        sesja.event_hooks['request'].append(_poczatek_zapytania)
+        sesja.event_hooks['response'].append(_koniec_zapytania)
+        self._wykonawca = ThreadPoolExecutor(max_workers=liczba_watkow, thread_name_prefix="zapytania-supabase")
+
+    def rownolegle(self, *zapytania: Callable):
+        """Runs the given callables concurrently and returns their results in order."""
+        zadania = [self._wykonawca.submit(zapytanie) for zapytanie in zapytania]
+        return [zadanie.result() for zadanie in zadania]
+
+    def statystyki_uzytkownika(self, user_id: str) -> Optional[dict]:
+        wynik = self.klient.table('user_stats').select('*').eq('user_id', user_id).execute()
+        return wynik.data[0] if wynik.data else None
+
+    def sumy_obliczen(self, user_id: str) -> tuple[float, float, int]:
+        """Legacy co2_calculations totals of a user: (saved kg, distance km, count)."""
+        wynik = self.klient.table('co2_calculations_totals').select(
+            'total_co2_savings_kg,total_distance_km,calculations_count'
+        ).eq('user_id', user_id).execute()
+
+        if not wynik.data:
+            return 0, 0, 0
+        suma = wynik.data[0]
+        return suma['total_co2_savings_kg'], suma['total_distance_km'], suma['calculations_count']
+
+    def liczba_podrozy(self, user_id: str) -> int:
+        """Counts journey_tracking rows of a user without transferring them."""
+        wynik = self.klient.table('journey_tracking').select('id', count='exact').eq('user_id', user_id).limit(1).execute()
+        return wynik.count or 0
+
+    def profil_uzytkownika(self, user_id: str, z_liczba_podrozy: bool = False) -> tuple:
+        """Returns (user_stats row or None, legacy totals[, journey count]) in one round-trip of latency."""
+        zapytania = [lambda: self.statystyki_uzytkownika(user_id), lambda: self.sumy_obliczen(user_id)]
+        if z_liczba_podrozy:
+            zapytania.append(lambda: self.liczba_podrozy(user_id))
+        return tuple(self.rownolegle(*zapytania))
+
+    def zapisz_podroz(self, podroz: dict) -> Optional[int]:
+        """Writes a prepared journey (see app.przygotuj_podroz) and returns its journey_tracking id."""
+        kroki = _zapis_podrozy(self.klient, podroz)
+        odpowiedz = None
+        while True:
+            try:
+                zapytanie, ostrzezenie = kroki.send(odpowiedz)
+            except StopIteration as koniec:
+                return koniec.value
+            try:
+                odpowiedz = zapytanie.execute()
+            except Exception as e:
+                if ostrzezenie is None:
+                    raise
+                logger.warning(f"{ostrzezenie}: {e}")
+                odpowiedz = None
+
+    def zamknij(self):
+        self._wykonawca.shutdown(wait=False, cancel_futures=True)
+
+
+class DostepDanychAsync:
+    """Coroutine counterpart of DostepDanych on postgrest's AsyncPostgrestClient.
+
+    Independent queries are awaited together, and no thread waits on a round-trip,
+    so one event loop keeps the queries of many requests in flight at once.
+    """
+
+    def __init__(self, klient: AsyncPostgrestClient):
+        self.klient = klient
+        klient.session.event_hooks['request'].append(_apoczatek_zapytania)
+        klient.session.event_hooks['response'].append(_akoniec_zapytania)
+
+    @classmethod
+    def z_klienta(cls, klient) -> 'DostepDanychAsync':
+        """Async client with the URL, schema and headers of a configured synchronous Supabase client."""
+        return cls(AsyncPostgrestClient(
+            klient.rest_url,
+            schema=klient.options.schema,
+            headers=dict(klient.postgrest.session.headers),
+            timeout=klient.options.postgrest_client_timeout
+        ))
+
+    async def statystyki_uzytkownika(self, user_id: str) -> Optional[dict]:
+        wynik = await self.klient.table('user_stats').select('*').eq('user_id', user_id).execute()
+        return wynik.data[0] if wynik.data else None
+
+    async def sumy_obliczen(self, user_id: str) -> tuple[float, float, int]:
+        wynik = await self.klient.table('co2_calculations_totals').select(
+            'total_co2_savings_kg,total_distance_km,calculations_count'
+        ).eq('user_id', user_id).execute()
+
+        if not wynik.data:
+            return 0, 0, 0
+        suma = wynik.data[0]
+        return suma['total_co2_savings_kg'], suma['total_distance_km'], suma['calculations_count']
+
+    async def liczba_podrozy(self, user_id: str) -> int:
+        wynik = await self.klient.table('journey_tracking').select('id', count='exact').eq('user_id', user_id).limit(1).execute()
+        return wynik.count or 0
+
+    async def profil_uzytkownika(self, user_id: str, z_liczba_podrozy: bool = False) -> tuple:
+        zapytania = [self.statystyki_uzytkownika(user_id), self.sumy_obliczen(user_id)]
+        if z_liczba_podrozy:
+            zapytania.append(self.liczba_podrozy(user_id))
+        return tuple(await asyncio.gather(*zapytania))
+
+    async def zapisz_podroz(self, podroz: dict) -> Optional[int]:
+        kroki = _zapis_podrozy(self.klient, podroz)
+        odpowiedz = None
+        while True:
+            try:
+                zapytanie, ostrzezenie = kroki.send(odpowiedz)
+            except StopIteration as koniec:
+                return koniec.value
+            try:
+                odpowiedz = await zapytanie.execute()
+            except Exception as e:
+                if ostrzezenie is None:
+                    raise
+                logger.warning(f"{ostrzezenie}: {e}")
+                odpowiedz = None
+
+    async def zamknij(self):
+        await self.klient.aclose()
@@ -0,0 +1,46 @@
+import math
+from typing import Union
+
+import numpy as np
+
+PROMIEN_ZIEMI_KM = 6371.0
+
+Wspolrzedne = Union[float, np.ndarray]
+
+
+def oblicz_dystans(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Haversine distance in km between two points.
+
+    Kept on plain ``math`` because a single pair is cheaper without NumPy call overhead.
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    
+    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
+    c = 2 * math.asin(math.sqrt(a))
+    
+    return PROMIEN_ZIEMI_KM * c
+
+
+def oblicz_dystanse(lat1: Wspolrzedne, lon1: Wspolrzedne, lat2: Wspolrzedne, lon2: Wspolrzedne) -> np.ndarray:
+    """Element-wise haversine distance in km; arguments broadcast like NumPy arrays."""
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    sin_delta_lat = np.sin((lat2_rad - lat1_rad) / 2)
+    sin_delta_lon = np.sin(np.radians(np.subtract(lon2, lon1)) / 2)
+    
+    a = sin_delta_lat ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * sin_delta_lon ** 2
+    return 2 * PROMIEN_ZIEMI_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def macierz_dystansow(szerokosci_startu: np.ndarray, dlugosci_startu: np.ndarray,
+                      szerokosci: np.ndarray, dlugosci: np.ndarray) -> np.ndarray:
+    """Distances from every origin (rows) to every point (columns) in one pass."""
+    return oblicz_dystanse(
+        np.asarray(szerokosci_startu, dtype=np.float64)[:, np.newaxis],
+        np.asarray(dlugosci_startu, dtype=np.float64)[:, np.newaxis],
+        np.asarray(szerokosci, dtype=np.float64)[np.newaxis, :],
+        np.asarray(dlugosci, dtype=np.float64)[np.newaxis, :]
+    )
@@ -0,0 +1,387 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from cachetools import LRUCache
+from PIL import Image, ImageDraw, ImageFont
+
+from metryki import ZAPYTANIA_PAMIECI
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so that cached images (also on disk) are not reused.
+WERSJA_GRAFIK = 2
+DOMYSLNY_ROZMIAR_PAMIECI_GRAFIK = 32 * 1024 * 1024
+DOMYSLNY_ROZMIAR_KATALOGU_GRAFIK = 512 * 1024 * 1024
+# Once the disk tier exceeds its limit, the least recently used files are removed down to this fraction of it.
+CZESC_PO_PRZYCIECIU = 0.9
+DOMYSLNY_LIMIT_CZASU_RENDEROWANIA = 10.0
+SZEROKOSC, WYSOKOSC = 1200, 630
+FORMATY = {'png': 'image/png', 'webp': 'image/webp'}
+# Size variant -> integer downscale factor of the full 1200x630 image.
+ROZMIARY = {'full': 1, 'thumb': 2}
+CZCIONKA_POGRUBIONA = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+CZCIONKA_ZWYKLA = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+def klucz_grafiki(rodzaj: str, parametry: tuple, format: str = 'png', rozmiar: str = 'full') -> str:
+    """Content address of an image: hash of everything that affects the encoded bytes."""
+    opis = repr((WERSJA_GRAFIK, rodzaj, parametry, format, rozmiar)).encode()
+    return hashlib.sha256(opis).hexdigest()
+
+
+class PamiecGrafik:
+    """Rendered images keyed by klucz_grafiki: a byte-bounded LRU plus an optional disk tier.
+    
+    The disk tier is bounded too (``maks_bajtow_dysku``, 0 = no limit): file mtimes are
+    refreshed on every disk hit, and once the directory grows past the limit the least
+    recently used files are removed. Worker processes sharing the directory each rescan
+    it after writing a tenth of the limit, so their combined writes are accounted for.
+    """
+    
+    def __init__(self, maks_bajtow: int = DOMYSLNY_ROZMIAR_PAMIECI_GRAFIK, katalog: Optional[str] = None,
+                 maks_bajtow_dysku: int = DOMYSLNY_ROZMIAR_KATALOGU_GRAFIK):
+        self._pamiec = LRUCache(maxsize=maks_bajtow, getsizeof=len)
+        self._blokada = threading.Lock()
+        self.katalog = katalog
+        self.maks_bajtow_dysku = maks_bajtow_dysku
+        self._blokada_dysku = threading.Lock()
+        self._rozmiar_dysku = 0
+        self._zapisane_od_przegladu = 0
+        if katalog:
+            os.makedirs(katalog, exist_ok=True)
+            if maks_bajtow_dysku:
+                self._przytnij_katalog()
+    
+    def _sciezka(self, klucz: str) -> str:
+        return os.path.join(self.katalog, klucz[:2], klucz)
+    
+    def pobierz(self, klucz: str) -> Optional[bytes]:
+        with self._blokada:
+            dane = self._pamiec.get(klucz)
+        if dane is not None:
+            ZAPYTANIA_PAMIECI.zwieksz('share_graphic', 'hit')
+            return dane
+        
+        if self.katalog:
+            sciezka = self._sciezka(klucz)
+            try:
+                with open(sciezka, 'rb') as f:
+                    dane = f.read()
+                os.utime(sciezka)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Nie udało się odczytać grafiki z dysku: {e}")
+        if dane is None:
+            ZAPYTANIA_PAMIECI.zwieksz('share_graphic', 'miss')
+            return None
+        
+        ZAPYTANIA_PAMIECI.zwieksz('share_graphic', 'hit_disk')
+        with self._blokada:
+            self._pamiec[klucz] = dane
+        return dane
+    
+    def zapisz(self, klucz: str, dane: bytes):
+        with self._blokada:
+            self._pamiec[klucz] = dane
+        if not self.katalog:
+            return
+        
+        sciezka = self._sciezka(klucz)
+        try:
+            os.makedirs(os.path.dirname(sciezka), exist_ok=True)
+            tymczasowy = f"{sciezka}.{os.getpid()}.tmp"
+            with open(tymczasowy, 'wb') as f:
+                f.write(dane)
+            os.replace(tymczasowy, sciezka)
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać grafiki na dysku: {e}")
+            return
+        
+        if self.maks_bajtow_dysku:
+            with self._blokada_dysku:
+                self._zapisane_od_przegladu += len(dane)
+                przeglad = (self._rozmiar_dysku + self._zapisane_od_przegladu > self.maks_bajtow_dysku
+                            or self._zapisane_od_przegladu > self.maks_bajtow_dysku // 10)
+            if przeglad:
+                self._przytnij_katalog()
+    
+    def _przytnij_katalog(self):
+        """Rescans the disk tier and removes the least recently used files above the limit."""
+        if not self._blokada_dysku.acquire(blocking=False):
+            return
+        try:
+            pliki = []
+            for podkatalog in os.scandir(self.katalog):
+                if not podkatalog.is_dir():
+                    continue
+                for plik in os.scandir(podkatalog.path):
+                    if plik.name.endswith('.tmp'):
+                        continue
+                    try:
+                        stan = plik.stat()
+                    except FileNotFoundError:
+                        continue
+                    pliki.append((stan.st_mtime, stan.st_size, plik.path))
+            
+            rozmiar = sum(wielkosc for _, wielkosc, _ in pliki)
+            if rozmiar > self.maks_bajtow_dysku:
+                cel = self.maks_bajtow_dysku * CZESC_PO_PRZYCIECIU
+                usuniete = 0
+                for _, wielkosc, sciezka in sorted(pliki):
+                    if rozmiar <= cel:
+                        break
+                    try:
+                        os.remove(sciezka)
+                        usuniete += 1
+                    except FileNotFoundError:
+                        pass
+                    rozmiar -= wielkosc
+                logger.info(f"Usunięto {usuniete} najdawniej używanych grafik z {self.katalog}")
+            
+            self._rozmiar_dysku = rozmiar
+            self._zapisane_od_przegladu = 0
+        except OSError as e:
+            logger.warning(f"Nie udało się przejrzeć katalogu grafik: {e}")
+        finally:
+            self._blokada_dysku.release()
+
+
+class ZasobyGrafik:
+    """Fonts and gradient backgrounds shared by all renders in a process.
+    
+    Fonts are loaded on first use and backgrounds (gradient plus the top bar) are drawn
+    once per variant, so a render only copies a base image and draws its text.
+    """
+    
+    def __init__(self):
+        self._czcionki: Dict[Tuple[str, int], ImageFont.ImageFont] = {}
+        self._tla: Dict[tuple, Image.Image] = {}
+        self._blokada = threading.Lock()
+    
+    def czcionka(self, sciezka: str, rozmiar: int):
+        klucz = (sciezka, rozmiar)
+        czcionka = self._czcionki.get(klucz)
+        if czcionka is None:
+            try:
+                czcionka = ImageFont.truetype(sciezka, rozmiar)
+            except Exception:
+                czcionka = ImageFont.load_default()
+            self._czcionki[klucz] = czcionka
+        return czcionka
+    
+    def tlo(self, jest_negatywny: bool, jasnosc: int, wysokosc_paska: int) -> Image.Image:
+        """Returns a fresh copy of the background, safe to draw on."""
+        klucz = (jest_negatywny, jasnosc, wysokosc_paska)
+        with self._blokada:
+            obraz = self._tla.get(klucz)
+            if obraz is None:
+                obraz = self._narysuj_tlo(jest_negatywny, jasnosc, wysokosc_paska)
+                self._tla[klucz] = obraz
+        return obraz.copy()
+    
+    @staticmethod
+    def _narysuj_tlo(jest_negatywny: bool, jasnosc: int, wysokosc_paska: int) -> Image.Image:
+        szerokosc, wysokosc = SZEROKOSC, WYSOKOSC
+        obraz = Image.new('RGB', (szerokosc, wysokosc), color='#000000')
+        rysowanie = ImageDraw.Draw(obraz)
+        
+        for y in range(wysokosc):
+            odcien = int(jasnosc * (y / wysokosc))
+            kolor = (odcien, 0, 0) if jest_negatywny else (odcien, odcien, odcien)
+            rysowanie.rectangle([(0, y), (szerokosc, y+1)], fill=kolor)
+        
+        rysowanie.rectangle([(0, 0), (szerokosc, wysokosc_paska)], fill='#ff4444' if jest_negatywny else '#00ff00')
+        return obraz
+
+
+_zasoby: Optional[ZasobyGrafik] = None
+
+
+def pobierz_zasoby() -> ZasobyGrafik:
+    global _zasoby
+    if _zasoby is None:
+        _zasoby = ZasobyGrafik()
+    return _zasoby
+
+
+def zakoduj(obraz: Image.Image, format: str = 'png', rozmiar: str = 'full') -> bytes:
+    """Encodes a rendered graphic.
+    
+    The graphics are flat colours plus anti-aliased text, so a 256-colour palette is
+    visually lossless and both encoders work on it: PNG gets about a third of the RGB
+    size at a fraction of the deflate time, lossless WebP is smaller still.
+    """
+    skala = ROZMIARY[rozmiar]
+    if skala > 1:
+        obraz = obraz.reduce(skala)
+    obraz = obraz.quantize(256, method=Image.Quantize.FASTOCTREE)
+    
+    img_io = BytesIO()
+    if format == 'webp':
+        obraz.save(img_io, 'WEBP', lossless=True, quality=25, method=1)
+    else:
+        obraz.save(img_io, 'PNG', compress_level=6)
+    return img_io.getvalue()
+
+
+def parametry_grafiki_dzielenia(netto: float, liczba_podrozy: int) -> tuple:
+    """Values actually drawn on the share graphic, used both for rendering and as the cache key."""
+    jest_negatywny = netto < 0
+    return (jest_negatywny, f"{abs(netto) if jest_negatywny else netto:.2f}", liczba_podrozy)
+
+
+def renderuj_grafike_dzielenia(jest_negatywny: bool, tekst_co2: str, liczba: int,
+                               zasoby: Optional[ZasobyGrafik] = None) -> Image.Image:
+    zasoby = zasoby or pobierz_zasoby()
+    szerokosc, wysokosc = SZEROKOSC, WYSOKOSC
+    czcionka_wartosc = zasoby.czcionka(CZCIONKA_POGRUBIONA, 120)
+    czcionka_etykieta = zasoby.czcionka(CZCIONKA_ZWYKLA, 40)
+    
+    if jest_negatywny:
+        obraz = zasoby.tlo(True, 30, 8)
+        kolor_tekstu = '#ff4444'
+        etykieta = "KG CO₂ EMISJI"
+    else:
+        obraz = zasoby.tlo(False, 20, 8)
+        kolor_tekstu = '#00ff00'
+        etykieta = "KG CO₂ OSZCZĘDZONO"
+    rysowanie = ImageDraw.Draw(obraz)
+    
+    rysowanie.text((szerokosc//2, 200), tekst_co2, fill=kolor_tekstu, font=czcionka_wartosc, anchor="mm")
+    
+    rysowanie.text((szerokosc//2, 380), etykieta, fill='#ffffff', font=czcionka_etykieta, anchor="mm")
+    
+    tekst_podrozy = f"{liczba} podróży"
+    rysowanie.text((szerokosc//2, 480), tekst_podrozy, fill='#888888', font=czcionka_etykieta, anchor="mm")
+    
+    rysowanie.text((szerokosc//2, wysokosc-50), "hh25.morawski.my", fill='#666666', font=czcionka_etykieta, anchor="mm")
+    
+    return obraz
+
+
+def parametry_grafiki_statystyk(netto: float, podroze_rowerem: int, podroze_samochodem: int, dystans: float) -> tuple:
+    """Values actually drawn on the stats graphic, used both for rendering and as the cache key."""
+    jest_negatywny = netto < 0
+    tekst_statystyk = f"Rower: {podroze_rowerem} | Auto: {podroze_samochodem} | {dystans:.1f} km"
+    return (jest_negatywny, f"{abs(netto) if jest_negatywny else netto:.1f}", tekst_statystyk)
+
+
+def renderuj_grafike_statystyk(jest_negatywny: bool, tekst_co2: str, tekst_statystyk: str,
+                               zasoby: Optional[ZasobyGrafik] = None) -> Image.Image:
+    zasoby = zasoby or pobierz_zasoby()
+    szerokosc, wysokosc = SZEROKOSC, WYSOKOSC
+    czcionka_tytul = zasoby.czcionka(CZCIONKA_POGRUBIONA, 56)
+    czcionka_wartosc = zasoby.czcionka(CZCIONKA_POGRUBIONA, 100)
+    czcionka_etykieta = zasoby.czcionka(CZCIONKA_ZWYKLA, 40)
+    czcionka_mala = zasoby.czcionka(CZCIONKA_ZWYKLA, 32)
+    
+    if jest_negatywny:
+        obraz = zasoby.tlo(True, 30, 10)
+        kolor_tytul = '#ff4444'
+        kolor_wartosc = '#ff4444'
+        etykieta_co2 = "kg CO₂ EMISJI"
+        tytul = "Twoja emisja netto"
+    else:
+        obraz = zasoby.tlo(False, 30, 10)
+        kolor_tytul = '#00ff00'
+        kolor_wartosc = '#00ff00'
+        etykieta_co2 = "kg CO₂ OSZCZĘDZONO"
+        tytul = "Mój wpływ na klimat"
+    rysowanie = ImageDraw.Draw(obraz)
+    
+    rysowanie.text((szerokosc//2, 80), tytul, fill=kolor_tytul, font=czcionka_tytul, anchor="mm")
+    
+    rysowanie.text((szerokosc//2, 250), tekst_co2, fill=kolor_wartosc, font=czcionka_wartosc, anchor="mm")
+    
+    rysowanie.text((szerokosc//2, 360), etykieta_co2, fill='#ffffff', font=czcionka_etykieta, anchor="mm")
+    
+    y_statystyk = 450
+    rysowanie.text((szerokosc//2, y_statystyk), tekst_statystyk, fill='#888888', font=czcionka_mala, anchor="mm")
+    
+    rysowanie.text((szerokosc//2, wysokosc-60), "hh25.morawski.my", fill='#666666', font=czcionka_etykieta, anchor="mm")
+    
+    return obraz
+
+
+RENDERERY = {
+    'dzielenie': renderuj_grafike_dzielenia,
+    'statystyki': renderuj_grafike_statystyk
+}
+
+
+def renderuj(rodzaj: str, parametry: tuple, format: str = 'png', rozmiar: str = 'full') -> bytes:
+    return zakoduj(RENDERERY[rodzaj](*parametry), format, rozmiar)
+
+
+def _przygotuj_proces():
+    zasoby = pobierz_zasoby()
+    for jest_negatywny, jasnosc, wysokosc_paska in [(True, 30, 8), (False, 20, 8), (True, 30, 10), (False, 30, 10)]:
+        zasoby.tlo(jest_negatywny, jasnosc, wysokosc_paska)
+
+
+class PulaRenderowania:
+    """Renders graphics in separate processes, so encoding never holds the web worker's GIL.
+    
+    Workers are forked and warm up their render assets as soon as the pool is created,
+    so it should be created before the application starts any background threads. For
+    the same reason a pool broken by a crashed worker is not forked again: from then on
+    graphics are rendered by a thread pool of the application process.
+    """
+    
+    def __init__(self, rozmiar: int, limit_czasu: float = DOMYSLNY_LIMIT_CZASU_RENDEROWANIA):
+        self.rozmiar = rozmiar
+        self.limit_czasu = limit_czasu
+        self._blokada = threading.Lock()
+        self._pula: Optional[ProcessPoolExecutor] = self._utworz_pule()
+        # Threads start on the first submit, so creating this before a fork is safe.
+        self._watki = ThreadPoolExecutor(max_workers=rozmiar, thread_name_prefix="renderowanie")
+    
+    def _utworz_pule(self) -> ProcessPoolExecutor:
+        pula = ProcessPoolExecutor(
+            max_workers=self.rozmiar,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_przygotuj_proces
+        )
+        # With fork, the first submit starts all workers at once.
+        pula.submit(int)
+        return pula
+    
+    def _wylacz_pule(self, pula: ProcessPoolExecutor):
+        with self._blokada:
+            if self._pula is pula:
+                logger.error("Pula renderowania uszkodzona, grafiki będą renderowane w procesie aplikacji")
+                self._pula = None
+                pula.shutdown(wait=False, cancel_futures=True)
+    
+    def zlec(self, rodzaj: str, parametry: tuple, format: str = 'png', rozmiar: str = 'full') -> Future:
+        """Submits a render and returns its future (awaitable through asyncio.wrap_future)."""
+        pula = self._pula
+        if pula is not None:
+            try:
+                return pula.submit(renderuj, rodzaj, parametry, format, rozmiar)
+            except BrokenProcessPool:
+                self._wylacz_pule(pula)
+        return self._watki.submit(renderuj, rodzaj, parametry, format, rozmiar)
+    
+    def renderuj(self, rodzaj: str, parametry: tuple, format: str = 'png', rozmiar: str = 'full') -> bytes:
+        """Raises concurrent.futures.TimeoutError when the render takes longer than limit_czasu."""
+        zadanie = self.zlec(rodzaj, parametry, format, rozmiar)
+        try:
+            return zadanie.result(timeout=self.limit_czasu)
+        except TimeoutError:
+            zadanie.cancel()
+            raise
+    
+    def zamknij(self):
+        pula = self._pula
+        if pula is not None:
+            pula.shutdown(wait=False, cancel_futures=True)
+        self._watki.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,294 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+from postgrest.exceptions import APIError
+
+logger = logging.getLogger(__name__)
+
+DOMYSLNY_ROZMIAR_KOLEJKI = 10000
+DOMYSLNY_ROZMIAR_PACZKI = 200
+DOMYSLNY_ODSTEP_ZAPISU = 1.0
+MAKSYMALNE_OPOZNIENIE_PONOWIENIA = 30.0
+MAKSYMALNA_LICZBA_SPOOLI = 64
+# SQLSTATE classes of errors caused by the row itself (invalid value, constraint violation);
+# retrying such a row can never succeed, unlike network or server errors.
+KLASY_BLEDOW_WIERSZA = ('22', '23')
+
+
+def zsumuj_statystyki(wpisy: List[Dict]) -> List[Dict]:
+    """Aggregates per-journey stats deltas into one delta per user."""
+    sumy: Dict[str, Dict] = {}
+    for wpis in wpisy:
+        delta = wpis['stats']
+        suma = sumy.setdefault(delta['p_user_id'], {
+            'p_user_id': delta['p_user_id'],
+            'p_co2_saved_kg': 0.0,
+            'p_co2_emitted_kg': 0.0,
+            'p_bike_journeys': 0,
+            'p_car_journeys': 0
+        })
+        suma['p_co2_saved_kg'] += delta['p_co2_saved_kg']
+        suma['p_co2_emitted_kg'] += delta['p_co2_emitted_kg']
+        suma['p_bike_journeys'] += delta['p_bike_journeys']
+        suma['p_car_journeys'] += delta['p_car_journeys']
+
+    for suma in sumy.values():
+        suma['p_co2_saved_kg'] = round(suma['p_co2_saved_kg'], 3)
+        suma['p_co2_emitted_kg'] = round(suma['p_co2_emitted_kg'], 3)
+    return list(sumy.values())
+
+
+def odrzucone_przez_baze(blad: Exception) -> bool:
+    """Whether PostgREST rejected the data itself rather than failing to process it."""
+    return isinstance(blad, APIError) and str(blad.code or '')[:2] in KLASY_BLEDOW_WIERSZA
+
+
+def zajmij_spool(sciezka_bazowa: str):
+    """Picks the first spool file not locked by another worker process.
+
+    Names are stable (``podroze.jsonl``, ``podroze.1.jsonl``, ...), so after a restart
+    each worker picks up, and replays, a spool left behind by a previous process.
+    """
+    podstawa, rozszerzenie = os.path.splitext(sciezka_bazowa)
+    for numer in range(MAKSYMALNA_LICZBA_SPOOLI):
+        sciezka = sciezka_bazowa if numer == 0 else f"{podstawa}.{numer}{rozszerzenie}"
+        blokada = open(sciezka + '.lock', 'w')
+        try:
+            fcntl.flock(blokada, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            blokada.close()
+            continue
+        return sciezka, blokada
+    raise RuntimeError(f"Wszystkie pliki kolejki {sciezka_bazowa} są zajęte")
+
+
+class KolejkaZapisu:
+    """Write-behind queue for saved journeys.
+
+    Accepted entries are appended to a local spool file before they are queued, and a
+    worker thread writes them to Supabase in batches: one multi-row insert per table and
+    one RPC call with per-user stats deltas. The committed position in the spool is kept
+    in a ``.offset`` file, so entries not yet written when the process dies are replayed
+    on the next start. Delivery is at-least-once: a crash between the database write and
+    the checkpoint replays that batch.
+
+    A batch the database rejects (e.g. an invalid user_id) is split until the offending
+    rows are isolated; those are appended to a ``.odrzucone`` dead-letter file next to
+    the spool and skipped, so one bad row never blocks the journeys queued after it.
+    Any other error fails the batch, which is retried with backoff from the first step
+    that has not completed yet.
+
+    Each entry is a dict with ``journey`` (journey_tracking row), optional ``calculation``
+    (co2_calculations row) and ``stats`` (zwieksz_statystyki_uzytkownikow delta).
+    """
+
+    def __init__(self, klient, sciezka_bazowa: str, maks_rozmiar: int = DOMYSLNY_ROZMIAR_KOLEJKI,
+                 rozmiar_paczki: int = DOMYSLNY_ROZMIAR_PACZKI, odstep: float = DOMYSLNY_ODSTEP_ZAPISU):
+        self.klient = klient
+        self.sciezka_spoolu, self._blokada_pliku = zajmij_spool(sciezka_bazowa)
+        self.sciezka_pozycji = self.sciezka_spoolu + '.offset'
+        podstawa, rozszerzenie = os.path.splitext(self.sciezka_spoolu)
+        self.sciezka_odrzuconych = f"{podstawa}.odrzucone{rozszerzenie}"
+        self.rozmiar_paczki = rozmiar_paczki
+        self.odstep = odstep
+
+        self._kolejka: queue.Queue = queue.Queue(maxsize=maks_rozmiar)
+        self._blokada_spoolu = threading.Lock()
+        self._zatrzymaj = threading.Event()
+        self._odtworzone: List = []
+        self._paczka: List = []
+        self._postep: Dict = {}
+
+        self._pozycja_zatwierdzona = self._wczytaj_pozycje()
+        self._odtworz_spool()
+        self._spool = open(self.sciezka_spoolu, 'ab')
+
+        self._watek = threading.Thread(target=self._petla, name="kolejka-zapisu", daemon=True)
+        self._watek.start()
+
+    def _wczytaj_pozycje(self) -> int:
+        try:
+            with open(self.sciezka_pozycji, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _zapisz_pozycje(self, pozycja: int):
+        tymczasowy = self.sciezka_pozycji + '.tmp'
+        with open(tymczasowy, 'w') as f:
+            f.write(str(pozycja))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tymczasowy, self.sciezka_pozycji)
+
+    def _odtworz_spool(self):
+        if not os.path.exists(self.sciezka_spoolu):
+            return
+
+        with open(self.sciezka_spoolu, 'rb') as f:
+            f.seek(self._pozycja_zatwierdzona)
+            pozycja = self._pozycja_zatwierdzona
+            urwana = False
+            for linia in f:
+                if not linia.endswith(b'\n'):
+                    urwana = True
+                    break
+                pozycja += len(linia)
+                try:
+                    self._odtworzone.append((json.loads(linia), pozycja))
+                except ValueError:
+                    logger.warning("Pominięto uszkodzony wpis w kolejce zapisu")
+
+        if urwana:
+            # A write cut short by a crash: drop the fragment, or the next entry would be appended to it.
+            logger.warning(f"Obcięto niedokończony wpis na końcu {self.sciezka_spoolu}")
+            os.truncate(self.sciezka_spoolu, pozycja)
+
+        if self._odtworzone:
+            logger.info(f"Odtworzono {len(self._odtworzone)} niezapisanych podróży z {self.sciezka_spoolu}")
+
+    def dodaj(self, wpis: Dict) -> bool:
+        """Durably accepts an entry; returns False when the queue is full."""
+        linia = json.dumps(wpis, separators=(',', ':')).encode() + b'\n'
+        with self._blokada_spoolu:
+            if self._kolejka.full():
+                return False
+            self._spool.write(linia)
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+            self._kolejka.put_nowait((wpis, self._spool.tell()))
+        return True
+
+    def rozmiar(self) -> int:
+        return self._kolejka.qsize() + len(self._odtworzone) + len(self._paczka)
+
+    def _zbierz_paczke(self, czekaj: bool) -> List:
+        if self._paczka:
+            return self._paczka
+
+        paczka = self._odtworzone[:self.rozmiar_paczki]
+        del self._odtworzone[:self.rozmiar_paczki]
+        if len(paczka) < self.rozmiar_paczki:
+            termin = time.monotonic() + (self.odstep if czekaj else 0)
+            while len(paczka) < self.rozmiar_paczki:
+                pozostalo = termin - time.monotonic()
+                try:
+                    if pozostalo > 0 and not paczka:
+                        paczka.append(self._kolejka.get(timeout=pozostalo))
+                    else:
+                        paczka.append(self._kolejka.get_nowait())
+                except queue.Empty:
+                    break
+        self._paczka = paczka
+        return paczka
+
+    def _odrzuc(self, wpis: Dict, blad: Exception, etap: str):
+        logger.error(f"Baza odrzuciła wpis ({etap}), przeniesiono go do {self.sciezka_odrzuconych}: {blad}")
+        linia = json.dumps({'wpis': wpis, 'etap': etap, 'blad': str(blad), 'czas': time.time()},
+                           separators=(',', ':')).encode()
+        with open(self.sciezka_odrzuconych, 'ab') as f:
+            f.write(linia + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _zapisz_z_podzialem(self, etap: str, wpisy: List[Dict], zapisz: Callable[[List[Dict]], None]) -> List[Dict]:
+        """Runs one write step, bisecting around rows the database rejects; returns the entries written.
+
+        Network and server errors propagate, so the batch is retried without moving the checkpoint.
+        """
+        try:
+            zapisz(wpisy)
+            return wpisy
+        except Exception as e:
+            if not odrzucone_przez_baze(e):
+                raise
+            if len(wpisy) == 1:
+                self._odrzuc(wpisy[0], e, etap)
+                return []
+
+        polowa = len(wpisy) // 2
+        return (self._zapisz_z_podzialem(etap, wpisy[:polowa], zapisz)
+                + self._zapisz_z_podzialem(etap, wpisy[polowa:], zapisz))
+
+    def _zapisz_paczke(self, paczka: List):
+        """Writes the batch step by step; steps finished before a failed attempt are not repeated on retry."""
+        postep = self._postep
+        if 'journey_tracking' not in postep:
+            postep['journey_tracking'] = self._zapisz_z_podzialem(
+                'journey_tracking', [wpis for wpis, _ in paczka],
+                lambda czesc: self.klient.table('journey_tracking').insert([w['journey'] for w in czesc]).execute())
+        wpisy = postep['journey_tracking']
+
+        if 'co2_calculations' not in postep:
+            obliczenia = [wpis for wpis in wpisy if wpis.get('calculation')]
+            if obliczenia:
+                self._zapisz_z_podzialem(
+                    'co2_calculations', obliczenia,
+                    lambda czesc: self.klient.table('co2_calculations').insert([w['calculation'] for w in czesc]).execute())
+            postep['co2_calculations'] = True
+
+        if 'zwieksz_statystyki_uzytkownikow' not in postep:
+            if wpisy:
+                self._zapisz_z_podzialem(
+                    'zwieksz_statystyki_uzytkownikow', wpisy,
+                    lambda czesc: self.klient.rpc('zwieksz_statystyki_uzytkownikow',
+                                                  {'p_delty': zsumuj_statystyki(czesc)}).execute())
+            postep['zwieksz_statystyki_uzytkownikow'] = True
+
+    def _zatwierdz(self, pozycja: int):
+        with self._blokada_spoolu:
+            if self._kolejka.empty() and not self._odtworzone and pozycja == self._spool.tell():
+                self._spool.truncate(0)
+                self._spool.seek(0)
+                pozycja = 0
+            self._zapisz_pozycje(pozycja)
+            self._pozycja_zatwierdzona = pozycja
+
+    def oproznij(self, czekaj: bool = False) -> int:
+        """Writes one batch to the database; returns the number of journeys written."""
+        paczka = self._zbierz_paczke(czekaj)
+        if not paczka:
+            return 0
+
+        self._zapisz_paczke(paczka)
+        self._paczka = []
+        self._postep = {}
+        self._zatwierdz(paczka[-1][1])
+        return len(paczka)
+
+    def _petla(self):
+        opoznienie = self.odstep
+        while not self._zatrzymaj.is_set():
+            try:
+                self.oproznij(czekaj=True)
+                opoznienie = self.odstep
+            except Exception as e:
+                logger.error(f"Błąd zapisu paczki podróży, ponowienie za {opoznienie:.1f}s: {e}")
+                self._zatrzymaj.wait(opoznienie)
+                opoznienie = min(opoznienie * 2, MAKSYMALNE_OPOZNIENIE_PONOWIENIA)
+
+    def zatrzymaj(self, limit_czasu: float = 10.0):
+        """Stops the worker and tries to write what is still queued."""
+        self._zatrzymaj.set()
+        self._watek.join(timeout=limit_czasu)
+        if self._watek.is_alive():
+            # Still inside a slow write: draining here too would share the batch and the checkpoint
+            # with it. The worker finishes its batch and exits; the rest is replayed on the next start.
+            logger.warning(f"Wątek zapisu wciąż pracuje, niezapisane wpisy zostają w {self.sciezka_spoolu}")
+            return
+
+        termin = time.monotonic() + limit_czasu
+        try:
+            while time.monotonic() < termin and self.oproznij():
+                pass
+        except Exception as e:
+            logger.error(f"Nie udało się zapisać kolejki przy zamykaniu, wpisy zostają w {self.sciezka_spoolu}: {e}")
+        finally:
+            self._spool.close()
+            self._blokada_pliku.close()
@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from limits.storage import Storage
+
+from metryki import sciezka_wdrozenia
+
+DOMYSLNY_PLIK_LIMITOW = 'limity.db'
+# Expired windows are purged once per this many increments on a connection.
+SPRZATANIE_CO = 1000
+
+_ZWIEKSZ = """
+INSERT INTO limity (klucz, licznik, wygasa) VALUES (:klucz, :ile, :wygasa)
+ON CONFLICT (klucz) DO UPDATE SET
+    licznik = CASE WHEN wygasa <= :teraz THEN :ile ELSE licznik + :ile END,
+    wygasa = CASE WHEN wygasa <= :teraz THEN :wygasa ELSE wygasa END
+RETURNING licznik
+"""
+
+
+def domyslna_sciezka() -> str:
+    """Database on tmpfs when available: the counters are throwaway and should never touch a disk."""
+    return sciezka_wdrozenia(DOMYSLNY_PLIK_LIMITOW)
+
+
+class MagazynLimitowSQLite(Storage):
+    """Fixed-window rate-limit counters in a SQLite file shared by all workers on a host.
+
+    Registered with ``limits`` under the ``sqlite://`` scheme, so Flask-Limiter picks
+    it up from ``storage_uri`` (``sqlite:////tmp/limity.db``; a bare ``sqlite://``
+    uses a file in ``/dev/shm`` private to this deployment, see sciezka_wdrozenia). Each check is one atomic UPSERT on a WAL database,
+    which lets gunicorn workers share one set of counters without a separate server.
+    Only the fixed-window strategy is supported.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options):
+        # Same convention as SQLAlchemy: sqlite:///wzgledna.db, sqlite:////bezwzgledna.db.
+        sciezka = uri.split('://', 1)[1][1:] if uri and '://' in uri else ''
+        self.sciezka = sciezka or domyslna_sciezka()
+        self._lokalne = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _polaczenie(self) -> sqlite3.Connection:
+        # One connection per thread and process: SQLite connections must not cross a fork.
+        lokalne = self._lokalne
+        if getattr(lokalne, 'pid', None) != os.getpid():
+            polaczenie = sqlite3.connect(self.sciezka, timeout=5, isolation_level=None, check_same_thread=False)
+            polaczenie.execute('PRAGMA journal_mode=WAL')
+            polaczenie.execute('PRAGMA synchronous=OFF')
+            polaczenie.execute(
+                'CREATE TABLE IF NOT EXISTS limity '
+                '(klucz TEXT PRIMARY KEY, licznik INTEGER NOT NULL, wygasa REAL NOT NULL) WITHOUT ROWID'
+            )
+            lokalne.polaczenie = polaczenie
+            lokalne.pid = os.getpid()
+            lokalne.zapisy = 0
+        return lokalne.polaczenie
+
+    def incr(self, key: str, expiry: float, elastic_expiry: bool = False, amount: int = 1) -> int:
+        polaczenie = self._polaczenie()
+        teraz = time.time()
+        licznik = polaczenie.execute(
+            _ZWIEKSZ, {'klucz': key, 'ile': amount, 'wygasa': teraz + expiry, 'teraz': teraz}
+        ).fetchone()[0]
+
+        self._lokalne.zapisy += 1
+        if self._lokalne.zapisy % SPRZATANIE_CO == 0:
+            polaczenie.execute('DELETE FROM limity WHERE wygasa <= ?', (teraz,))
+        return licznik
+
+    def get(self, key: str) -> int:
+        wiersz = self._polaczenie().execute(
+            'SELECT licznik FROM limity WHERE klucz = ? AND wygasa > ?', (key, time.time())
+        ).fetchone()
+        return wiersz[0] if wiersz else 0
+
+    def get_expiry(self, key: str) -> float:
+        wiersz = self._polaczenie().execute('SELECT wygasa FROM limity WHERE klucz = ?', (key,)).fetchone()
+        return wiersz[0] if wiersz and wiersz[0] > time.time() else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._polaczenie().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self._polaczenie().execute('DELETE FROM limity').rowcount
+
+    def clear(self, key: str) -> None:
+        self._polaczenie().execute('DELETE FROM limity WHERE klucz = ?', (key,))
@@ -0,0 +1,359 @@
+import bisect
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DOMYSLNE_PRZEDZIALY = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TYP_ZAWARTOSCI = 'text/plain; version=0.0.4; charset=utf-8'
+DOMYSLNY_KATALOG_METRYK = 'metryki'
+DOMYSLNY_INTERWAL_ZAPISU_METRYK = 5.0
+PLIK_ARCHIWUM = 'archiwum.json'
+PREFIKS_PLIKOW_WDROZENIA = 'hackheroes-co2calculator'
+
+
+def sciezka_wdrozenia(nazwa: str) -> str:
+    """Path on tmpfs (when available) private to this deployment.
+    
+    The name carries a hash of the application directory, so instances started from
+    different checkouts on one host (e.g. staging and production) never share the file.
+    """
+    katalog = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    skrot = hashlib.sha256(os.path.dirname(os.path.abspath(__file__)).encode()).hexdigest()[:12]
+    return os.path.join(katalog, f"{PREFIKS_PLIKOW_WDROZENIA}-{skrot}-{nazwa}")
+
+
+def domyslny_katalog() -> str:
+    """Directory on tmpfs when available, private to this deployment like the rate-limit database."""
+    return sciezka_wdrozenia(DOMYSLNY_KATALOG_METRYK)
+
+
+def _proces_zyje(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _grupa_zyje(grupa: int) -> bool:
+    try:
+        os.killpg(grupa, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _etykiety(nazwy: Sequence[str], wartosci: Sequence[str], dodatkowe: str = '') -> str:
+    pary = [f'{nazwa}="{_ucieknij(wartosc)}"' for nazwa, wartosc in zip(nazwy, wartosci)]
+    if dodatkowe:
+        pary.append(dodatkowe)
+    return '{' + ','.join(pary) + '}' if pary else ''
+
+
+def _ucieknij(wartosc) -> str:
+    return str(wartosc).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _liczba(wartosc: float) -> str:
+    return repr(float(wartosc)) if wartosc != int(wartosc) else str(int(wartosc))
+
+
+class _Metryka(ABC):
+    typ = ''
+
+    def __init__(self, nazwa: str, opis: str, etykiety: Sequence[str] = ()):
+        self.nazwa = nazwa
+        self.opis = opis
+        self.etykiety = tuple(etykiety)
+        self._blokada = threading.Lock()
+
+    def eksportuj(self) -> List[str]:
+        return [f"# HELP {self.nazwa} {self.opis}", f"# TYPE {self.nazwa} {self.typ}"]
+
+    @abstractmethod
+    def pusta(self) -> '_Metryka':
+        """Metric with the same definition and no values."""
+
+    @abstractmethod
+    def stan(self) -> list:
+        """JSON-serialisable values, mergeable into another process's metric with ``dodaj_stan``."""
+
+    @abstractmethod
+    def dodaj_stan(self, stan: list):
+        """Adds values produced by ``stan`` of a metric with the same definition."""
+
+
+class Licznik(_Metryka):
+    """Monotonic counter; label values are passed positionally in declaration order."""
+    typ = 'counter'
+
+    def __init__(self, nazwa: str, opis: str, etykiety: Sequence[str] = ()):
+        super().__init__(nazwa, opis, etykiety)
+        self._wartosci: Dict[Tuple, float] = {}
+
+    def zwieksz(self, *etykiety, o: float = 1.0):
+        with self._blokada:
+            self._wartosci[etykiety] = self._wartosci.get(etykiety, 0.0) + o
+
+    def wartosc(self, *etykiety) -> float:
+        return self._wartosci.get(etykiety, 0.0)
+
+    def pusta(self) -> 'Licznik':
+        return Licznik(self.nazwa, self.opis, self.etykiety)
+
+    def stan(self) -> list:
+        with self._blokada:
+            return [[list(etykiety), wartosc] for etykiety, wartosc in self._wartosci.items()]
+
+    def dodaj_stan(self, stan: list):
+        with self._blokada:
+            for etykiety, wartosc in stan:
+                klucz = tuple(etykiety)
+                self._wartosci[klucz] = self._wartosci.get(klucz, 0.0) + wartosc
+
+    def eksportuj(self) -> List[str]:
+        linie = super().eksportuj()
+        with self._blokada:
+            wartosci = list(self._wartosci.items())
+        for etykiety, wartosc in wartosci:
+            linie.append(f"{self.nazwa}{_etykiety(self.etykiety, etykiety)} {_liczba(wartosc)}")
+        return linie
+
+
+class Histogram(_Metryka):
+    """Fixed-bucket histogram: an observation costs one bisect and a few increments under a lock."""
+    typ = 'histogram'
+
+    def __init__(self, nazwa: str, opis: str, etykiety: Sequence[str] = (),
+                 przedzialy: Sequence[float] = DOMYSLNE_PRZEDZIALY):
+        super().__init__(nazwa, opis, etykiety)
+        self.przedzialy = tuple(przedzialy)
+        self._wartosci: Dict[Tuple, list] = {}
+
+    def obserwuj(self, wartosc: float, *etykiety):
+        indeks = bisect.bisect_left(self.przedzialy, wartosc)
+        with self._blokada:
+            seria = self._wartosci.get(etykiety)
+            if seria is None:
+                seria = self._wartosci[etykiety] = [[0] * (len(self.przedzialy) + 1), 0.0, 0]
+            seria[0][indeks] += 1
+            seria[1] += wartosc
+            seria[2] += 1
+
+    def pusta(self) -> 'Histogram':
+        return Histogram(self.nazwa, self.opis, self.etykiety, self.przedzialy)
+
+    def stan(self) -> list:
+        with self._blokada:
+            return [[list(etykiety), list(seria[0]), seria[1], seria[2]] for etykiety, seria in self._wartosci.items()]
+
+    def dodaj_stan(self, stan: list):
+        with self._blokada:
+            for etykiety, kubelki, suma, liczba in stan:
+                if len(kubelki) != len(self.przedzialy) + 1:
+                    continue
+                seria = self._wartosci.setdefault(tuple(etykiety), [[0] * (len(self.przedzialy) + 1), 0.0, 0])
+                seria[0] = [ile + dodac for ile, dodac in zip(seria[0], kubelki)]
+                seria[1] += suma
+                seria[2] += liczba
+
+    @contextmanager
+    def mierz(self, *etykiety):
+        poczatek = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.obserwuj(time.perf_counter() - poczatek, *etykiety)
+
+    def eksportuj(self) -> List[str]:
+        linie = super().eksportuj()
+        with self._blokada:
+            wartosci = [(etykiety, list(seria[0]), seria[1], seria[2]) for etykiety, seria in self._wartosci.items()]
+        for etykiety, kubelki, suma, liczba in wartosci:
+            narastajaco = 0
+            for granica, ile in zip(self.przedzialy + (float('inf'),), kubelki):
+                narastajaco += ile
+                le = '+Inf' if granica == float('inf') else _liczba(granica)
+                etykiety_kubelka = _etykiety(self.etykiety, etykiety, 'le="' + le + '"')
+                linie.append(f"{self.nazwa}_bucket{etykiety_kubelka} {narastajaco}")
+            linie.append(f"{self.nazwa}_sum{_etykiety(self.etykiety, etykiety)} {_liczba(suma)}")
+            linie.append(f"{self.nazwa}_count{_etykiety(self.etykiety, etykiety)} {liczba}")
+        return linie
+
+
+class Rejestr:
+    """Process-wide set of metrics rendered in the Prometheus text format.
+
+    With ``wspoldziel(katalog)`` the worker processes of one server (one process group,
+    e.g. gunicorn or uvicorn workers) each write a snapshot of their values to
+    ``katalog/grupa-<pgid>/proces-<pid>.json`` every few seconds, and ``eksportuj`` sums
+    the snapshots of all of them, so any worker answers a scrape with the same totals.
+    Snapshots of exited workers are folded into an archive file, which keeps counters
+    monotonic across worker restarts; values observed after a worker's last snapshot
+    are lost with it.
+    """
+
+    def __init__(self):
+        self._metryki: Dict[str, _Metryka] = {}
+        self._blokada = threading.Lock()
+        self.katalog: Optional[str] = None
+        self.interwal_zapisu = DOMYSLNY_INTERWAL_ZAPISU_METRYK
+        self._pid = None
+
+    def _dodaj(self, metryka: _Metryka) -> _Metryka:
+        with self._blokada:
+            return self._metryki.setdefault(metryka.nazwa, metryka)
+
+    def licznik(self, nazwa: str, opis: str, etykiety: Sequence[str] = ()) -> Licznik:
+        return self._dodaj(Licznik(nazwa, opis, etykiety))
+
+    def histogram(self, nazwa: str, opis: str, etykiety: Sequence[str] = (),
+                  przedzialy: Sequence[float] = DOMYSLNE_PRZEDZIALY) -> Histogram:
+        return self._dodaj(Histogram(nazwa, opis, etykiety, przedzialy))
+
+    def _lista(self) -> List[_Metryka]:
+        with self._blokada:
+            return list(self._metryki.values())
+
+    def wspoldziel(self, katalog: str, interwal_zapisu: float = DOMYSLNY_INTERWAL_ZAPISU_METRYK):
+        """Aggregates the metrics of all worker processes through snapshot files in ``katalog``."""
+        self.katalog = katalog
+        self.interwal_zapisu = interwal_zapisu
+
+    def _katalog_grupy(self) -> str:
+        return os.path.join(self.katalog, f"grupa-{os.getpgrp()}")
+
+    def uruchom_zapis(self):
+        """Starts the snapshot thread of the calling process; cheap to call on every request."""
+        # Started lazily and per process, so a registry imported before gunicorn forks still works in every worker.
+        if self.katalog is None or self._pid == os.getpid():
+            return
+        with self._blokada:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        try:
+            katalog = self._katalog_grupy()
+            os.makedirs(katalog, exist_ok=True)
+            self._usun_stare_grupy()
+            # A file under our pid can only come from an exited process whose pid was reused.
+            self._pod_blokada(katalog, lambda: self._zarchiwizuj(katalog, {os.getpid()}))
+        except OSError as e:
+            logger.warning(f"Nie udało się przygotować katalogu metryk: {e}")
+        threading.Thread(target=self._petla_zapisu, name="zapis-metryk", daemon=True).start()
+
+    def _petla_zapisu(self):
+        while True:
+            time.sleep(self.interwal_zapisu)
+            self.zapisz_stan()
+
+    def _usun_stare_grupy(self):
+        for nazwa in os.listdir(self.katalog):
+            if nazwa.startswith('grupa-') and nazwa[6:].isdigit() and not _grupa_zyje(int(nazwa[6:])):
+                shutil.rmtree(os.path.join(self.katalog, nazwa), ignore_errors=True)
+
+    def zapisz_stan(self):
+        """Writes this process's snapshot; a no-op without a shared katalog."""
+        if self.katalog is None:
+            return
+        self.uruchom_zapis()
+        stan = {metryka.nazwa: metryka.stan() for metryka in self._lista()}
+        try:
+            sciezka = os.path.join(self._katalog_grupy(), f"proces-{os.getpid()}.json")
+            _zapisz_json(sciezka, stan)
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać metryk: {e}")
+
+    @staticmethod
+    def _pod_blokada(katalog: str, funkcja):
+        with open(os.path.join(katalog, '.blokada'), 'w') as blokada:
+            fcntl.flock(blokada, fcntl.LOCK_EX)
+            return funkcja()
+
+    def _puste(self) -> Dict[str, _Metryka]:
+        return {metryka.nazwa: metryka.pusta() for metryka in self._lista()}
+
+    @staticmethod
+    def _dodaj_plik(suma: Dict[str, _Metryka], sciezka: str):
+        try:
+            with open(sciezka, 'r') as f:
+                stan = json.load(f)
+        except (OSError, ValueError):
+            return
+        for nazwa, wartosci in stan.items():
+            if nazwa in suma:
+                suma[nazwa].dodaj_stan(wartosci)
+
+    def _zarchiwizuj(self, katalog: str, pidy: set = frozenset()):
+        """Folds the snapshots of exited processes (and of ``pidy``) into the archive file."""
+        martwe = []
+        for nazwa in os.listdir(katalog):
+            if nazwa.startswith('proces-') and nazwa.endswith('.json'):
+                pid = int(nazwa[7:-5])
+                if pid in pidy or not _proces_zyje(pid):
+                    martwe.append(os.path.join(katalog, nazwa))
+        if not martwe:
+            return
+
+        archiwum = os.path.join(katalog, PLIK_ARCHIWUM)
+        suma = self._puste()
+        for sciezka in [archiwum, *martwe]:
+            self._dodaj_plik(suma, sciezka)
+        _zapisz_json(archiwum, {nazwa: metryka.stan() for nazwa, metryka in suma.items()})
+        for sciezka in martwe:
+            os.unlink(sciezka)
+
+    def _zbierz(self) -> List[_Metryka]:
+        katalog = self._katalog_grupy()
+
+        def zbierz():
+            self._zarchiwizuj(katalog)
+            suma = self._puste()
+            for nazwa in os.listdir(katalog):
+                if nazwa.endswith('.json'):
+                    self._dodaj_plik(suma, os.path.join(katalog, nazwa))
+            return list(suma.values())
+
+        return self._pod_blokada(katalog, zbierz)
+
+    def eksportuj(self) -> str:
+        metryki = self._lista()
+        if self.katalog is not None:
+            self.zapisz_stan()
+            try:
+                metryki = self._zbierz()
+            except OSError as e:
+                logger.warning(f"Nie udało się zebrać metryk innych procesów: {e}")
+        linie = []
+        for metryka in metryki:
+            linie.extend(metryka.eksportuj())
+        return '\n'.join(linie) + '\n'
+
+
+def _zapisz_json(sciezka: str, dane):
+    tymczasowa = f"{sciezka}.{threading.get_ident()}.tmp"
+    with open(tymczasowa, 'w') as f:
+        json.dump(dane, f, separators=(',', ':'))
+    os.replace(tymczasowa, sciezka)
+
+
+REJESTR = Rejestr()
+
+ZAPYTANIA_PAMIECI = REJESTR.licznik(
+    'cache_requests_total', 'Cache lookups by cache and result (hit, miss, stale).', ('cache', 'result')
+)
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from metryki import ZAPYTANIA_PAMIECI
+
+logger = logging.getLogger(__name__)
+
+
+class WartoscSWR:
+    """Single in-process value with stale-while-revalidate semantics.
+
+    A value younger than ``swiezosc`` seconds is returned as is. An older one, up to
+    ``maks_wiek``, is still returned immediately while one background thread reloads
+    it. Past ``maks_wiek`` (or before the first load) the caller waits for the reload.
+    Concurrent reloads are collapsed into one call of ``ladowanie``.
+    """
+    
+    def __init__(self, ladowanie: Callable[[], Any], swiezosc: float, maks_wiek: float, nazwa: str = 'swr'):
+        self.ladowanie = ladowanie
+        self.nazwa = nazwa
+        self.swiezosc = swiezosc
+        self.maks_wiek = maks_wiek
+        self._wartosc: Optional[Any] = None
+        self._zaladowano = 0.0
+        self._blokada = threading.Lock()
+        self._odswiezanie_w_toku = False
+    
+    def _zaladuj(self) -> Any:
+        wartosc = self.ladowanie()
+        self._wartosc = wartosc
+        self._zaladowano = time.monotonic()
+        return wartosc
+    
+    def _odswiez_w_tle(self):
+        try:
+            self._zaladuj()
+        except Exception as e:
+            logger.warning(f"Nie udało się odświeżyć wartości w tle: {e}")
+        finally:
+            self._odswiezanie_w_toku = False
+    
+    def wiek(self) -> Optional[float]:
+        if self._wartosc is None:
+            return None
+        return time.monotonic() - self._zaladowano
+    
+    def pobierz(self) -> Any:
+        wiek = self.wiek()
+        if wiek is not None and wiek < self.swiezosc:
+            ZAPYTANIA_PAMIECI.zwieksz(self.nazwa, 'hit')
+            return self._wartosc
+        
+        if wiek is not None and wiek < self.maks_wiek:
+            ZAPYTANIA_PAMIECI.zwieksz(self.nazwa, 'stale')
+            with self._blokada:
+                if not self._odswiezanie_w_toku:
+                    self._odswiezanie_w_toku = True
+                    threading.Thread(target=self._odswiez_w_tle, name="odswiezanie-swr", daemon=True).start()
+            return self._wartosc
+        
+        ZAPYTANIA_PAMIECI.zwieksz(self.nazwa, 'miss')
+        with self._blokada:
+            wiek = self.wiek()
+            if wiek is not None and wiek < self.swiezosc:
+                return self._wartosc
+            try:
+                return self._zaladuj()
+            except Exception:
+                if self._wartosc is None:
+                    raise
+                logger.warning("Nie udało się odświeżyć wartości, zwracam przeterminowaną")
+                return self._wartosc
+
@@ -0,0 +1,174 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from flask import g, has_request_context
+
+logger = logging.getLogger(__name__)
+
+DOMYSLNY_INTERWAL_PROBKOWANIA = 0.005
+DOMYSLNY_INTERWAL_ZAPISU = 30.0
+MAKS_GLEBOKOSC_STOSU = 128
+
+
+class PomiarFaz:
+    """Wall-clock time of one request split into named phases, for the Server-Timing header.
+
+    Phases are recorded either as laps (``zakoncz`` charges everything since the
+    previous mark to a phase) or as blocks (``faza``). A phase seen more than once
+    accumulates, so code can alternate e.g. between compute and provider.
+    """
+
+    def __init__(self, poczatek: Optional[float] = None):
+        self.poczatek = time.perf_counter() if poczatek is None else poczatek
+        self._ostatni = self.poczatek
+        self.czasy: Dict[str, float] = {}
+
+    def _dodaj(self, nazwa: str, czas: float):
+        self.czasy[nazwa] = self.czasy.get(nazwa, 0.0) + czas
+
+    def zakoncz(self, nazwa: str):
+        teraz = time.perf_counter()
+        self._dodaj(nazwa, teraz - self._ostatni)
+        self._ostatni = teraz
+
+    @contextmanager
+    def faza(self, nazwa: str):
+        poczatek = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._ostatni = time.perf_counter()
+            self._dodaj(nazwa, self._ostatni - poczatek)
+
+    def naglowek(self) -> str:
+        """Server-Timing value in milliseconds, phases in the order they first occurred, then the total."""
+        czesci = [f"{nazwa};dur={czas * 1000:.2f}" for nazwa, czas in self.czasy.items()]
+        czesci.append(f"total;dur={(time.perf_counter() - self.poczatek) * 1000:.2f}")
+        return ', '.join(czesci)
+
+
+def _pomiar() -> Optional[PomiarFaz]:
+    return g.get('pomiar_faz') if has_request_context() else None
+
+
+def zakoncz_faze(nazwa: str):
+    """Charges the time since the previous mark to ``nazwa``; a no-op when Server-Timing is off."""
+    pomiar = _pomiar()
+    if pomiar is not None:
+        pomiar.zakoncz(nazwa)
+
+
+@contextmanager
+def faza(nazwa: str):
+    """Measures the enclosed block as phase ``nazwa``; a no-op when Server-Timing is off."""
+    pomiar = _pomiar()
+    if pomiar is None:
+        yield
+        return
+    with pomiar.faza(nazwa):
+        yield
+
+
+def _opisz_ramke(ramka) -> str:
+    kod = ramka.f_code
+    modul = os.path.splitext(os.path.basename(kod.co_filename))[0]
+    return f"{modul}:{getattr(kod, 'co_qualname', kod.co_name)}"
+
+
+class ProfilerProbkujacy:
+    """Statistical profiler for a sampled fraction of requests.
+
+    A daemon thread wakes every ``interwal`` seconds and records the current stack
+    of each thread that is serving a sampled request. Stacks are aggregated in the
+    collapsed format (``route;module:function;... count``) and rewritten to
+    ``katalog/profil-<pid>.folded`` every ``interwal_zapisu`` seconds and at exit,
+    ready for flamegraph.pl or speedscope. Requests that are not sampled cost one
+    random() call.
+    """
+
+    def __init__(self, katalog: str, ulamek: float, interwal: float = DOMYSLNY_INTERWAL_PROBKOWANIA,
+                 interwal_zapisu: float = DOMYSLNY_INTERWAL_ZAPISU):
+        self.katalog = katalog
+        self.ulamek = ulamek
+        self.interwal = interwal
+        self.interwal_zapisu = interwal_zapisu
+        self.stosy: Counter = Counter()
+        self._watki: Dict[int, str] = {}
+        self._blokada = threading.Lock()
+        self._watek: Optional[threading.Thread] = None
+        self._zatrzymaj = threading.Event()
+        self._pid = None
+
+    def czy_probkowac(self) -> bool:
+        return random.random() < self.ulamek
+
+    def sledz(self, etykieta: str):
+        """Starts sampling the calling thread, labelling its stacks with ``etykieta``."""
+        self._uruchom()
+        self._watki[threading.get_ident()] = etykieta
+
+    def przestan(self):
+        self._watki.pop(threading.get_ident(), None)
+
+    def _uruchom(self):
+        # Started lazily and per process, so a profiler created before gunicorn forks still samples in every worker.
+        if self._pid == os.getpid():
+            return
+        with self._blokada:
+            if self._pid == os.getpid():
+                return
+            self.stosy = Counter()
+            self._watki = {}
+            self._zatrzymaj.clear()
+            self._watek = threading.Thread(target=self._petla, name="profiler", daemon=True)
+            self._watek.start()
+            self._pid = os.getpid()
+
+    def _petla(self):
+        ostatni_zapis = time.monotonic()
+        while not self._zatrzymaj.wait(self.interwal):
+            if self._watki:
+                self._probkuj()
+            if time.monotonic() - ostatni_zapis >= self.interwal_zapisu:
+                self.zapisz()
+                ostatni_zapis = time.monotonic()
+
+    def _probkuj(self):
+        ramki = sys._current_frames()
+        for id_watku, etykieta in list(self._watki.items()):
+            ramka = ramki.get(id_watku)
+            if ramka is None:
+                continue
+            stos = []
+            while ramka is not None and len(stos) < MAKS_GLEBOKOSC_STOSU:
+                stos.append(_opisz_ramke(ramka))
+                ramka = ramka.f_back
+            stos.append(etykieta)
+            with self._blokada:
+                self.stosy[';'.join(reversed(stos))] += 1
+
+    def zapisz(self):
+        with self._blokada:
+            stosy = list(self.stosy.items())
+        if not stosy:
+            return
+        try:
+            os.makedirs(self.katalog, exist_ok=True)
+            sciezka = os.path.join(self.katalog, f"profil-{os.getpid()}.folded")
+            tymczasowa = f"{sciezka}.tmp"
+            with open(tymczasowa, 'w', encoding='utf-8') as f:
+                f.writelines(f"{stos} {liczba}\n" for stos, liczba in stosy)
+            os.replace(tymczasowa, sciezka)
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać profilu: {e}")
+
+    def zamknij(self):
+        self._zatrzymaj.set()
+        self.zapisz()
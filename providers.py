@@ -1,86 +1,497 @@
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import math
-from typing import List, Dict
+import threading
+import time
+from typing import List, Dict, Optional, Sequence, Tuple
 import logging
 from datetime import datetime
 
+import numpy as np
+
+import szybki_json
+from metryki import REJESTR, ZAPYTANIA_PAMIECI
+from dystans import PROMIEN_ZIEMI_KM, oblicz_dystans, oblicz_dystanse
+
 logger = logging.getLogger(__name__)
 
-def oblicz_dystans(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371.0
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
+MINIMALNY_TTL_INFORMACJI = 3600
+MINIMALNY_TTL_STATUSU = 15
+MAKSYMALNY_TTL = 86400
+MAKSYMALNY_ODSTEP_ODSWIEZANIA = 60
+ROZMIAR_PULI_POLACZEN = 4
+WYMAGANE_FEEDY = ('station_information', 'station_status')
+ROZMIAR_KOMORKI_STOPNIE = 0.01
+KM_NA_STOPIEN = PROMIEN_ZIEMI_KM * math.pi / 180
+
+CZAS_POBIERANIA_GBFS = REJESTR.histogram(
+    'gbfs_fetch_duration_seconds', 'Duration of GBFS feed requests.', ('system', 'feed')
+)
+POBRANIA_GBFS = REJESTR.licznik(
+    'gbfs_fetch_total', 'GBFS feed responses by HTTP status.', ('system', 'feed', 'status')
+)
+BLEDY_GBFS = REJESTR.licznik(
+    'gbfs_fetch_errors_total', 'Failed GBFS feed fetches (network errors, bad status, invalid JSON).', ('system', 'feed')
+)
+
+class DaneNiegotowe(RuntimeError):
+    """Raised while the background refresher has not produced the first snapshot yet."""
+
+
+def oblicz_wygasniecie(dane: Dict, minimalny_ttl: float) -> float:
+    """Expiry timestamp for a GBFS payload based on its ttl/last_updated fields."""
+    teraz = time.time()
+    ttl = dane.get('ttl') or 0
+    ostatnia_aktualizacja = dane.get('last_updated')
+    if not isinstance(ostatnia_aktualizacja, (int, float)):
+        ostatnia_aktualizacja = teraz
     
-    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
-    c = 2 * math.asin(math.sqrt(a))
+    wygasa = min(ostatnia_aktualizacja + ttl, teraz + MAKSYMALNY_TTL)
+    return max(wygasa, teraz + minimalny_ttl)
+
+def formatuj_znacznik(czas: Optional[float]) -> Optional[str]:
+    if czas is None:
+        return None
+    return datetime.utcfromtimestamp(czas).isoformat() + 'Z'
+
+class PamiecFeedu:
+    """Cached payload of a single GBFS feed; the lock collapses concurrent refreshes."""
     
-    return R * c
+    def __init__(self, minimalny_ttl: float):
+        self.minimalny_ttl = minimalny_ttl
+        self.dane: Optional[Dict] = None
+        self.wygasa = 0.0
+        self.etag: Optional[str] = None
+        self.ostatnia_modyfikacja: Optional[str] = None
+        self.blokada = threading.Lock()
+    
+    def aktualne(self) -> bool:
+        return self.dane is not None and time.time() < self.wygasa
+
+async def _azajmij(blokada: threading.Lock):
+    """Acquires a threading lock from the event loop, waiting on a worker thread if it is taken."""
+    if blokada.acquire(blocking=False):
+        return
+    zajecie = asyncio.get_running_loop().run_in_executor(None, blokada.acquire)
+    try:
+        await asyncio.shield(zajecie)
+    except asyncio.CancelledError:
+        zajecie.add_done_callback(lambda _: blokada.release())
+        raise
 
-class Dostawa_MEVO:
+class IndeksPrzestrzenny:
+    """Grid of lat/lon cells over station coordinates for radius and top-k queries."""
     
-    def __init__(self):
-        self.adres_bazowy = "https://gbfs.urbansharing.com/rowermevo.pl"
+    def __init__(self, punkty: Sequence[Tuple[float, float]], rozmiar_komorki: float = ROZMIAR_KOMORKI_STOPNIE):
+        wspolrzedne = np.asarray(punkty, dtype=np.float64).reshape(-1, 2)
+        self.szerokosci = wspolrzedne[:, 0].copy()
+        self.dlugosci = wspolrzedne[:, 1].copy()
+        self.rozmiar_komorki = rozmiar_komorki
+        self.liczba_kolumn = max(1, round(360 / rozmiar_komorki))
+        
+        komorki: Dict[Tuple[int, int], List[int]] = {}
+        wiersze = np.floor(self.szerokosci / rozmiar_komorki).astype(np.int64)
+        kolumny = np.floor((self.dlugosci + 180) / rozmiar_komorki).astype(np.int64) % self.liczba_kolumn
+        for indeks, klucz in enumerate(zip(wiersze.tolist(), kolumny.tolist())):
+            komorki.setdefault(klucz, []).append(indeks)
+        self.komorki = {klucz: np.array(indeksy, dtype=np.int64) for klucz, indeksy in komorki.items()}
+        
+        self.granice: Optional[Tuple[float, float, float, float]] = None
+        if len(self.szerokosci):
+            self.granice = (float(self.szerokosci.min()), float(self.dlugosci.min()),
+                            float(self.szerokosci.max()), float(self.dlugosci.max()))
+    
+    def __len__(self) -> int:
+        return len(self.szerokosci)
+    
+    def _kandydaci(self, lat: float, lon: float, promien: float) -> np.ndarray:
+        delta_lat = promien / KM_NA_STOPIEN
+        cos_lat = math.cos(math.radians(min(90.0, abs(lat) + delta_lat)))
+        delta_lon = delta_lat / cos_lat if cos_lat > 1e-9 else 360.0
+        
+        wiersz_od = math.floor((lat - delta_lat) / self.rozmiar_komorki)
+        wiersz_do = math.floor((lat + delta_lat) / self.rozmiar_komorki)
+        kolumna_od = math.floor((lon + 180 - delta_lon) / self.rozmiar_komorki)
+        kolumna_do = math.floor((lon + 180 + delta_lon) / self.rozmiar_komorki)
+        liczba_kolumn = min(kolumna_do - kolumna_od + 1, self.liczba_kolumn)
+        
+        if (wiersz_do - wiersz_od + 1) * liczba_kolumn >= len(self.komorki):
+            czesci = [indeksy for (wiersz, _), indeksy in self.komorki.items() if wiersz_od <= wiersz <= wiersz_do]
+        else:
+            czesci = []
+            for wiersz in range(wiersz_od, wiersz_do + 1):
+                for kolumna in range(kolumna_od, kolumna_od + liczba_kolumn):
+                    indeksy = self.komorki.get((wiersz, kolumna % self.liczba_kolumn))
+                    if indeksy is not None:
+                        czesci.append(indeksy)
+        
+        if not czesci:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(czesci)
+    
+    def _w_promieniu(self, lat: float, lon: float, promien: float,
+                     maska: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        indeksy = self._kandydaci(lat, lon, promien)
+        if maska is not None:
+            indeksy = indeksy[maska[indeksy]]
+        dystanse = oblicz_dystanse(lat, lon, self.szerokosci[indeksy], self.dlugosci[indeksy])
+        w_zasiegu = dystanse <= promien
+        return dystanse[w_zasiegu], indeksy[w_zasiegu]
+    
+    def w_promieniu(self, lat: float, lon: float, promien: float,
+                    maska: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """Unsorted (distance_km, index) pairs of points within the radius.
+        
+        ``maska`` is an optional boolean array selecting which points may be returned.
+        """
+        dystanse, indeksy = self._w_promieniu(lat, lon, promien, maska)
+        return list(zip(dystanse.tolist(), indeksy.tolist()))
+    
+    def najblizsze(self, lat: float, lon: float, k: int, promien: float,
+                   maska: Optional[np.ndarray] = None) -> List[Tuple[float, int]]:
+        """Up to k closest points within the radius, searching outwards from the origin."""
+        biezacy_promien = min(promien, self.rozmiar_komorki * KM_NA_STOPIEN)
+        while True:
+            dystanse, indeksy = self._w_promieniu(lat, lon, biezacy_promien, maska)
+            if len(dystanse) >= k or biezacy_promien >= promien:
+                break
+            biezacy_promien = min(biezacy_promien * 2, promien)
+        
+        if k <= 0:
+            return []
+        if len(dystanse) > k:
+            wybrane = np.argpartition(dystanse, k - 1)[:k]
+            dystanse, indeksy = dystanse[wybrane], indeksy[wybrane]
+        kolejnosc = np.lexsort((indeksy, dystanse))
+        return list(zip(dystanse[kolejnosc].tolist(), indeksy[kolejnosc].tolist()))
+
+class MigawkaStacji:
+    """Station information with its spatial index, paired with one station_status payload."""
+    
+    def __init__(self, informacje: Dict, status: Dict, poprzednia: Optional['MigawkaStacji'] = None):
+        self.informacje = informacje
+        self.status = status
+        
+        if poprzednia is not None and poprzednia.informacje is informacje:
+            self.stacje = poprzednia.stacje
+            self.indeks = poprzednia.indeks
+        else:
+            self.stacje = [{
+                'id': stacja['station_id'],
+                'name': stacja['name'],
+                'lat': stacja['lat'],
+                'lon': stacja['lon']
+            } for stacja in informacje['data']['stations']]
+            self.indeks = IndeksPrzestrzenny([(stacja['lat'], stacja['lon']) for stacja in self.stacje])
+        
+        mapa_statusu = {}
+        for stacja in status['data']['stations']:
+            mapa_statusu[stacja['station_id']] = {
+                'bikes': stacja['num_bikes_available'],
+                'docks': stacja['num_docks_available'],
+                'renting': stacja['is_renting'] == 1
+            }
+        self.rowery = tuple(mapa_statusu.get(stacja['id'], {}).get('bikes', 0) for stacja in self.stacje)
+        self.stojaki = tuple(mapa_statusu.get(stacja['id'], {}).get('docks', 0) for stacja in self.stacje)
+        self.ma_rowery = np.array(self.rowery, dtype=np.int64) > 0
+        self.ma_rowery.flags.writeable = False
+        
+        self.pobrano = time.time()
+        ostatnia_aktualizacja = status.get('last_updated')
+        if not isinstance(ostatnia_aktualizacja, (int, float)):
+            ostatnia_aktualizacja = self.pobrano
+        self.ostatnia_aktualizacja = ostatnia_aktualizacja
+
+class Dostawa_GBFS:
+    
+    def __init__(self, nazwa: str, adres_bazowy: str, adresy_feedow: Optional[Dict[str, str]] = None,
+                 granice: Optional[Tuple[float, float, float, float]] = None):
+        self._nazwa = nazwa
+        self.adres_bazowy = adres_bazowy
+        self.adresy_feedow = adresy_feedow or {
+            nazwa_feedu: f"{adres_bazowy}/{nazwa_feedu}.json" for nazwa_feedu in WYMAGANE_FEEDY
+        }
+        self._granice = tuple(granice) if granice else None
         self.limit_czasu = 5
         self.identyfikator_klienta = "hackheroes-co2calculator"
+        self._sesja = self._utworz_sesje()
+        self._pamiec = {
+            'station_information': PamiecFeedu(MINIMALNY_TTL_INFORMACJI),
+            'station_status': PamiecFeedu(MINIMALNY_TTL_STATUSU)
+        }
+        self._blokady_async: Dict[str, asyncio.Lock] = {}
+        self._blokada_migawki = threading.Lock()
+        self._migawka = None
+        self._watek_odswiezania = None
+        self._zatrzymaj_odswiezanie = threading.Event()
+    
+    @classmethod
+    def z_odkrycia(cls, nazwa: str, adres_gbfs: str, jezyk: Optional[str] = None, **kwargs) -> 'Dostawa_GBFS':
+        """Builds a provider from a GBFS ``gbfs.json`` discovery document."""
+        odpowiedz = requests.get(adres_gbfs, timeout=5)
+        odpowiedz.raise_for_status()
+        dane = szybki_json.wczytaj(odpowiedz.content)['data']
+        
+        if 'feeds' in dane:
+            feedy = dane['feeds']
+        else:
+            jezyk = jezyk if jezyk in dane else next(iter(dane))
+            feedy = dane[jezyk]['feeds']
+        
+        adresy_feedow = {feed['name']: feed['url'] for feed in feedy if feed['name'] in WYMAGANE_FEEDY}
+        brakujace = [nazwa_feedu for nazwa_feedu in WYMAGANE_FEEDY if nazwa_feedu not in adresy_feedow]
+        if brakujace:
+            raise ValueError(f"System {nazwa} nie udostępnia feedów: {', '.join(brakujace)}")
+        
+        return cls(nazwa, adres_gbfs.rsplit('/', 1)[0], adresy_feedow, **kwargs)
     
     def nazwa(self) -> str:
-        return "MEVO"
+        return self._nazwa
     
-    def pobierz_pojazdy(self, szerokosc: float, dlugosc: float, promien: float) -> List[Dict]:
-        try:
-            odpowiedz_info = requests.get(
-                f"{self.adres_bazowy}/station_information.json",
-                headers={"Client-Identifier": self.identyfikator_klienta},
-                timeout=self.limit_czasu
-            )
-            odpowiedz_info.raise_for_status()
-            informacje_stacji = odpowiedz_info.json()
-            
-            odpowiedz_status = requests.get(
-                f"{self.adres_bazowy}/station_status.json",
-                headers={"Client-Identifier": self.identyfikator_klienta},
-                timeout=self.limit_czasu
-            )
-            odpowiedz_status.raise_for_status()
-            status_stacji = odpowiedz_status.json()
-            
-            pojazdy = []
+    def granice(self) -> Optional[Tuple[float, float, float, float]]:
+        """(min_lat, min_lon, max_lat, max_lon) of the system's stations, if known."""
+        if self._granice is not None:
+            return self._granice
+        migawka = self._migawka
+        return migawka.indeks.granice if migawka is not None else None
+    
+    def _utworz_sesje(self) -> requests.Session:
+        sesja = requests.Session()
+        adapter = HTTPAdapter(pool_connections=ROZMIAR_PULI_POLACZEN, pool_maxsize=ROZMIAR_PULI_POLACZEN)
+        sesja.mount("https://", adapter)
+        sesja.mount("http://", adapter)
+        sesja.headers.update({"Client-Identifier": self.identyfikator_klienta})
+        return sesja
+    
+    def _naglowki_warunkowe(self, wpis: PamiecFeedu) -> Dict[str, str]:
+        naglowki = {}
+        if wpis.dane is not None:
+            if wpis.etag:
+                naglowki['If-None-Match'] = wpis.etag
+            if wpis.ostatnia_modyfikacja:
+                naglowki['If-Modified-Since'] = wpis.ostatnia_modyfikacja
+        return naglowki
+    
+    def _przyjmij_odpowiedz(self, wpis: PamiecFeedu, nazwa_feedu: str, odpowiedz) -> Dict:
+        """Stores a feed response (requests or httpx) in the cache; raises on error statuses."""
+        POBRANIA_GBFS.zwieksz(self.nazwa(), nazwa_feedu, str(odpowiedz.status_code))
+        if odpowiedz.status_code == 304 and wpis.dane is not None:
+            wpis.wygasa = oblicz_wygasniecie(wpis.dane, wpis.minimalny_ttl)
+            return wpis.dane
+        odpowiedz.raise_for_status()
+        dane = szybki_json.wczytaj(odpowiedz.content)
+        
+        wpis.dane = dane
+        wpis.wygasa = oblicz_wygasniecie(dane, wpis.minimalny_ttl)
+        wpis.etag = odpowiedz.headers.get('ETag')
+        wpis.ostatnia_modyfikacja = odpowiedz.headers.get('Last-Modified')
+        return dane
+    
+    def _uzyj_starych_danych(self, wpis: PamiecFeedu, nazwa_feedu: str, blad: Exception) -> Dict:
+        BLEDY_GBFS.zwieksz(self.nazwa(), nazwa_feedu)
+        if wpis.dane is None:
+            raise blad
+        logger.warning(f"Błąd odświeżania {nazwa_feedu}, używam starych danych: {blad}")
+        wpis.wygasa = time.time() + MINIMALNY_TTL_STATUSU
+        return wpis.dane
+    
+    def _pobierz_feed(self, nazwa_feedu: str) -> Dict:
+        wpis = self._pamiec[nazwa_feedu]
+        if wpis.aktualne():
+            ZAPYTANIA_PAMIECI.zwieksz('gbfs_feed', 'hit')
+            return wpis.dane
+        
+        with wpis.blokada:
+            if wpis.aktualne():
+                ZAPYTANIA_PAMIECI.zwieksz('gbfs_feed', 'hit')
+                return wpis.dane
+            ZAPYTANIA_PAMIECI.zwieksz('gbfs_feed', 'miss')
             
-            mapa_statusu = {}
-            for stacja in status_stacji['data']['stations']:
-                mapa_statusu[stacja['station_id']] = {
-                    'bikes': stacja['num_bikes_available'],
-                    'docks': stacja['num_docks_available'],
-                    'renting': stacja['is_renting'] == 1
-                }
+            try:
+                with CZAS_POBIERANIA_GBFS.mierz(self.nazwa(), nazwa_feedu):
+                    odpowiedz = self._sesja.get(
+                        self.adresy_feedow[nazwa_feedu],
+                        headers=self._naglowki_warunkowe(wpis),
+                        timeout=self.limit_czasu
+                    )
+                return self._przyjmij_odpowiedz(wpis, nazwa_feedu, odpowiedz)
+            except Exception as e:
+                return self._uzyj_starych_danych(wpis, nazwa_feedu, e)
+    
+    async def _apobierz_feed(self, nazwa_feedu: str, klient) -> Dict:
+        """Same as _pobierz_feed, over an httpx.AsyncClient and without blocking the event loop.
+        
+        The asyncio lock collapses refreshes between coroutines; wpis.blokada is held as well,
+        so a sync refresh on a worker thread never writes the same entry at the same time.
+        """
+        wpis = self._pamiec[nazwa_feedu]
+        blokada = self._blokady_async.setdefault(nazwa_feedu, asyncio.Lock())
+        async with blokada:
+            if wpis.aktualne():
+                ZAPYTANIA_PAMIECI.zwieksz('gbfs_feed', 'hit')
+                return wpis.dane
             
-            for stacja in informacje_stacji['data']['stations']:
-                status = mapa_statusu.get(stacja['station_id'], {})
-                
-                if status.get('bikes', 0) == 0:
-                    continue
-                
-                dystans = oblicz_dystans(szerokosc, dlugosc, stacja['lat'], stacja['lon'])
-                if dystans > promien:
-                    continue
+            await _azajmij(wpis.blokada)
+            try:
+                if wpis.aktualne():
+                    ZAPYTANIA_PAMIECI.zwieksz('gbfs_feed', 'hit')
+                    return wpis.dane
+                ZAPYTANIA_PAMIECI.zwieksz('gbfs_feed', 'miss')
                 
-                pojazdy.append({
-                    'id': stacja['station_id'],
-                    'type': 'bike',
-                    'provider': self.nazwa(),
-                    'name': stacja['name'],
-                    'location': {'latitude': stacja['lat'], 'longitude': stacja['lon']},
-                    'distance_km': round(dystans, 2),
-                    'bikes_available': status.get('bikes', 0),
-                    'docks_available': status.get('docks', 0),
-                    'is_available': True
-                })
+                try:
+                    with CZAS_POBIERANIA_GBFS.mierz(self.nazwa(), nazwa_feedu):
+                        odpowiedz = await klient.get(
+                            self.adresy_feedow[nazwa_feedu],
+                            headers={"Client-Identifier": self.identyfikator_klienta, **self._naglowki_warunkowe(wpis)},
+                            timeout=self.limit_czasu
+                        )
+                    return self._przyjmij_odpowiedz(wpis, nazwa_feedu, odpowiedz)
+                except Exception as e:
+                    return self._uzyj_starych_danych(wpis, nazwa_feedu, e)
+            finally:
+                wpis.blokada.release()
+    
+    async def aodswiez(self, klient):
+        """Refreshes expired feeds on the event loop, so the next lookup is served from the cache.
+        
+        A no-op while the background refresher runs, since lookups never fetch then.
+        """
+        if self._watek_odswiezania is not None:
+            return
+        await asyncio.gather(*(
+            self._apobierz_feed(nazwa_feedu, klient)
+            for nazwa_feedu, wpis in self._pamiec.items() if not wpis.aktualne()
+        ))
+    
+    def _zbuduj_migawke(self) -> MigawkaStacji:
+        informacje_stacji = self._pobierz_feed('station_information')
+        status_stacji = self._pobierz_feed('station_status')
+        
+        migawka = self._migawka
+        if migawka and migawka.informacje is informacje_stacji and migawka.status is status_stacji:
+            return migawka
+        
+        with self._blokada_migawki:
+            migawka = self._migawka
+            if migawka and migawka.informacje is informacje_stacji and migawka.status is status_stacji:
+                return migawka
             
-            pojazdy.sort(key=lambda x: x['distance_km'])
-            return pojazdy
+            self._migawka = MigawkaStacji(informacje_stacji, status_stacji, migawka)
+            return self._migawka
+    
+    def pobierz_migawke(self) -> MigawkaStacji:
+        """Current station snapshot.
+        
+        With the background refresher running this never touches the network and only
+        returns the last snapshot swapped in by the refresher thread.
+        """
+        if self._watek_odswiezania is None:
+            return self._zbuduj_migawke()
         
+        migawka = self._migawka
+        if migawka is None:
+            raise DaneNiegotowe(f"Dane stacji {self.nazwa()} nie zostały jeszcze pobrane")
+        return migawka
+    
+    def czas_aktualizacji(self) -> Optional[float]:
+        migawka = self._migawka
+        return migawka.ostatnia_aktualizacja if migawka is not None else None
+    
+    def znacznik_aktualnosci(self) -> Optional[str]:
+        """ISO timestamp of the station status currently served, if any."""
+        return formatuj_znacznik(self.czas_aktualizacji())
+    
+    def uruchom_odswiezanie(self):
+        if self._watek_odswiezania is not None:
+            return
+        self._zatrzymaj_odswiezanie.clear()
+        self._watek_odswiezania = threading.Thread(
+            target=self._petla_odswiezania,
+            name=f"odswiezanie-{self.nazwa()}",
+            daemon=True
+        )
+        self._watek_odswiezania.start()
+    
+    def zatrzymaj_odswiezanie(self):
+        watek = self._watek_odswiezania
+        if watek is None:
+            return
+        self._zatrzymaj_odswiezanie.set()
+        watek.join(timeout=self.limit_czasu * 2)
+        self._watek_odswiezania = None
+    
+    def _petla_odswiezania(self):
+        while not self._zatrzymaj_odswiezanie.is_set():
+            try:
+                self._zbuduj_migawke()
+                do_wygasniecia = min(wpis.wygasa for wpis in self._pamiec.values()) - time.time()
+                odstep = min(max(do_wygasniecia, 1.0), MAKSYMALNY_ODSTEP_ODSWIEZANIA)
+            except Exception as e:
+                logger.error(f"Błąd odświeżania {self.nazwa()}: {e}")
+                odstep = MINIMALNY_TTL_STATUSU
+            self._zatrzymaj_odswiezanie.wait(odstep)
+    
+    def _jako_pojazd(self, migawka: MigawkaStacji, indeks: int, dystans: float) -> Dict:
+        stacja = migawka.stacje[indeks]
+        return {
+            'id': stacja['id'],
+            'type': 'bike',
+            'provider': self.nazwa(),
+            'name': stacja['name'],
+            'location': {'latitude': stacja['lat'], 'longitude': stacja['lon']},
+            'distance_km': round(dystans, 2),
+            'bikes_available': migawka.rowery[indeks],
+            'docks_available': migawka.stojaki[indeks],
+            'is_available': True
+        }
+    
+    def pobierz_pojazdy(self, szerokosc: float, dlugosc: float, promien: float) -> List[Dict]:
+        try:
+            migawka = self.pobierz_migawke()
+            trafienia = migawka.indeks.w_promieniu(szerokosc, dlugosc, promien, migawka.ma_rowery)
+            trafienia.sort()
+            return [self._jako_pojazd(migawka, indeks, dystans) for dystans, indeks in trafienia]
+        
+        except DaneNiegotowe:
+            raise
         except Exception as e:
-            logger.error(f"Błąd MEVO: {e}")
+            logger.error(f"Błąd {self.nazwa()}: {e}")
             return []
+    
+    def pobierz_najblizsze_wielu(self, punkty: Sequence[Tuple[float, float, float]]) -> List[Optional[Dict]]:
+        """Closest available station for each (lat, lon, radius), all looked up in one snapshot."""
+        try:
+            migawka = self.pobierz_migawke()
+        except DaneNiegotowe:
+            raise
+        except Exception as e:
+            logger.error(f"Błąd {self.nazwa()}: {e}")
+            return [None] * len(punkty)
+        
+        wyniki = []
+        for szerokosc, dlugosc, promien in punkty:
+            trafienia = migawka.indeks.najblizsze(szerokosc, dlugosc, 1, promien, migawka.ma_rowery)
+            if trafienia:
+                dystans, indeks = trafienia[0]
+                wyniki.append(self._jako_pojazd(migawka, indeks, dystans))
+            else:
+                wyniki.append(None)
+        return wyniki
+    
+    def pobierz_najblizsze(self, szerokosc: float, dlugosc: float, promien: float, liczba: int = 1) -> List[Dict]:
+        try:
+            migawka = self.pobierz_migawke()
+            trafienia = migawka.indeks.najblizsze(szerokosc, dlugosc, liczba, promien, migawka.ma_rowery)
+            return [self._jako_pojazd(migawka, indeks, dystans) for dystans, indeks in trafienia]
+        
+        except DaneNiegotowe:
+            raise
+        except Exception as e:
+            logger.error(f"Błąd {self.nazwa()}: {e}")
+            return []
+
+class Dostawa_MEVO(Dostawa_GBFS):
+    
+    def __init__(self):
+        super().__init__("MEVO", "https://gbfs.urbansharing.com/rowermevo.pl")
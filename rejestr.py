@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import json
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from providers import Dostawa_GBFS, Dostawa_MEVO, KM_NA_STOPIEN, formatuj_znacznik
+
+logger = logging.getLogger(__name__)
+
+MAKSYMALNA_LICZBA_WATKOW = 8
+
+
+def obejmuje(granice, lat: float, lon: float, promien: float) -> bool:
+    """Whether a bounding box widened by the radius contains the point."""
+    if granice is None:
+        return True
+    
+    min_lat, min_lon, max_lat, max_lon = granice
+    margines_lat = promien / KM_NA_STOPIEN
+    cos_lat = math.cos(math.radians(min(90.0, abs(lat) + margines_lat)))
+    margines_lon = margines_lat / cos_lat if cos_lat > 1e-9 else 360.0
+    
+    return (min_lat - margines_lat <= lat <= max_lat + margines_lat
+            and min_lon - margines_lon <= lon <= max_lon + margines_lon)
+
+
+def utworz_dostawce(konfiguracja: Dict) -> Dostawa_GBFS:
+    nazwa = konfiguracja['name']
+    granice = konfiguracja.get('bbox')
+    
+    if 'discovery' in konfiguracja:
+        return Dostawa_GBFS.z_odkrycia(nazwa, konfiguracja['discovery'], konfiguracja.get('language'), granice=granice)
+    return Dostawa_GBFS(nazwa, konfiguracja['url'], konfiguracja.get('feeds'), granice)
+
+
+class RejestrDostawcow:
+    """Set of GBFS systems queried as one provider.
+    
+    Queries are routed only to systems whose bounding box covers the coordinates
+    and the selected systems are queried concurrently. A system that fails (e.g. its
+    first snapshot is still loading) is left out of the answer; the query fails only
+    when none of the selected systems answered.
+    """
+    
+    def __init__(self, dostawcy: List[Dostawa_GBFS]):
+        self.dostawcy = list(dostawcy)
+        self._pula = ThreadPoolExecutor(
+            max_workers=max(1, min(len(self.dostawcy), MAKSYMALNA_LICZBA_WATKOW)),
+            thread_name_prefix="rejestr-gbfs"
+        )
+    
+    @classmethod
+    def z_konfiguracji(cls, sciezka: Optional[str]) -> 'RejestrDostawcow':
+        """Loads systems from a JSON file; without a file only MEVO is registered.
+        
+        Each entry has ``name`` and either ``url`` (base URL of the feeds) or
+        ``discovery`` (URL of ``gbfs.json``), plus optional ``language`` and ``bbox``
+        given as [min_lat, min_lon, max_lat, max_lon].
+        """
+        if not sciezka:
+            return cls([Dostawa_MEVO()])
+        
+        with open(sciezka, 'r') as f:
+            konfiguracja = json.load(f)
+        
+        dostawcy = []
+        for wpis in konfiguracja:
+            try:
+                dostawcy.append(utworz_dostawce(wpis))
+            except Exception as e:
+                logger.error(f"Nie udało się załadować systemu {wpis.get('name')}: {e}")
+        
+        if not dostawcy:
+            raise ValueError(f"Brak poprawnych systemów GBFS w {sciezka}")
+        return cls(dostawcy)
+    
+    def nazwa(self) -> str:
+        return ", ".join(dostawca.nazwa() for dostawca in self.dostawcy)
+    
+    def _wybierz(self, lat: float, lon: float, promien: float) -> List[Dostawa_GBFS]:
+        return [dostawca for dostawca in self.dostawcy if obejmuje(dostawca.granice(), lat, lon, promien)]
+    
+    def _rozeslij(self, dostawcy: List[Dostawa_GBFS], wykonaj: Callable[[Dostawa_GBFS], object]) -> List:
+        """Results of ``wykonaj`` for the systems that answered; re-raises only when all of them failed."""
+        def bezpiecznie(dostawca):
+            try:
+                return wykonaj(dostawca), None
+            except Exception as e:
+                return None, e
+        
+        odpowiedzi = [bezpiecznie(dostawcy[0])] if len(dostawcy) == 1 else list(self._pula.map(bezpiecznie, dostawcy))
+        bledy = [(dostawca, blad) for dostawca, (_, blad) in zip(dostawcy, odpowiedzi) if blad is not None]
+        if bledy and len(bledy) == len(dostawcy):
+            raise bledy[0][1]
+        for dostawca, blad in bledy:
+            logger.warning(f"Pominięto system {dostawca.nazwa()}: {blad}")
+        return [wynik for wynik, blad in odpowiedzi if blad is None]
+    
+    def pobierz_pojazdy(self, szerokosc: float, dlugosc: float, promien: float) -> List[Dict]:
+        dostawcy = self._wybierz(szerokosc, dlugosc, promien)
+        wyniki = self._rozeslij(dostawcy, lambda dostawca: dostawca.pobierz_pojazdy(szerokosc, dlugosc, promien))
+        return list(heapq.merge(*wyniki, key=lambda pojazd: pojazd['distance_km']))
+    
+    def pobierz_najblizsze(self, szerokosc: float, dlugosc: float, promien: float, liczba: int = 1) -> List[Dict]:
+        dostawcy = self._wybierz(szerokosc, dlugosc, promien)
+        wyniki = self._rozeslij(
+            dostawcy, lambda dostawca: dostawca.pobierz_najblizsze(szerokosc, dlugosc, promien, liczba))
+        return heapq.nsmallest(liczba, (pojazd for wynik in wyniki for pojazd in wynik),
+                               key=lambda pojazd: pojazd['distance_km'])
+    
+    def pobierz_najblizsze_wielu(self, punkty: Sequence[Tuple[float, float, float]]) -> List[Optional[Dict]]:
+        """Closest station for each (lat, lon, radius); every system is queried once for its points."""
+        przydzial: Dict[Dostawa_GBFS, List[int]] = {}
+        for dostawca in self.dostawcy:
+            granice = dostawca.granice()
+            indeksy = [i for i, (lat, lon, promien) in enumerate(punkty) if obejmuje(granice, lat, lon, promien)]
+            if indeksy:
+                przydzial[dostawca] = indeksy
+        
+        def wykonaj(dostawca):
+            indeksy = przydzial[dostawca]
+            return indeksy, dostawca.pobierz_najblizsze_wielu([punkty[i] for i in indeksy])
+        
+        wyniki: List[Optional[Dict]] = [None] * len(punkty)
+        for indeksy, najblizsze in self._rozeslij(list(przydzial), wykonaj):
+            for i, pojazd in zip(indeksy, najblizsze):
+                if pojazd and (wyniki[i] is None or pojazd['distance_km'] < wyniki[i]['distance_km']):
+                    wyniki[i] = pojazd
+        return wyniki
+    
+    async def aodswiez(self, klient):
+        """Refreshes expired feeds of all systems concurrently with an httpx.AsyncClient."""
+        wyniki = await asyncio.gather(*(dostawca.aodswiez(klient) for dostawca in self.dostawcy), return_exceptions=True)
+        for dostawca, wynik in zip(self.dostawcy, wyniki):
+            if isinstance(wynik, Exception):
+                logger.error(f"Błąd {dostawca.nazwa()}: {wynik}")
+    
+    def znacznik_aktualnosci(self) -> Optional[str]:
+        """Timestamp of the oldest station status among the registered systems."""
+        czasy = [czas for czas in (dostawca.czas_aktualizacji() for dostawca in self.dostawcy) if czas is not None]
+        return formatuj_znacznik(min(czasy)) if czasy else None
+    
+    def uruchom_odswiezanie(self):
+        for dostawca in self.dostawcy:
+            dostawca.uruchom_odswiezanie()
+    
+    def zatrzymaj_odswiezanie(self):
+        for dostawca in self.dostawcy:
+            dostawca.zatrzymaj_odswiezanie()
@@ -0,0 +1,80 @@
+-- Atomic increment of a user's totals in one round-trip, replacing the
+-- SELECT + UPDATE/INSERT sequence done previously from the backend.
+
+-- That race left some users with several rows. Fold them into one row per user
+-- (counters summed, the most recently updated row kept) so the index can be built.
+create temporary table user_stats_duplikaty as
+select
+    user_id,
+    sum(coalesce(total_co2_saved_kg, 0)) as total_co2_saved_kg,
+    sum(coalesce(total_co2_emitted_kg, 0)) as total_co2_emitted_kg,
+    sum(coalesce(total_bike_journeys, 0)) as total_bike_journeys,
+    sum(coalesce(total_car_journeys, 0)) as total_car_journeys,
+    max(last_updated) as last_updated
+from public.user_stats
+group by user_id
+having count(*) > 1;
+
+delete from public.user_stats s
+using user_stats_duplikaty d
+where s.user_id = d.user_id
+  and s.ctid <> (
+      select t.ctid from public.user_stats t
+      where t.user_id = s.user_id
+      order by t.last_updated desc nulls last
+      limit 1
+  );
+
+update public.user_stats s set
+    total_co2_saved_kg = round(d.total_co2_saved_kg::numeric, 3),
+    total_co2_emitted_kg = round(d.total_co2_emitted_kg::numeric, 3),
+    total_bike_journeys = d.total_bike_journeys,
+    total_car_journeys = d.total_car_journeys,
+    net_neutral = d.total_co2_saved_kg - d.total_co2_emitted_kg >= 0,
+    last_updated = d.last_updated
+from user_stats_duplikaty d
+where s.user_id = d.user_id;
+
+drop table user_stats_duplikaty;
+
+create unique index if not exists user_stats_user_id_key on public.user_stats (user_id);
+
+create or replace function public.zwieksz_statystyki_uzytkownika(
+    p_user_id public.user_stats.user_id%type,
+    p_co2_saved_kg double precision,
+    p_co2_emitted_kg double precision,
+    p_bike_journeys integer,
+    p_car_journeys integer
+)
+returns void
+language sql
+as $$
+    insert into public.user_stats as s (
+        user_id,
+        total_co2_saved_kg,
+        total_co2_emitted_kg,
+        total_bike_journeys,
+        total_car_journeys,
+        net_neutral,
+        last_updated
+    )
+    values (
+        p_user_id,
+        round(p_co2_saved_kg::numeric, 3),
+        round(p_co2_emitted_kg::numeric, 3),
+        p_bike_journeys,
+        p_car_journeys,
+        p_co2_saved_kg - p_co2_emitted_kg >= 0,
+        now()
+    )
+    on conflict (user_id) do update set
+        total_co2_saved_kg = round((coalesce(s.total_co2_saved_kg, 0) + excluded.total_co2_saved_kg)::numeric, 3),
+        total_co2_emitted_kg = round((coalesce(s.total_co2_emitted_kg, 0) + excluded.total_co2_emitted_kg)::numeric, 3),
+        total_bike_journeys = coalesce(s.total_bike_journeys, 0) + excluded.total_bike_journeys,
+        total_car_journeys = coalesce(s.total_car_journeys, 0) + excluded.total_car_journeys,
+        net_neutral = (coalesce(s.total_co2_saved_kg, 0) + excluded.total_co2_saved_kg)
+                    - (coalesce(s.total_co2_emitted_kg, 0) + excluded.total_co2_emitted_kg) >= 0,
+        last_updated = now();
+$$;
+
+grant execute on function public.zwieksz_statystyki_uzytkownika to anon, authenticated;
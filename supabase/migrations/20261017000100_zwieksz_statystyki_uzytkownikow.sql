@@ -0,0 +1,47 @@
+-- Batch variant of zwieksz_statystyki_uzytkownika used by the write-behind
+-- journey queue: applies per-user deltas given as a JSON array of objects
+-- with the same keys as the single-user function parameters.
+
+create or replace function public.zwieksz_statystyki_uzytkownikow(p_delty jsonb)
+returns void
+language sql
+as $$
+    insert into public.user_stats as s (
+        user_id,
+        total_co2_saved_kg,
+        total_co2_emitted_kg,
+        total_bike_journeys,
+        total_car_journeys,
+        net_neutral,
+        last_updated
+    )
+    select
+        d.user_id,
+        round(sum(d.p_co2_saved_kg)::numeric, 3),
+        round(sum(d.p_co2_emitted_kg)::numeric, 3),
+        sum(d.p_bike_journeys),
+        sum(d.p_car_journeys),
+        sum(d.p_co2_saved_kg) - sum(d.p_co2_emitted_kg) >= 0,
+        now()
+    from (
+        -- jsonb_populate_record casts p_user_id to whatever type user_stats.user_id has
+        select
+            (jsonb_populate_record(null::public.user_stats, jsonb_build_object('user_id', e -> 'p_user_id'))).user_id,
+            (e ->> 'p_co2_saved_kg')::double precision as p_co2_saved_kg,
+            (e ->> 'p_co2_emitted_kg')::double precision as p_co2_emitted_kg,
+            (e ->> 'p_bike_journeys')::integer as p_bike_journeys,
+            (e ->> 'p_car_journeys')::integer as p_car_journeys
+        from jsonb_array_elements(p_delty) as e
+    ) as d
+    group by d.user_id
+    on conflict (user_id) do update set
+        total_co2_saved_kg = round((coalesce(s.total_co2_saved_kg, 0) + excluded.total_co2_saved_kg)::numeric, 3),
+        total_co2_emitted_kg = round((coalesce(s.total_co2_emitted_kg, 0) + excluded.total_co2_emitted_kg)::numeric, 3),
+        total_bike_journeys = coalesce(s.total_bike_journeys, 0) + excluded.total_bike_journeys,
+        total_car_journeys = coalesce(s.total_car_journeys, 0) + excluded.total_car_journeys,
+        net_neutral = (coalesce(s.total_co2_saved_kg, 0) + excluded.total_co2_saved_kg)
+                    - (coalesce(s.total_co2_emitted_kg, 0) + excluded.total_co2_emitted_kg) >= 0,
+        last_updated = now();
+$$;
+
+grant execute on function public.zwieksz_statystyki_uzytkownikow to anon, authenticated;
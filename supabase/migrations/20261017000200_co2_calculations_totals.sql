@@ -0,0 +1,164 @@
+-- Per-user totals of the legacy co2_calculations table, kept up to date by a
+-- statement-level trigger so that stats and share endpoints read one row
+-- instead of summing every calculation of the user.
+
+-- created with CTAS so that user_id keeps the column type used by co2_calculations
+do $$
+begin
+    if to_regclass('public.co2_calculations_totals') is null then
+        create table public.co2_calculations_totals as
+            select
+                user_id,
+                0::double precision as total_co2_savings_kg,
+                0::double precision as total_distance_km,
+                0::integer as calculations_count,
+                now() as updated_at
+            from public.co2_calculations
+            with no data;
+
+        alter table public.co2_calculations_totals
+            add primary key (user_id),
+            alter column total_co2_savings_kg set not null,
+            alter column total_co2_savings_kg set default 0,
+            alter column total_distance_km set not null,
+            alter column total_distance_km set default 0,
+            alter column calculations_count set not null,
+            alter column calculations_count set default 0,
+            alter column updated_at set not null,
+            alter column updated_at set default now();
+    end if;
+end;
+$$;
+
+alter table public.co2_calculations_totals enable row level security;
+
+drop policy if exists co2_calculations_totals_select on public.co2_calculations_totals;
+create policy co2_calculations_totals_select on public.co2_calculations_totals
+    for select using (true);
+
+grant select on public.co2_calculations_totals to anon, authenticated;
+
+create or replace function public.co2_calculations_totals_dodaj()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into public.co2_calculations_totals as t (
+        user_id, total_co2_savings_kg, total_distance_km, calculations_count, updated_at
+    )
+    select user_id, sum(coalesce(co2_savings_kg, 0)), sum(coalesce(distance_km, 0)), count(*), now()
+    from nowe
+    where user_id is not null
+    group by user_id
+    on conflict (user_id) do update set
+        total_co2_savings_kg = t.total_co2_savings_kg + excluded.total_co2_savings_kg,
+        total_distance_km = t.total_distance_km + excluded.total_distance_km,
+        calculations_count = t.calculations_count + excluded.calculations_count,
+        updated_at = now();
+    return null;
+end;
+$$;
+
+create or replace function public.co2_calculations_totals_odejmij()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    update public.co2_calculations_totals as t set
+        total_co2_savings_kg = t.total_co2_savings_kg - s.co2,
+        total_distance_km = t.total_distance_km - s.dystans,
+        calculations_count = t.calculations_count - s.liczba,
+        updated_at = now()
+    from (
+        select user_id, sum(coalesce(co2_savings_kg, 0)) as co2, sum(coalesce(distance_km, 0)) as dystans, count(*) as liczba
+        from stare
+        where user_id is not null
+        group by user_id
+    ) as s
+    where t.user_id = s.user_id;
+    return null;
+end;
+$$;
+
+-- Net change of an update: the new rows added, the old rows subtracted, so edits
+-- of amounts and moves between users both keep the totals exact.
+create or replace function public.co2_calculations_totals_zmien()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into public.co2_calculations_totals as t (
+        user_id, total_co2_savings_kg, total_distance_km, calculations_count, updated_at
+    )
+    select user_id, sum(co2), sum(dystans), sum(liczba), now()
+    from (
+        select user_id, coalesce(co2_savings_kg, 0) as co2, coalesce(distance_km, 0) as dystans, 1 as liczba
+        from nowe
+        union all
+        select user_id, -coalesce(co2_savings_kg, 0), -coalesce(distance_km, 0), -1
+        from stare
+    ) as zmiany
+    where user_id is not null
+    group by user_id
+    having sum(co2) <> 0 or sum(dystans) <> 0 or sum(liczba) <> 0
+    on conflict (user_id) do update set
+        total_co2_savings_kg = t.total_co2_savings_kg + excluded.total_co2_savings_kg,
+        total_distance_km = t.total_distance_km + excluded.total_distance_km,
+        calculations_count = t.calculations_count + excluded.calculations_count,
+        updated_at = now();
+    return null;
+end;
+$$;
+
+drop trigger if exists co2_calculations_totals_insert on public.co2_calculations;
+create trigger co2_calculations_totals_insert
+    after insert on public.co2_calculations
+    referencing new table as nowe
+    for each statement execute function public.co2_calculations_totals_dodaj();
+
+drop trigger if exists co2_calculations_totals_delete on public.co2_calculations;
+create trigger co2_calculations_totals_delete
+    after delete on public.co2_calculations
+    referencing old table as stare
+    for each statement execute function public.co2_calculations_totals_odejmij();
+
+drop trigger if exists co2_calculations_totals_update on public.co2_calculations;
+create trigger co2_calculations_totals_update
+    after update on public.co2_calculations
+    referencing old table as stare new table as nowe
+    for each statement execute function public.co2_calculations_totals_zmien();
+
+-- Rebuilds all totals from co2_calculations; run once below and again with
+-- `flask --app app przelicz-sumy-obliczen` if the totals ever drift.
+create or replace function public.przelicz_sumy_obliczen()
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    liczba_uzytkownikow integer;
+begin
+    lock table public.co2_calculations in share mode;
+    delete from public.co2_calculations_totals where true;
+    insert into public.co2_calculations_totals (
+        user_id, total_co2_savings_kg, total_distance_km, calculations_count, updated_at
+    )
+    select user_id, sum(coalesce(co2_savings_kg, 0)), sum(coalesce(distance_km, 0)), count(*), now()
+    from public.co2_calculations
+    where user_id is not null
+    group by user_id;
+    get diagnostics liczba_uzytkownikow = row_count;
+    return liczba_uzytkownikow;
+end;
+$$;
+
+revoke execute on function public.przelicz_sumy_obliczen from public, anon, authenticated;
+
+select public.przelicz_sumy_obliczen();
@@ -0,0 +1,102 @@
+-- Global totals over user_stats kept by a statement-level trigger in 32 counter
+-- rows (slots), so /v1/global-stats sums 32 rows instead of the whole table and
+-- saves are not serialised on a single row lock.
+
+create table if not exists public.global_stats (
+    id integer primary key check (id between 0 and 31),
+    total_co2_saved_kg double precision not null default 0,
+    total_co2_emitted_kg double precision not null default 0,
+    total_bike_journeys bigint not null default 0,
+    total_car_journeys bigint not null default 0,
+    total_users bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+alter table public.global_stats enable row level security;
+
+drop policy if exists global_stats_select on public.global_stats;
+create policy global_stats_select on public.global_stats
+    for select using (true);
+
+grant select on public.global_stats to anon, authenticated;
+
+-- Deltas of a statement are grouped by slot (hashtext(user_id) & 31), so
+-- concurrent saves of different users mostly lock different rows.
+create or replace function public.global_stats_aktualizuj()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    zmiany text := case tg_op
+        when 'INSERT' then 'select *, 1 as znak from nowe'
+        when 'DELETE' then 'select *, -1 as znak from stare'
+        else 'select *, 1 as znak from nowe union all select *, -1 as znak from stare'
+    end;
+begin
+    execute format($zapytanie$
+        insert into public.global_stats as g (
+            id, total_co2_saved_kg, total_co2_emitted_kg, total_bike_journeys, total_car_journeys, total_users, updated_at
+        )
+        select
+            hashtext(user_id::text) & 31,
+            sum(znak * coalesce(total_co2_saved_kg, 0)),
+            sum(znak * coalesce(total_co2_emitted_kg, 0)),
+            sum(znak * coalesce(total_bike_journeys, 0)),
+            sum(znak * coalesce(total_car_journeys, 0)),
+            sum(znak),
+            now()
+        from (%s) as zmiany
+        group by 1
+        on conflict (id) do update set
+            total_co2_saved_kg = g.total_co2_saved_kg + excluded.total_co2_saved_kg,
+            total_co2_emitted_kg = g.total_co2_emitted_kg + excluded.total_co2_emitted_kg,
+            total_bike_journeys = g.total_bike_journeys + excluded.total_bike_journeys,
+            total_car_journeys = g.total_car_journeys + excluded.total_car_journeys,
+            total_users = g.total_users + excluded.total_users,
+            updated_at = now()
+    $zapytanie$, zmiany);
+    return null;
+end;
+$$;
+
+drop trigger if exists global_stats_insert on public.user_stats;
+create trigger global_stats_insert
+    after insert on public.user_stats
+    referencing new table as nowe
+    for each statement execute function public.global_stats_aktualizuj();
+
+drop trigger if exists global_stats_update on public.user_stats;
+create trigger global_stats_update
+    after update on public.user_stats
+    referencing old table as stare new table as nowe
+    for each statement execute function public.global_stats_aktualizuj();
+
+drop trigger if exists global_stats_delete on public.user_stats;
+create trigger global_stats_delete
+    after delete on public.user_stats
+    referencing old table as stare
+    for each statement execute function public.global_stats_aktualizuj();
+
+-- Backfill from the current contents of user_stats.
+do $$
+begin
+    lock table public.user_stats in share mode;
+
+    delete from public.global_stats where true;
+    insert into public.global_stats (
+        id, total_co2_saved_kg, total_co2_emitted_kg, total_bike_journeys, total_car_journeys, total_users, updated_at
+    )
+    select
+        hashtext(user_id::text) & 31,
+        sum(coalesce(total_co2_saved_kg, 0)),
+        sum(coalesce(total_co2_emitted_kg, 0)),
+        sum(coalesce(total_bike_journeys, 0)),
+        sum(coalesce(total_car_journeys, 0)),
+        count(*),
+        now()
+    from public.user_stats
+    group by 1;
+end;
+$$;
@@ -0,0 +1,49 @@
+import json
+from typing import Any, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+from profilowanie import faza
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def wczytaj(dane: Union[bytes, str]) -> Any:
+    """Parses JSON with orjson when it is installed, the standard library otherwise."""
+    if orjson is not None:
+        return orjson.loads(dane)
+    return json.loads(dane)
+
+
+def zapisz(obiekt: Any) -> bytes:
+    """Compact JSON as UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obiekt, default=DefaultJSONProvider.default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obiekt, default=DefaultJSONProvider.default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class SzybkiDostawcaJSON(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson: compact output, keys in insertion order.
+
+    Types orjson does not know go through Flask's default conversion, so ``jsonify``
+    accepts the same values as before.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return zapisz(obj).decode()
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        with faza('serialize'):
+            dane = zapisz(obj)
+        return self._app.response_class(dane, mimetype=self.mimetype)
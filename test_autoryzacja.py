@@ -0,0 +1,158 @@
+import socket
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import autoryzacja
+from autoryzacja import ODBIORCA_TOKENU, WeryfikacjaNiedostepna, WeryfikatorTokenow
+
+SEKRET = 'sekret-testowy-o-dlugosci-co-najmniej-32-bajtow'
+UZYTKOWNIK = '123e4567-e89b-12d3-a456-426614174000'
+
+
+def token(klucz=SEKRET, algorytm='HS256', naglowki=None, **roszczenia) -> str:
+    dane = {'sub': UZYTKOWNIK, 'aud': ODBIORCA_TOKENU, 'exp': int(time.time()) + 3600}
+    dane.update(roszczenia)
+    return jwt.encode({k: v for k, v in dane.items() if v is not None}, klucz, algorithm=algorytm, headers=naglowki)
+
+
+class AtrapaJWKS:
+    """Stands in for PyJWKClient: serves one RSA key, or fails like an unreachable endpoint."""
+
+    def __init__(self, klucz_publiczny, kid: str = 'klucz-1', dostepny: bool = True):
+        self.klucz = jwt.PyJWK.from_dict({**jwt.algorithms.RSAAlgorithm.to_jwk(klucz_publiczny, as_dict=True),
+                                          'kid': kid, 'alg': 'RS256'})
+        self.kid = kid
+        self.dostepny = dostepny
+        self.pobrania = 0
+
+    def get_signing_key_from_jwt(self, token: str):
+        self.pobrania += 1
+        if not self.dostepny:
+            raise jwt.PyJWKClientConnectionError("Fail to fetch data from the url")
+        if jwt.get_unverified_header(token).get('kid') != self.kid:
+            raise jwt.PyJWKClientError("Unable to find a signing key that matches")
+        return self.klucz
+
+
+class LicznikWeryfikacjiZdalnej:
+    def __init__(self, wynik=UZYTKOWNIK):
+        self.wynik = wynik
+        self.wywolania = 0
+
+    def __call__(self, token: str):
+        self.wywolania += 1
+        return self.wynik
+
+
+@pytest.fixture(scope='module')
+def klucz_rsa():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def weryfikator(sekret=SEKRET, zdalna=None, jwks=None) -> WeryfikatorTokenow:
+    wynik = WeryfikatorTokenow('http://127.0.0.1:9', sekret, zdalna)
+    if jwks is not None:
+        wynik._klient_jwks = jwks
+    return wynik
+
+
+def test_poprawny_token_hs256():
+    assert weryfikator().weryfikuj(token()) == UZYTKOWNIK
+
+
+@pytest.mark.parametrize('zly_token, blad', [
+    (lambda: token(exp=int(time.time()) - 10), jwt.ExpiredSignatureError),
+    (lambda: token(aud='anon'), jwt.InvalidAudienceError),
+    (lambda: token(klucz='inny-sekret-o-dlugosci-co-najmniej-32-bajtow'), jwt.InvalidSignatureError),
+    (lambda: token(sub=None), jwt.MissingRequiredClaimError),
+    (lambda: token(exp=None), jwt.MissingRequiredClaimError),
+    (lambda: token(klucz=None, algorytm='none'), jwt.InvalidAlgorithmError),
+])
+def test_odrzucone_tokeny(zly_token, blad):
+    with pytest.raises(blad):
+        weryfikator().weryfikuj(zly_token())
+
+
+def test_token_none_nie_trafia_do_weryfikacji_zdalnej():
+    zdalna = LicznikWeryfikacjiZdalnej()
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        weryfikator(zdalna=zdalna).weryfikuj(token(klucz=None, algorytm='none'))
+    assert zdalna.wywolania == 0
+
+
+def test_odrzucony_token_jest_pamietany(monkeypatch):
+    w = weryfikator()
+    zly = token(klucz='inny-sekret-o-dlugosci-co-najmniej-32-bajtow')
+    with pytest.raises(jwt.InvalidSignatureError):
+        w.weryfikuj(zly)
+
+    monkeypatch.setattr(w, '_sprawdz_podpis', lambda t: pytest.fail("odrzucony token sprawdzony ponownie"))
+    with pytest.raises(jwt.InvalidSignatureError):
+        w.weryfikuj(zly)
+
+
+def test_rs256_z_jwks(klucz_rsa):
+    jwks = AtrapaJWKS(klucz_rsa.public_key())
+    w = weryfikator(jwks=jwks)
+    assert w.weryfikuj(token(klucz_rsa, 'RS256', {'kid': 'klucz-1'})) == UZYTKOWNIK
+
+    inny_klucz = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(jwt.InvalidSignatureError):
+        w.weryfikuj(token(inny_klucz, 'RS256', {'kid': 'klucz-1'}))
+
+
+def test_nieznany_kid_nie_pobiera_jwks_ponownie(klucz_rsa):
+    jwks = AtrapaJWKS(klucz_rsa.public_key())
+    w = weryfikator(jwks=jwks)
+    for numer in range(3):
+        with pytest.raises(jwt.InvalidTokenError):
+            w.weryfikuj(token(klucz_rsa, 'RS256', {'kid': 'obcy'}, jti=str(numer)))
+    assert jwks.pobrania == 1
+
+
+def test_niedostepny_jwks_przechodzi_na_weryfikacje_zdalna(klucz_rsa):
+    zdalna = LicznikWeryfikacjiZdalnej()
+    w = weryfikator(zdalna=zdalna, jwks=AtrapaJWKS(klucz_rsa.public_key(), dostepny=False))
+    poprawny = token(klucz_rsa, 'RS256', {'kid': 'klucz-1'})
+    assert w.weryfikuj(poprawny) == UZYTKOWNIK
+    assert w.weryfikuj(poprawny) == UZYTKOWNIK
+    assert zdalna.wywolania == 1
+
+
+def test_brak_sekretu_przechodzi_na_weryfikacje_zdalna():
+    zdalna = LicznikWeryfikacjiZdalnej(wynik=None)
+    w = weryfikator(sekret=None, zdalna=zdalna)
+    odrzucony = token()
+    for _ in range(2):
+        with pytest.raises(jwt.InvalidTokenError):
+            w.weryfikuj(odrzucony)
+    assert zdalna.wywolania == 1
+
+
+def test_weryfikacja_niedostepna_nie_jest_pamietana(klucz_rsa):
+    jwks = AtrapaJWKS(klucz_rsa.public_key(), dostepny=False)
+    w = weryfikator(jwks=jwks)
+    poprawny = token(klucz_rsa, 'RS256', {'kid': 'klucz-1'})
+    with pytest.raises(WeryfikacjaNiedostepna):
+        w.weryfikuj(poprawny)
+
+    jwks.dostepny = True
+    assert w.weryfikuj(poprawny) == UZYTKOWNIK
+
+
+def test_zawieszony_jwks_nie_blokuje_dluzej_niz_limit_czasu(klucz_rsa, monkeypatch):
+    monkeypatch.setattr(autoryzacja, 'LIMIT_CZASU_JWKS', 0.5)
+    with socket.socket() as serwer:
+        # Accepts connections (backlog) but never answers, like a hung JWKS endpoint.
+        serwer.bind(('127.0.0.1', 0))
+        serwer.listen(8)
+        zdalna = LicznikWeryfikacjiZdalnej()
+        w = WeryfikatorTokenow(f"http://127.0.0.1:{serwer.getsockname()[1]}", SEKRET, zdalna)
+
+        poczatek = time.monotonic()
+        assert w.weryfikuj(token(klucz_rsa, 'RS256', {'kid': 'klucz-1'})) == UZYTKOWNIK
+        assert time.monotonic() - poczatek < 5
+        assert zdalna.wywolania == 1
@@ -0,0 +1,91 @@
+import random
+
+import numpy as np
+import pytest
+
+from providers import IndeksPrzestrzenny, oblicz_dystans
+
+# Clusters around a city, the antimeridian and both poles, plus points spread over the globe.
+SRODKI = [(52.23, 21.01), (0.0, 179.95), (-16.5, -179.9), (65.0, 180.0), (89.6, 30.0), (-89.7, -120.0)]
+PROMIENIE = [0.5, 5.0, 50.0, 500.0]
+
+
+def losuj_punkty(los: random.Random, liczba: int = 3000):
+    punkty = []
+    for _ in range(liczba):
+        if los.random() < 0.2:
+            punkty.append((los.uniform(-90, 90), los.uniform(-180, 180)))
+            continue
+        lat, lon = los.choice(SRODKI)
+        lat = max(-90.0, min(90.0, lat + los.gauss(0, 0.5)))
+        lon = (lon + los.gauss(0, 0.5) + 180) % 360 - 180
+        punkty.append((lat, lon))
+    return punkty
+
+
+def losuj_zapytania(los: random.Random, liczba: int = 40):
+    zapytania = [(lat, lon) for lat, lon in SRODKI]
+    zapytania += [(0.0, -180.0), (0.0, 180.0), (90.0, 0.0), (-90.0, 0.0)]
+    while len(zapytania) < liczba:
+        lat, lon = los.choice(SRODKI)
+        zapytania.append((max(-90.0, min(90.0, lat + los.gauss(0, 1))), (lon + los.gauss(0, 1) + 180) % 360 - 180))
+    return zapytania
+
+
+def dystanse_naiwne(punkty, lat: float, lon: float):
+    return [(oblicz_dystans(lat, lon, p_lat, p_lon), indeks) for indeks, (p_lat, p_lon) in enumerate(punkty)]
+
+
+@pytest.fixture(scope='module')
+def dane():
+    los = random.Random(2025)
+    punkty = losuj_punkty(los)
+    return punkty, IndeksPrzestrzenny(punkty), losuj_zapytania(los)
+
+
+def test_w_promieniu_zgodne_z_przeszukaniem_liniowym(dane):
+    punkty, indeks, zapytania = dane
+    for lat, lon in zapytania:
+        wszystkie = dystanse_naiwne(punkty, lat, lon)
+        for promien in PROMIENIE:
+            wynik = dict((i, d) for d, i in indeks.w_promieniu(lat, lon, promien))
+            oczekiwane = {i: d for d, i in wszystkie if d <= promien}
+            # Points within float noise of the boundary may fall on either side.
+            niepewne = {i for d, i in wszystkie if abs(d - promien) < 1e-6}
+            assert set(wynik) - niepewne == set(oczekiwane) - niepewne, (lat, lon, promien)
+            for i in set(wynik) & set(oczekiwane):
+                assert wynik[i] == pytest.approx(oczekiwane[i], abs=1e-6)
+
+
+def test_najblizsze_zgodne_z_przeszukaniem_liniowym(dane):
+    punkty, indeks, zapytania = dane
+    for lat, lon in zapytania:
+        wszystkie = dystanse_naiwne(punkty, lat, lon)
+        posortowane = sorted(wszystkie)
+        for promien in PROMIENIE + [25000.0]:
+            for k in (1, 5, 50):
+                wynik = indeks.najblizsze(lat, lon, k, promien)
+                oczekiwane = [d for d, _ in posortowane if d <= promien][:k]
+                assert [d for d, _ in wynik] == pytest.approx(oczekiwane, abs=1e-6), (lat, lon, promien, k)
+                # Points at equal distance (e.g. clamped to a pole) may come in any order.
+                assert len({i for _, i in wynik}) == len(wynik)
+                for d, i in wynik:
+                    assert wszystkie[i][0] == pytest.approx(d, abs=1e-6)
+
+
+def test_maska_ogranicza_wyniki(dane):
+    punkty, indeks, zapytania = dane
+    maska = np.arange(len(punkty)) % 3 == 0
+    for lat, lon in zapytania[:10]:
+        wynik = indeks.najblizsze(lat, lon, 10, 500.0, maska)
+        oczekiwane = [d for d, i in sorted(dystanse_naiwne(punkty, lat, lon)) if d <= 500.0 and maska[i]][:10]
+        assert all(maska[i] for _, i in wynik)
+        assert [d for d, _ in wynik] == pytest.approx(oczekiwane, abs=1e-6)
+
+
+def test_pusty_indeks():
+    indeks = IndeksPrzestrzenny([])
+    assert len(indeks) == 0
+    assert indeks.granice is None
+    assert indeks.w_promieniu(0.0, 0.0, 100.0) == []
+    assert indeks.najblizsze(0.0, 0.0, 3, 100.0) == []
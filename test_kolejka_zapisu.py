@@ -0,0 +1,138 @@
+import json
+import threading
+import uuid
+
+from postgrest.exceptions import APIError
+
+from kolejka_zapisu import KolejkaZapisu
+
+
+class _Wywolanie:
+    def __init__(self, wykonaj):
+        self._wykonaj = wykonaj
+
+    def execute(self):
+        return self._wykonaj()
+
+
+class _Tabela:
+    def __init__(self, klient, nazwa):
+        self.klient = klient
+        self.nazwa = nazwa
+
+    def insert(self, wiersze):
+        return _Wywolanie(lambda: self.klient.wstaw(self.nazwa, wiersze))
+
+
+class AtrapaKlienta:
+    """Minimal Supabase client: rejects non-UUID user_ids like Postgres does, all rows or none."""
+
+    def __init__(self, awaria: bool = False, awarie_rpc: int = 0):
+        self.awaria = awaria
+        self.awarie_rpc = awarie_rpc
+        self.wstrzymaj = None
+        self.tabele = {'journey_tracking': [], 'co2_calculations': []}
+        self.delty = []
+
+    def table(self, nazwa):
+        return _Tabela(self, nazwa)
+
+    def rpc(self, nazwa, parametry):
+        return _Wywolanie(lambda: self.zwieksz(parametry['p_delty']))
+
+    def zwieksz(self, delty):
+        if self.awarie_rpc:
+            self.awarie_rpc -= 1
+            raise APIError({'code': '503', 'message': 'Service Unavailable'})
+        self.delty.extend(delty)
+
+    def wstaw(self, nazwa, wiersze):
+        if self.wstrzymaj is not None:
+            self.wstrzymaj.wait()
+        if self.awaria:
+            raise ConnectionError("brak połączenia")
+        for wiersz in wiersze:
+            try:
+                uuid.UUID(wiersz['user_id'])
+            except ValueError:
+                raise APIError({'code': '22P02', 'message': f"invalid input syntax for type uuid: \"{wiersz['user_id']}\""})
+        self.tabele[nazwa].extend(wiersze)
+
+
+def wpis(user_id: str, dystans: float = 1.0) -> dict:
+    return {
+        'journey': {'user_id': user_id, 'distance_km': dystans},
+        'calculation': None,
+        'stats': {'p_user_id': user_id, 'p_co2_saved_kg': 0.1, 'p_co2_emitted_kg': 0.0,
+                  'p_bike_journeys': 1, 'p_car_journeys': 0}
+    }
+
+
+def test_odrzucony_wiersz_nie_blokuje_pozostalych(tmp_path):
+    klient = AtrapaKlienta()
+    dobry = str(uuid.uuid4())
+    kolejka = KolejkaZapisu(klient, str(tmp_path / 'podroze.jsonl'), odstep=0.01)
+    for user_id in (dobry, dobry, 'nie-uuid', dobry, dobry):
+        assert kolejka.dodaj(wpis(user_id))
+    kolejka.zatrzymaj()
+
+    assert [w['user_id'] for w in klient.tabele['journey_tracking']] == [dobry] * 4
+    assert [d['p_user_id'] for d in klient.delty] and all(d['p_user_id'] == dobry for d in klient.delty)
+    assert sum(d['p_bike_journeys'] for d in klient.delty) == 4
+
+    odrzucone = [json.loads(linia) for linia in open(tmp_path / 'podroze.odrzucone.jsonl')]
+    assert [o['wpis']['journey']['user_id'] for o in odrzucone] == ['nie-uuid']
+    assert kolejka.rozmiar() == 0
+
+
+def test_blad_polaczenia_zostawia_paczke_w_kolejce(tmp_path):
+    klient = AtrapaKlienta(awaria=True)
+    kolejka = KolejkaZapisu(klient, str(tmp_path / 'podroze.jsonl'), odstep=0.01)
+    kolejka.dodaj(wpis(str(uuid.uuid4())))
+    kolejka.zatrzymaj(limit_czasu=0.5)
+
+    assert kolejka.rozmiar() == 1
+    assert not (tmp_path / 'podroze.odrzucone.jsonl').exists()
+
+
+def test_nieudane_rpc_jest_ponawiane_bez_ponownego_wstawiania(tmp_path):
+    klient = AtrapaKlienta(awarie_rpc=1)
+    uzytkownik = str(uuid.uuid4())
+    kolejka = KolejkaZapisu(klient, str(tmp_path / 'podroze.jsonl'), odstep=0.01)
+    for _ in range(3):
+        kolejka.dodaj(wpis(uzytkownik))
+    kolejka.zatrzymaj()
+
+    assert klient.awarie_rpc == 0
+    assert len(klient.tabele['journey_tracking']) == 3
+    assert sum(d['p_bike_journeys'] for d in klient.delty) == 3
+    assert kolejka.rozmiar() == 0
+
+
+def test_zatrzymanie_nie_zapisuje_rownolegle_z_watkiem(tmp_path):
+    klient = AtrapaKlienta()
+    klient.wstrzymaj = threading.Event()
+    kolejka = KolejkaZapisu(klient, str(tmp_path / 'podroze.jsonl'), odstep=0.01)
+    kolejka.dodaj(wpis(str(uuid.uuid4())))
+    while not kolejka._paczka:
+        klient.wstrzymaj.wait(0.01)
+    kolejka.zatrzymaj(limit_czasu=0.1)
+
+    klient.wstrzymaj.set()
+    kolejka._watek.join()
+    assert len(klient.tabele['journey_tracking']) == 1
+    assert kolejka.rozmiar() == 0
+
+
+def test_urwany_wpis_jest_obcinany_przy_odtwarzaniu(tmp_path):
+    sciezka = tmp_path / 'podroze.jsonl'
+    stary, nowy = str(uuid.uuid4()), str(uuid.uuid4())
+    sciezka.write_bytes(json.dumps(wpis(stary)).encode() + b'\n' + b'{"journey":{"user_')
+
+    kolejka = KolejkaZapisu(AtrapaKlienta(awaria=True), str(sciezka), odstep=0.01)
+    kolejka.dodaj(wpis(nowy))
+    kolejka.zatrzymaj(limit_czasu=0.5)
+
+    klient = AtrapaKlienta()
+    KolejkaZapisu(klient, str(sciezka), odstep=0.01).zatrzymaj()
+    assert [w['user_id'] for w in klient.tabele['journey_tracking']] == [stary, nowy]
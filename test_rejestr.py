@@ -0,0 +1,57 @@
+import pytest
+
+from providers import DaneNiegotowe
+from rejestr import RejestrDostawcow
+
+
+class AtrapaDostawcy:
+    """System covering the whole globe with one vehicle at a fixed distance, or failing every query."""
+
+    def __init__(self, nazwa: str, dystans: float = 1.0, blad: Exception = None):
+        self._nazwa = nazwa
+        self.dystans = dystans
+        self.blad = blad
+
+    def nazwa(self) -> str:
+        return self._nazwa
+
+    def granice(self):
+        return None
+
+    def _pojazd(self) -> dict:
+        if self.blad is not None:
+            raise self.blad
+        return {'system': self._nazwa, 'distance_km': self.dystans}
+
+    def pobierz_pojazdy(self, szerokosc, dlugosc, promien):
+        return [self._pojazd()]
+
+    def pobierz_najblizsze(self, szerokosc, dlugosc, promien, liczba=1):
+        return [self._pojazd()]
+
+    def pobierz_najblizsze_wielu(self, punkty):
+        return [self._pojazd() for _ in punkty]
+
+
+def test_niedzialajacy_system_jest_pomijany():
+    rejestr = RejestrDostawcow([
+        AtrapaDostawcy('ladowany', 0.5, DaneNiegotowe("Dane stacji ladowany nie zostały jeszcze pobrane")),
+        AtrapaDostawcy('awaria', 0.1, ConnectionError("brak połączenia")),
+        AtrapaDostawcy('sprawny', 2.0),
+    ])
+
+    assert [p['system'] for p in rejestr.pobierz_pojazdy(52.0, 21.0, 1.0)] == ['sprawny']
+    assert [p['system'] for p in rejestr.pobierz_najblizsze(52.0, 21.0, 1.0, 3)] == ['sprawny']
+    assert [p['system'] for p in rejestr.pobierz_najblizsze_wielu([(52.0, 21.0, 1.0), (54.0, 18.0, 1.0)])] == ['sprawny'] * 2
+
+
+def test_blad_gdy_zaden_system_nie_odpowiedzial():
+    rejestr = RejestrDostawcow([
+        AtrapaDostawcy('pierwszy', blad=DaneNiegotowe("niegotowe")),
+        AtrapaDostawcy('drugi', blad=DaneNiegotowe("niegotowe")),
+    ])
+
+    with pytest.raises(DaneNiegotowe):
+        rejestr.pobierz_najblizsze(52.0, 21.0, 1.0)
+    with pytest.raises(DaneNiegotowe):
+        rejestr.pobierz_najblizsze_wielu([(52.0, 21.0, 1.0)])
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Compressed variants are kept only when they save at least this fraction of the size.
+MINIMALNA_OSZCZEDNOSC = 0.1
+TYPY_KOMPRESOWALNE = ('text/', 'application/json', 'application/manifest+json', 'application/javascript',
+                      'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+TYPY_WLASNE = {'.webmanifest': 'application/manifest+json', '.ico': 'image/x-icon'}
+# Dynamic responses are compressed per request, so they use fast levels.
+POZIOM_GZIP_DYNAMICZNY = 5
+JAKOSC_BROTLI_DYNAMICZNA = 4
+
+
+@dataclass
+class ZasobStatyczny:
+    """One file in memory: raw bytes, precompressed variants and a strong ETag of the content."""
+    dane: bytes
+    typ: str
+    etag: str
+    zmodyfikowano: float
+    warianty: Dict[str, bytes] = field(default_factory=dict)
+
+    def wariant(self, kodowania: Iterable[str]) -> tuple[Optional[str], bytes]:
+        """Smallest stored variant among the accepted encodings: (encoding or None, bytes)."""
+        for kodowanie in ('br', 'gzip'):
+            if kodowanie in kodowania and kodowanie in self.warianty:
+                return kodowanie, self.warianty[kodowanie]
+        return None, self.dane
+
+
+def skompresuj(dane: bytes, kodowania: Iterable[str]) -> tuple[Optional[str], bytes]:
+    """Compresses a dynamic response with the best accepted encoding: (encoding or None, bytes)."""
+    kodowania = set(kodowania)
+    if brotli is not None and 'br' in kodowania:
+        return 'br', brotli.compress(dane, quality=JAKOSC_BROTLI_DYNAMICZNA)
+    if 'gzip' in kodowania:
+        return 'gzip', gzip.compress(dane, compresslevel=POZIOM_GZIP_DYNAMICZNY, mtime=0)
+    return None, dane
+
+
+def typ_pliku(sciezka: str) -> str:
+    rozszerzenie = os.path.splitext(sciezka)[1].lower()
+    if rozszerzenie in TYPY_WLASNE:
+        return TYPY_WLASNE[rozszerzenie]
+    typ = mimetypes.guess_type(sciezka)[0] or 'application/octet-stream'
+    return typ + '; charset=utf-8' if typ.startswith('text/') else typ
+
+
+def wczytaj_zasob(sciezka: str) -> ZasobStatyczny:
+    with open(sciezka, 'rb') as f:
+        dane = f.read()
+    typ = typ_pliku(sciezka)
+    zasob = ZasobStatyczny(
+        dane=dane,
+        typ=typ,
+        etag=hashlib.sha256(dane).hexdigest()[:32],
+        zmodyfikowano=os.path.getmtime(sciezka)
+    )
+
+    if typ.startswith(TYPY_KOMPRESOWALNE):
+        kandydaci = {'gzip': gzip.compress(dane, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            kandydaci['br'] = brotli.compress(dane, quality=11)
+        for kodowanie, skompresowane in kandydaci.items():
+            if len(skompresowane) <= len(dane) * (1 - MINIMALNA_OSZCZEDNOSC):
+                zasob.warianty[kodowanie] = skompresowane
+    return zasob
+
+
+class ZasobyStatyczne:
+    """Static files loaded once and served from memory.
+
+    Files are registered under a URL-independent name (their path relative to
+    ``katalog``). With ``przeladowanie`` a file is re-read when its mtime changes,
+    which is meant for development only.
+    """
+
+    def __init__(self, katalog: str, przeladowanie: bool = False):
+        self.katalog = katalog
+        self.przeladowanie = przeladowanie
+        self._zasoby: Dict[str, ZasobStatyczny] = {}
+        self._blokada = threading.Lock()
+
+    def dodaj(self, *nazwy: str):
+        for nazwa in nazwy:
+            sciezka = os.path.join(self.katalog, nazwa)
+            try:
+                self._zasoby[nazwa] = wczytaj_zasob(sciezka)
+            except FileNotFoundError:
+                logger.warning(f"Brak pliku statycznego {sciezka}")
+
+    def dodaj_katalog(self, podkatalog: str):
+        sciezka = os.path.join(self.katalog, podkatalog)
+        if not os.path.isdir(sciezka):
+            logger.warning(f"Brak katalogu statycznego {sciezka}")
+            return
+        self.dodaj(*(os.path.join(podkatalog, nazwa) for nazwa in sorted(os.listdir(sciezka))
+                     if os.path.isfile(os.path.join(sciezka, nazwa))))
+
+    def pobierz(self, nazwa: str) -> Optional[ZasobStatyczny]:
+        zasob = self._zasoby.get(nazwa)
+        if zasob is None or not self.przeladowanie:
+            return zasob
+
+        sciezka = os.path.join(self.katalog, nazwa)
+        try:
+            if os.path.getmtime(sciezka) != zasob.zmodyfikowano:
+                with self._blokada:
+                    zasob = self._zasoby[nazwa] = wczytaj_zasob(sciezka)
+        except FileNotFoundError:
+            pass
+        return zasob